@@ -1,6 +1,5 @@
 import asyncio
 import logging
-import logging.handlers
 import os
 
 import coloredlogs
@@ -15,16 +14,39 @@ except ModuleNotFoundError:
 else:
     dotenv.load_dotenv(".env")
 
-# On windows aiodns's asyncio support relies on APIs like add_reader (which aiodns uses)
-# are not guaranteed to be available, and in particular are not available when using the
-# ProactorEventLoop on Windows, this method is only supported with Windows SelectorEventLoop
-if os.name == "nt":
-    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-LOG_FILE_SIZE = 8 * (2**10) ** 2  # 8MB, discord upload limit
+def set_event_loop_policy(event_loop: str = "asyncio") -> str:
+    """
+    Set the event loop policy to use `event_loop`, which is either asyncio or uvloop.
+
+    uvloop is optional, so if it can't be imported asyncio's event loop is used instead.
+    For asyncio, the policy is only changed on windows, so a policy set by whatever is running
+    the bot, such as a test runner, is kept.
+    This must be called before the bot is created, since that is when its event loop is created.
+    Returns the name of the event loop that will be used.
+    """
+    if event_loop == "uvloop":
+        try:
+            import uvloop
+        except ModuleNotFoundError:
+            logging.getLogger(__name__).warning("uvloop was unable to be imported, using asyncio instead.")
+        else:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            return "uvloop"
+
+    # On windows aiodns's asyncio support relies on APIs like add_reader (which aiodns uses)
+    # are not guaranteed to be available, and in particular are not available when using the
+    # ProactorEventLoop on Windows, this method is only supported with Windows SelectorEventLoop
+    if os.name == "nt":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    return "asyncio"
+
+
+set_event_loop_policy()
 
 
 ROOT_LOG_LEVEL = log.get_logging_level()
+LOG_FORMAT = log.get_log_format()
 FMT = "%(asctime)s %(levelname)10s %(name)15s - [%(lineno)5d]: %(message)s"
 DATEFMT = "%Y/%m/%d %H:%M:%S"
 
@@ -34,32 +56,41 @@ logging.setLoggerClass(log.ModmailLogger)
 log_file = log.get_log_dir() / "bot.log"
 log_file.parent.mkdir(parents=True, exist_ok=True)
 
-# file handler
-file_handler = logging.handlers.RotatingFileHandler(
-    log_file,
-    maxBytes=LOG_FILE_SIZE,
-    backupCount=7,
-    encoding="utf-8",
-)
-
-file_handler.setFormatter(
-    logging.Formatter(
-        fmt=FMT,
-        datefmt=DATEFMT,
-    )
-)
+# file handler, rotated by size and/or time, with old logs compressed in the background
+file_handler = log.CompressingRotatingFileHandler(log_file, **log.get_log_rotation())
 
 file_handler.setLevel(logging.TRACE)
 
-coloredlogs.DEFAULT_LEVEL_STYLES["trace"] = coloredlogs.DEFAULT_LEVEL_STYLES["spam"]
+root: log.ModmailLogger = logging.getLogger()
 
-coloredlogs.install(level=logging.TRACE, fmt=FMT, datefmt=DATEFMT)
+if LOG_FORMAT == "json":
+    # one compact json object per line, for log aggregation
+    file_handler.setFormatter(log.JSONFormatter())
 
-# Create root logger
-root: log.ModmailLogger = logging.getLogger()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(log.JSONFormatter())
+    stream_handler.setLevel(logging.TRACE)
+    root.addHandler(stream_handler)
+else:
+    file_handler.setFormatter(
+        logging.Formatter(
+            fmt=FMT,
+            datefmt=DATEFMT,
+        )
+    )
+
+    coloredlogs.DEFAULT_LEVEL_STYLES["trace"] = coloredlogs.DEFAULT_LEVEL_STYLES["spam"]
+
+    coloredlogs.install(level=logging.TRACE, fmt=FMT, datefmt=DATEFMT)
+
+# Set up root logger
 root.setLevel(ROOT_LOG_LEVEL)
 root.addHandler(file_handler)
 
+# attach ticket and relay ids from the current context to every record
+for handler in root.handlers:
+    handler.addFilter(log.ContextFilter())
+
 # Silence irrelevant loggers
 logging.getLogger("discord").setLevel(logging.WARNING)
 logging.getLogger("websockets").setLevel(logging.ERROR)
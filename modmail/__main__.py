@@ -1,6 +1,13 @@
 import logging
+import os
+import subprocess
+import sys
+import time
 
+from modmail import set_event_loop_policy
 from modmail.bot import ModmailBot
+from modmail.cluster import worker_settings
+from modmail.config import config
 from modmail.log import ModmailLogger
 from modmail.utils.embeds import patch_embed
 
@@ -17,9 +24,46 @@ except ImportError:
 log: ModmailLogger = logging.getLogger(__name__)
 
 
+# how often the supervisor checks that its workers are still running
+WORKER_POLL_INTERVAL = 1.0
+
+
+def supervise(worker_count: int) -> None:
+    """Run the bot as several worker processes, restarting any worker which stops."""
+    log.notice(f"Starting {worker_count} workers.")
+
+    def spawn(worker_id: int) -> subprocess.Popen:
+        env = {**os.environ, "MODMAIL_WORKER_ID": str(worker_id)}
+        return subprocess.Popen([sys.executable, "-m", "modmail"], env=env)
+
+    workers = {worker_id: spawn(worker_id) for worker_id in range(worker_count)}
+    try:
+        while True:
+            time.sleep(WORKER_POLL_INTERVAL)
+            for worker_id, process in workers.items():
+                if process.poll() is not None:
+                    log.error(f"Worker {worker_id} stopped with code {process.returncode}, restarting it.")
+                    workers[worker_id] = spawn(worker_id)
+    except KeyboardInterrupt:
+        log.info("Stopping workers.")
+    finally:
+        for process in workers.values():
+            process.terminate()
+        for process in workers.values():
+            process.wait()
+
+
 def main() -> None:
     """Run the bot."""
+    worker_id, worker_count = worker_settings()
+    if worker_id is None and worker_count > 1:
+        supervise(worker_count)
+        return
+
     patch_embed()
+    # the policy has to be set before the bot is created, since that creates the event loop
+    event_loop = set_event_loop_policy(config().user.bot.event_loop)
+    log.debug(f"Using the {event_loop} event loop.")
     bot = ModmailBot()
     bot.run(bot.config.user.bot.token)
 
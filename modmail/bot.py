@@ -11,9 +11,13 @@ from discord import Activity, AllowedMentions, Intents
 from discord.client import _cleanup_loop
 from discord.ext import commands
 
+from modmail import metrics
+from modmail.cluster import WorkerCluster
 from modmail.config import config
 from modmail.dispatcher import Dispatcher
 from modmail.log import ModmailLogger
+from modmail.monitor import LoopMonitor
+from modmail.router import DM_RELAY_EVENT, MessageRouter, Route
 from modmail.utils.extensions import EXTENSIONS, NO_UNLOAD, walk_extensions
 from modmail.utils.plugins import PLUGINS, walk_plugins
 from modmail.utils.threads import Ticket
@@ -48,7 +52,11 @@ class ModmailBot(commands.Bot):
         self.dispatcher = Dispatcher()
 
         self._connector = None
+        self._cdn_connector = None
         self._resolver = None
+        self.metrics_server: t.Optional[metrics.MetricsServer] = None
+        self.loop_monitor = LoopMonitor()
+        self.router = MessageRouter(self)
 
         status = discord.Status.online
         activity = Activity(type=discord.ActivityType.listening, name="users dming me!")
@@ -70,33 +78,71 @@ class ModmailBot(commands.Bot):
         super().__init__(
             **kwargs,
         )
+        # None unless this process is one of several workers
+        self.cluster: t.Optional[WorkerCluster] = WorkerCluster.from_environment(self)
 
     @staticmethod
     async def determine_prefix(bot: "ModmailBot", message: discord.Message) -> t.List[str]:
         """Dynamically get the updated prefix on every command."""
-        prefixes = []
-        if bot.config.user.bot.prefix_when_mentioned:
-            prefixes.extend(commands.when_mentioned(bot, message))
-        prefixes.append(bot.config.user.bot.prefix)
-        return prefixes
+        return bot.router.prefixes
+
+    async def on_message(self, message: discord.Message) -> None:
+        """
+        Send each message only where it needs to go.
+
+        Dms are relayed with the `dm_relay` event, and only messages starting with a prefix are
+        processed as commands.
+        """
+        route = self.router.classify(message)
+        if Route.DM_RELAY in route:
+            self.dispatch(DM_RELAY_EVENT, message)
+        if Route.COMMAND in route:
+            await self.process_commands(message)
 
     async def create_connectors(self, *args, **kwargs) -> None:
-        """Re-create the connector and set up sessions before logging into Discord."""
+        """Re-create the connectors and set up sessions before logging into Discord."""
+        network = self.config.user.network
         # Use asyncio for DNS resolution instead of threads so threads aren't spammed.
         self._resolver = aiohttp.AsyncResolver()
 
         # Use AF_INET as its socket family to prevent HTTPS related problems both locally
         # and in production.
-        self._connector = aiohttp.TCPConnector(
+        # discord's api and everything else get their own connection pools, so that downloads from the cdn
+        # can't use up the connections needed to relay messages.
+        connector_options = dict(
             resolver=self._resolver,
             family=socket.AF_INET,
+            limit_per_host=network.per_host_limit,
+            keepalive_timeout=network.keepalive_timeout,
+            use_dns_cache=network.dns_cache_ttl > 0,
+            ttl_dns_cache=network.dns_cache_ttl or None,
         )
+        self._connector = aiohttp.TCPConnector(limit=network.api_pool_size, **connector_options)
+        self._cdn_connector = aiohttp.TCPConnector(limit=network.cdn_pool_size, **connector_options)
 
         # Client.login() will call HTTPClient.static_login() which will create a session using
         # this connector attribute.
         self.http.connector = self._connector
 
-        self.http_session = aiohttp.ClientSession(connector=self._connector)
+        self.http_session = aiohttp.ClientSession(
+            connector=self._cdn_connector, trace_configs=[metrics.connection_trace_config("cdn")]
+        )
+
+    async def start_metrics_server(self) -> None:
+        """Serve runtime metrics, and instrument discord.py's requests, if metrics are enabled."""
+        metrics_config = self.config.user.metrics
+        if not metrics_config.enabled:
+            return
+
+        # tickets are stored under both their recipient and thread ids
+        metrics.OPEN_TICKETS.set_function(lambda: len(self._tickets) // 2)
+        metrics.instrument_http(self.http)
+        port = metrics_config.port
+        if self.cluster is not None:
+            # each worker serves its own metrics, on the port after the previous worker's
+            port += self.cluster.worker_id
+        self.metrics_server = metrics.MetricsServer(metrics_config.host, port)
+        await self.metrics_server.start()
 
     async def start(self, token: str, reconnect: bool = True) -> None:
         """
@@ -109,6 +155,8 @@ class ModmailBot(commands.Bot):
             # create the aiohttp session
             await self.create_connectors()
             self.logger.trace("Created aiohttp.ClientSession.")
+            # watch for anything blocking the event loop for the whole time the bot is running
+            self.loop_monitor.start()
             # set start time to when we started the bot.
             # This is now, since we're about to connect to the gateway.
             # This should also be before we load any extensions, since if they have a load time, it should
@@ -121,6 +169,8 @@ class ModmailBot(commands.Bot):
             # next, we log in to discord, to ensure that we are able to connect to discord
             # This only logs in to discord and gets a gateway, it does not connect to the websocket
             await self.login(token)
+            # the http client is instrumented after logging in, since that is when its session is created
+            await self.start_metrics_server()
             # now that we're logged in and ensured we can have connection, we load all of the plugins
             # The reason to wait until we know we have a gateway we can connect to, even though we have not
             # signed in yet, is in some cases, a plugin may be poorly made and mess up if it is loaded but
@@ -130,7 +180,11 @@ class ModmailBot(commands.Bot):
             # alert the user that we're done loading everything
             self.logger.notice("Loaded all extensions, and plugins. Starting bot.")
             # finally, we enter the main loop
-            await self.connect(reconnect=reconnect)
+            if self.cluster is None:
+                await self.connect(reconnect=reconnect)
+            else:
+                # only the leader connects to the gateway, the other workers receive their events from it
+                await self.cluster.run(reconnect=reconnect)
         finally:
             if not self.is_closed():
                 await self.close()
@@ -199,12 +253,23 @@ class ModmailBot(commands.Bot):
 
         await super().close()
 
+        if self.cluster:
+            await self.cluster.close()
+
+        if self.metrics_server:
+            await self.metrics_server.close()
+
+        self.loop_monitor.stop()
+
         if self.http_session:
             await self.http_session.close()
 
         if self._connector:
             await self._connector.close()
 
+        if self._cdn_connector:
+            await self._cdn_connector.close()
+
         if self._resolver:
             await self._resolver.close()
 
@@ -0,0 +1,3 @@
+from modmail.cluster.hashring import HashRing
+from modmail.cluster.store import StoredTicket, TicketStore
+from modmail.cluster.worker import CLUSTER_SUPPORTED, WorkerCluster, worker_settings
@@ -0,0 +1,64 @@
+import bisect
+import hashlib
+from typing import Dict, Iterable, List, Set
+
+
+# virtual nodes per worker, which keeps the share of keys each worker owns close to even
+REPLICAS = 128
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring, which maps keys to the worker that owns them.
+
+    When a worker is added or removed, only the keys owned by that worker move,
+    so the other workers keep the tickets they already have in memory.
+    """
+
+    def __init__(self, workers: Iterable[int] = (), *, replicas: int = REPLICAS):
+        self.replicas = replicas
+        self._workers: Set[int] = set()
+        self._points: List[int] = []
+        self._owners: Dict[int, int] = {}
+        for worker in workers:
+            self.add(worker)
+
+    @property
+    def workers(self) -> Set[int]:
+        """The workers on the ring."""
+        return set(self._workers)
+
+    def __contains__(self, worker: int) -> bool:
+        return worker in self._workers
+
+    def __len__(self) -> int:
+        return len(self._workers)
+
+    def add(self, worker: int) -> None:
+        """Add a worker to the ring. Adding a worker which is already on the ring does nothing."""
+        if worker in self._workers:
+            return
+        self._workers.add(worker)
+        for replica in range(self.replicas):
+            point = _hash(f"{worker}-{replica}")
+            self._owners[point] = worker
+            bisect.insort(self._points, point)
+
+    def remove(self, worker: int) -> None:
+        """Remove a worker from the ring. Removing a worker which isn't on the ring does nothing."""
+        if worker not in self._workers:
+            return
+        self._workers.discard(worker)
+        self._points = [point for point in self._points if self._owners[point] != worker]
+        self._owners = {point: self._owners[point] for point in self._points}
+
+    def owner(self, key: int) -> int:
+        """Return the worker which owns the key. Raises LookupError if the ring is empty."""
+        if not self._points:
+            raise LookupError("There are no workers on the ring.")
+        index = bisect.bisect(self._points, _hash(str(key))) % len(self._points)
+        return self._owners[self._points[index]]
@@ -0,0 +1,121 @@
+"""
+The channel workers use to talk to each other.
+
+Messages are json objects, one per line, sent over a unix socket which the leader listens on.
+Every message has an `op`, which is one of the following:
+
+- `hello`: sent by a follower when it connects, with its `worker_id`.
+- `dispatch`: a gateway event, with the event name as `t` and its payload as `d`, as discord sends it.
+- `ticket`: a ticket was opened by a follower, with its `thread_id` and `dm_channel_id`.
+- `close`: a ticket was closed by a follower, with its `thread_id`.
+"""
+import asyncio
+import collections
+import json
+import logging
+from typing import TYPE_CHECKING, Any, Deque, Dict, Optional
+
+
+if TYPE_CHECKING:  # pragma: nocover
+    from modmail.log import ModmailLogger
+logger: "ModmailLogger" = logging.getLogger(__name__)
+
+# guild payloads in the snapshot sent to new followers can be large
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+# a peer with more than this much waiting to be sent to it has stalled, and is disconnected
+MAX_QUEUED_BYTES = 4 * MAX_MESSAGE_SIZE
+
+HELLO = "hello"
+DISPATCH = "dispatch"
+TICKET = "ticket"
+CLOSE = "close"
+
+
+def encode(op: str, **fields: Any) -> bytes:
+    """Encode a message to be written to the socket."""
+    return json.dumps({"op": op, **fields}, separators=(",", ":")).encode() + b"\n"
+
+
+def send(writer: asyncio.StreamWriter, op: str, **fields: Any) -> bool:
+    """
+    Write a message without waiting for it to be sent.
+
+    Returns False if the other end has already disconnected.
+    """
+    if writer.is_closing():
+        return False
+    writer.write(encode(op, **fields))
+    return True
+
+
+class Outbox:
+    """
+    Messages waiting to be sent to a peer, written by a background task which waits for each to be sent.
+
+    The queue is bounded by size, so a peer which stops reading can't make the sender buffer without
+    limit. Once the queue is full, the outbox closes the connection, and refuses any more messages.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, max_queued_bytes: int = MAX_QUEUED_BYTES):
+        self.writer = writer
+        self.max_queued_bytes = max_queued_bytes
+        self.queued_bytes = 0
+        self._queue: Deque[bytes] = collections.deque()
+        self._ready = asyncio.Event()
+        self._task = asyncio.create_task(self._write())
+
+    @property
+    def closed(self) -> bool:
+        """Whether messages can no longer be sent with this outbox."""
+        return self._task.done() or self.writer.is_closing()
+
+    def send(self, op: str, **fields: Any) -> bool:
+        """
+        Queue a message without waiting for it to be sent.
+
+        Returns False if the peer has disconnected, or if it was disconnected as the queue is full.
+        """
+        if self.closed:
+            return False
+        data = encode(op, **fields)
+        if self.queued_bytes + len(data) > self.max_queued_bytes:
+            logger.warning("Disconnecting a peer with %d bytes waiting to be sent to it.", self.queued_bytes)
+            self.close()
+            return False
+        self._queue.append(data)
+        self.queued_bytes += len(data)
+        self._ready.set()
+        return True
+
+    async def _write(self) -> None:
+        try:
+            while True:
+                await self._ready.wait()
+                while self._queue:
+                    data = self._queue.popleft()
+                    self.writer.write(data)
+                    await self.writer.drain()
+                    self.queued_bytes -= len(data)
+                self._ready.clear()
+        except ConnectionError:
+            pass
+        finally:
+            self.writer.close()
+
+    def close(self) -> None:
+        """Drop the queued messages, and close the connection."""
+        self._task.cancel()
+        self._queue.clear()
+        self.queued_bytes = 0
+        self.writer.close()
+
+
+async def receive(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    """Read the next message, returning None once the other end has disconnected."""
+    try:
+        line = await reader.readline()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        return None
+    if not line:
+        return None
+    return json.loads(line)
@@ -0,0 +1,95 @@
+import pathlib
+import sqlite3
+from dataclasses import dataclass
+from typing import List, Optional
+
+from modmail.utils.sqlite import BackgroundDatabase
+
+
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS tickets (
+    recipient_id INTEGER PRIMARY KEY,
+    dm_channel_id INTEGER NOT NULL,
+    thread_id INTEGER NOT NULL UNIQUE,
+    relay_channel_id INTEGER NOT NULL,
+    log_message_id INTEGER NOT NULL
+)
+"""
+_UPSERT = "INSERT OR REPLACE INTO tickets VALUES (?, ?, ?, ?, ?)"
+_SELECT = "SELECT recipient_id, dm_channel_id, thread_id, relay_channel_id, log_message_id FROM tickets"
+
+
+@dataclass(frozen=True)
+class StoredTicket:
+    """The ids needed to rebuild an open ticket, as kept in the ticket store."""
+
+    recipient_id: int
+    dm_channel_id: int
+    thread_id: int
+    relay_channel_id: int
+    log_message_id: int
+
+
+class TicketStore:
+    """
+    Open tickets, stored in sqlite so every worker process can find tickets opened by the others.
+
+    Only the ids of each ticket are stored, the rest is rebuilt from discord, the same way tickets
+    are rehydrated on startup. The database is only used from a background thread.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        # other workers may be writing, so wait for them rather than failing
+        self._database = BackgroundDatabase(path, _CREATE_TABLE, thread_name="modmail-tickets", timeout=10)
+
+    @staticmethod
+    def _add(connection: sqlite3.Connection, ticket: StoredTicket) -> None:
+        with connection:
+            connection.execute(
+                _UPSERT,
+                (
+                    ticket.recipient_id,
+                    ticket.dm_channel_id,
+                    ticket.thread_id,
+                    ticket.relay_channel_id,
+                    ticket.log_message_id,
+                ),
+            )
+
+    async def add(self, ticket: StoredTicket) -> None:
+        """Save an open ticket, replacing any other ticket of the same recipient."""
+        await self._database.run(self._add, ticket)
+
+    @staticmethod
+    def _remove(connection: sqlite3.Connection, thread_id: int) -> None:
+        with connection:
+            connection.execute("DELETE FROM tickets WHERE thread_id = ?", (thread_id,))
+
+    async def remove(self, thread_id: int) -> None:
+        """Forget the ticket of a thread, once it is closed."""
+        await self._database.run(self._remove, thread_id)
+
+    @staticmethod
+    def _get(connection: sqlite3.Connection, snowflake: int) -> Optional[StoredTicket]:
+        row = connection.execute(
+            f"{_SELECT} WHERE recipient_id = ? OR thread_id = ? OR dm_channel_id = ?",
+            (snowflake, snowflake, snowflake),
+        ).fetchone()
+        return StoredTicket(*row) if row is not None else None
+
+    async def get(self, snowflake: int) -> Optional[StoredTicket]:
+        """Return the ticket with the recipient, thread, or dm channel of the provided id, if there is one."""
+        return await self._database.run(self._get, snowflake)
+
+    @staticmethod
+    def _all(connection: sqlite3.Connection) -> List[StoredTicket]:
+        return [StoredTicket(*row) for row in connection.execute(_SELECT)]
+
+    async def all(self) -> List[StoredTicket]:
+        """Return every open ticket."""
+        return await self._database.run(self._all)
+
+    def close(self) -> None:
+        """Close the database once every queued write has finished."""
+        self._database.close()
@@ -0,0 +1,348 @@
+import asyncio
+import functools
+import logging
+import os
+import pathlib
+from typing import TYPE_CHECKING, Any, Callable, Dict, IO, List, Optional, Tuple
+
+from modmail.cluster import ipc
+from modmail.cluster.hashring import HashRing
+from modmail.cluster.store import StoredTicket, TicketStore
+from modmail.config import CONFIG_DIRECTORY
+
+
+try:
+    import fcntl
+except ImportError:  # pragma: nocover
+    fcntl = None
+
+
+if TYPE_CHECKING:  # pragma: nocover
+    from modmail.bot import ModmailBot
+    from modmail.log import ModmailLogger
+    from modmail.utils.threads import Ticket
+logger: "ModmailLogger" = logging.getLogger(__name__)
+
+CLUSTER_DIRECTORY = CONFIG_DIRECTORY / "cluster"
+
+# workers elect their leader with a file lock, and talk to it over a unix socket,
+# neither of which are available on windows
+CLUSTER_SUPPORTED = fcntl is not None
+
+# how long a follower waits before trying to reach the leader again, or to become the leader itself
+FOLLOWER_RETRY_DELAY = 1.0
+
+# events which are handled by a single worker. the events of a ticket go to the worker which owns it,
+# and any other message or interaction goes to the worker which owns its channel
+ROUTED_EVENTS = frozenset(
+    {
+        "INTERACTION_CREATE",
+        "MESSAGE_CREATE",
+        "MESSAGE_UPDATE",
+        "MESSAGE_DELETE",
+        "MESSAGE_DELETE_BULK",
+        "TYPING_START",
+        "THREAD_UPDATE",
+        "THREAD_DELETE",
+    }
+)
+
+
+def worker_settings() -> Tuple[Optional[int], int]:
+    """
+    Return this process' worker id, and the number of workers.
+
+    These are read from `MODMAIL_WORKER_ID` and `MODMAIL_WORKERS`.
+    The worker id is None if this process was not started as a worker.
+    Only a single worker is run on platforms which don't support clusters.
+    """
+    worker_count = max(int(os.environ.get("MODMAIL_WORKERS", 1)), 1)
+    if worker_count > 1 and not CLUSTER_SUPPORTED:
+        logger.warning(
+            "MODMAIL_WORKERS is set to %d, but only a single worker can run on this platform.", worker_count
+        )
+        return None, 1
+    worker_id = os.environ.get("MODMAIL_WORKER_ID")
+    return (int(worker_id) if worker_id is not None else None), worker_count
+
+
+class WorkerCluster:
+    """
+    Shares tickets between several bot processes, each of which owns a slice of the recipients.
+
+    Discord sends every direct message over a single gateway connection, so only one worker, the
+    leader, connects to the gateway. The leader forwards the events of each ticket to the worker
+    that owns its recipient on a consistent hash ring, and every other event to all of the workers
+    so their caches stay up to date. The followers then handle their events as if they came from
+    the gateway.
+
+    Whichever worker holds the lock file is the leader. If it stops, the lock is released and a
+    follower takes over. If a follower stops, its recipients move to the remaining workers, which
+    rebuild the affected tickets from the shared ticket store.
+    """
+
+    def __init__(
+        self,
+        bot: "ModmailBot",
+        worker_id: int,
+        worker_count: int,
+        directory: pathlib.Path = CLUSTER_DIRECTORY,
+    ):
+        self.bot = bot
+        self.worker_id = worker_id
+        self.worker_count = worker_count
+        self.directory = directory
+        self.store = TicketStore(directory / "tickets.sqlite3")
+
+        # only the leader routes events, so only its ring matters.
+        # workers join it once they connect, and leave it when they disconnect.
+        self.ring = HashRing((worker_id,))
+        # the ring once every worker is running, which splits up work that is done before any events arrive
+        self._full_ring = HashRing(range(worker_count))
+        self.is_leader = False
+
+        self._lock_file: Optional[IO] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._followers: Dict[int, ipc.Outbox] = {}
+        self._leader: Optional[asyncio.StreamWriter] = None
+
+        # thread id -> dm channel id, so the events in a ticket's thread go to the same worker as its dms
+        self._ticket_keys: Dict[int, int] = {}
+
+        # replayed to followers when they connect, so they start with the same state as the leader
+        self._ready: Optional[Dict[str, Any]] = None
+        self._guilds: Dict[int, Dict[str, Any]] = {}
+
+        self._wrapped_parsers = False
+        self._chunk_guilds: bool = bot._connection._chunk_guilds
+
+    @classmethod
+    def from_environment(cls, bot: "ModmailBot") -> Optional["WorkerCluster"]:
+        """Return the cluster this process is a worker of, or None if it is not running as a worker."""
+        if not CLUSTER_SUPPORTED:
+            return None
+        worker_id, worker_count = worker_settings()
+        if worker_id is None or worker_count < 2:
+            return None
+        return cls(bot, worker_id, worker_count)
+
+    @property
+    def socket_path(self) -> pathlib.Path:
+        """Path of the unix socket the leader listens on."""
+        return self.directory / "leader.sock"
+
+    def _acquire_leadership(self) -> bool:
+        """Try to take the leader lock, without waiting for it. Returns whether it was taken."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.directory / "leader.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def run(self, reconnect: bool = True) -> None:
+        """Connect to discord as the leader, or follow the leader until this worker becomes the leader."""
+        while not self.bot.is_closed():
+            if self._acquire_leadership():
+                await self._lead(reconnect)
+                return
+            try:
+                await self._follow()
+            except (ConnectionError, FileNotFoundError):
+                # the leader hasn't started listening yet, or has just stopped
+                pass
+            await asyncio.sleep(FOLLOWER_RETRY_DELAY)
+
+    async def _lead(self, reconnect: bool) -> None:
+        self.is_leader = True
+        logger.notice("Worker %d is the leader, and is connecting to discord.", self.worker_id)
+
+        for ticket in await self.store.all():
+            self._ticket_keys[ticket.thread_id] = ticket.dm_channel_id
+
+        # the socket of a leader which crashed is left behind
+        self.socket_path.unlink(missing_ok=True)
+        self._server = await asyncio.start_unix_server(
+            self._handle_follower, path=str(self.socket_path), limit=ipc.MAX_MESSAGE_SIZE
+        )
+        self._wrap_parsers()
+        self.bot._connection._chunk_guilds = self._chunk_guilds
+        await self.bot.connect(reconnect=reconnect)
+
+    async def _follow(self) -> None:
+        reader, writer = await asyncio.open_unix_connection(
+            path=str(self.socket_path), limit=ipc.MAX_MESSAGE_SIZE
+        )
+        logger.info("Worker %d is following the leader.", self.worker_id)
+        self._leader = writer
+        # members are chunked by the leader, and forwarded from there
+        self.bot._connection._chunk_guilds = False
+        parsers = self.bot._connection.parsers
+        try:
+            ipc.send(writer, ipc.HELLO, worker_id=self.worker_id)
+            while (message := await ipc.receive(reader)) is not None:
+                if message["op"] != ipc.DISPATCH:
+                    continue
+                try:
+                    parsers[message["t"]](message["d"])
+                except Exception:
+                    logger.error("Failed to handle a forwarded %s event.", message["t"], exc_info=True)
+        finally:
+            self._leader = None
+            writer.close()
+        logger.warning("Worker %d lost the connection to the leader.", self.worker_id)
+
+    async def _handle_follower(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        hello = await ipc.receive(reader)
+        if hello is None or hello["op"] != ipc.HELLO:
+            writer.close()
+            return
+
+        worker_id = hello["worker_id"]
+        outbox = ipc.Outbox(writer)
+        for event, data in self._snapshot():
+            outbox.send(ipc.DISPATCH, t=event, d=data)
+        self._followers[worker_id] = outbox
+        self.ring.add(worker_id)
+        logger.info("Worker %d joined, %d workers are running.", worker_id, len(self.ring))
+
+        try:
+            while (message := await ipc.receive(reader)) is not None:
+                if message["op"] == ipc.TICKET:
+                    self._ticket_keys[message["thread_id"]] = message["dm_channel_id"]
+                elif message["op"] == ipc.CLOSE:
+                    self._ticket_keys.pop(message["thread_id"], None)
+        finally:
+            self._drop_follower(worker_id, outbox)
+
+    def _drop_follower(self, worker_id: int, outbox: ipc.Outbox) -> None:
+        """Disconnect a follower, and take its share of the events until it reconnects."""
+        # a worker which reconnects replaces its old connection, which must then be left alone
+        if self._followers.get(worker_id) is outbox:
+            del self._followers[worker_id]
+            self.ring.remove(worker_id)
+            logger.warning("Worker %d left, %d workers are running.", worker_id, len(self.ring))
+        outbox.close()
+
+    def _snapshot(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Return the events a new follower needs to build the leader's state."""
+        if self._ready is None:
+            return []
+        return [("READY", self._ready), *(("GUILD_CREATE", guild) for guild in self._guilds.values())]
+
+    def _wrap_parsers(self) -> None:
+        """Route every gateway event through the leader before it is handled."""
+        if self._wrapped_parsers:
+            return
+        # the websocket looks parsers up in this dict, so they can be replaced in place
+        parsers = self.bot._connection.parsers
+        for event, parser in list(parsers.items()):
+            parsers[event] = functools.partial(self._route, event, parser)
+        self._wrapped_parsers = True
+
+    def routing_key(self, event: str, data: Dict[str, Any]) -> Optional[int]:
+        """
+        Return the key of the worker which handles an event, or None if it is handled by every worker.
+
+        Tickets are keyed by the recipient's dm channel, and the events of a ticket's thread
+        use the same key as its dms. Messages and interactions outside of tickets are keyed by
+        their channel, so each command is run once, and the interactions with a view go to the
+        worker which sent it. Every other event updates the caches of all the workers.
+        """
+        if event not in ROUTED_EVENTS:
+            return None
+        if event.startswith("THREAD_"):
+            return self._ticket_keys.get(int(data["id"]))
+        channel_id = data.get("channel_id")
+        if channel_id is None:
+            return int(data["id"])
+        if data.get("guild_id") is None:
+            return int(channel_id)
+        return self._ticket_keys.get(int(channel_id), int(channel_id))
+
+    def owns(self, key: int) -> bool:
+        """
+        Return whether this worker owns a key while every worker is running.
+
+        This splits up work done at startup, such as rehydrating tickets. The leader routes events
+        with the workers which are actually connected, so a worker may still be sent the events of
+        a ticket it doesn't own, which it then rebuilds from the ticket store.
+        """
+        return self._full_ring.owner(key) == self.worker_id
+
+    def _route(self, event: str, parser: Callable[[Dict[str, Any]], None], data: Dict[str, Any]) -> None:
+        if event == "READY":
+            self._ready = data
+            self._guilds.clear()
+        elif event == "GUILD_CREATE":
+            self._guilds[int(data["id"])] = data
+        elif event == "GUILD_DELETE":
+            self._guilds.pop(int(data["id"]), None)
+
+        key = self.routing_key(event, data)
+        if key is None:
+            # payloads are encoded immediately, so the parser is free to change them afterwards
+            for worker_id, outbox in list(self._followers.items()):
+                if not outbox.send(ipc.DISPATCH, t=event, d=data):
+                    self._drop_follower(worker_id, outbox)
+            parser(data)
+            return
+
+        owner = self.ring.owner(key)
+        if owner == self.worker_id:
+            parser(data)
+            return
+        outbox = self._followers.get(owner)
+        # a follower which can't keep up is dropped from the ring, and its events are handled here
+        if outbox is None or not outbox.send(ipc.DISPATCH, t=event, d=data):
+            if outbox is not None:
+                self._drop_follower(owner, outbox)
+            parser(data)
+
+    async def add_ticket(self, ticket: "Ticket") -> None:
+        """Save a ticket to the shared store, so any worker can take it over."""
+        if ticket.relay_channel_id is None:
+            logger.warning(
+                "Not storing the ticket of thread %s, as its relay channel is unknown.", ticket.thread_id
+            )
+            return
+        recipient = ticket.recipient or await self.bot.fetch_user(ticket.recipient_id)
+        dm_channel = recipient.dm_channel or await recipient.create_dm()
+        await self.store.add(
+            StoredTicket(
+                recipient_id=ticket.recipient_id,
+                dm_channel_id=dm_channel.id,
+                thread_id=ticket.thread_id,
+                relay_channel_id=ticket.relay_channel_id,
+                log_message_id=ticket.log_message_id,
+            )
+        )
+        if self.is_leader:
+            self._ticket_keys[ticket.thread_id] = dm_channel.id
+        elif self._leader is not None:
+            ipc.send(self._leader, ipc.TICKET, thread_id=ticket.thread_id, dm_channel_id=dm_channel.id)
+
+    async def remove_ticket(self, ticket: "Ticket") -> None:
+        """Remove a closed ticket from the shared store."""
+        await self.store.remove(ticket.thread_id)
+        if self.is_leader:
+            self._ticket_keys.pop(ticket.thread_id, None)
+        elif self._leader is not None:
+            ipc.send(self._leader, ipc.CLOSE, thread_id=ticket.thread_id)
+
+    async def close(self) -> None:
+        """Stop listening for followers, and release the leader lock."""
+        if self._server is not None:
+            self._server.close()
+            for outbox in self._followers.values():
+                outbox.close()
+            await self._server.wait_closed()
+            self.socket_path.unlink(missing_ok=True)
+        if self._leader is not None:
+            self._leader.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+        self.store.close()
@@ -167,6 +167,13 @@ def convert_to_color(col: typing.Union[str, int, discord.Colour]) -> discord.Col
     return _ColourField.ColourConvert().convert(col)
 
 
+def _convert_to_id_list(ids: typing.Union[str, typing.Iterable[typing.Union[str, int]]]) -> typing.List[int]:
+    """Convert a list, or a comma separated string as in environment variables, into a list of ids."""
+    if isinstance(ids, str):
+        ids = ids.replace(",", " ").split()
+    return [int(id) for id in ids]
+
+
 @attr.frozen(kw_only=True)
 class ConfigMetadata:
     """
@@ -267,6 +274,22 @@ class BotConfig:
             METADATA_TABLE: ConfigMetadata(description="Use the bot mention as a prefix."),
         },
     )
+    event_loop: str = attr.ib(
+        default="asyncio",
+        metadata={
+            METADATA_TABLE: ConfigMetadata(
+                description="Event loop to run the bot on, either `asyncio` or `uvloop`.",
+                extended_description="uvloop must be installed separately, and is not available on windows. "
+                "If it can't be imported, the bot falls back to asyncio's event loop.",
+            ),
+        },
+    )
+
+    @event_loop.validator
+    def _event_loop_validator(self, a: attr.Attribute, value: str) -> None:
+        """Validate that the event loop is one the bot knows how to use."""
+        if value not in ("asyncio", "uvloop"):
+            raise ValueError("event_loop must be either asyncio or uvloop.")
 
 
 @attr.s(auto_attribs=True, slots=True, frozen=True)
@@ -384,6 +407,99 @@ class EmojiConfig:
     )
 
 
+@attr.mutable(slots=True)
+class MetricsConfig:
+    """Prometheus metrics endpoint configuration."""
+
+    enabled: bool = attr.ib(
+        default=False,
+        metadata={
+            METADATA_TABLE: ConfigMetadata(
+                description="Serve runtime metrics in the Prometheus text format at /metrics.",
+            )
+        },
+    )
+    host: str = attr.ib(
+        default="127.0.0.1",
+        metadata={METADATA_TABLE: ConfigMetadata(description="Address to serve metrics on.")},
+    )
+    port: int = attr.ib(
+        default=9090,
+        metadata={
+            METADATA_TABLE: ConfigMetadata(
+                description="Port to serve metrics on. In multi-worker mode, each worker adds its id to it.",
+            )
+        },
+        converter=int,
+    )
+
+
+@attr.mutable(slots=True)
+class NetworkConfig:
+    """
+    HTTP connection pool and DNS cache configuration.
+
+    Requests to discord's api use one connection pool, and everything else, such as attachments
+    from discord's cdn, uses another, so that large downloads can't starve the api of connections.
+    """
+
+    api_pool_size: int = attr.ib(
+        default=100,
+        metadata={
+            METADATA_TABLE: ConfigMetadata(
+                description="Maximum open connections to discord's api. 0 is unlimited.",
+            )
+        },
+        converter=int,
+    )
+    cdn_pool_size: int = attr.ib(
+        default=20,
+        metadata={
+            METADATA_TABLE: ConfigMetadata(
+                description="Maximum open connections for other requests, such as to discord's cdn. "
+                "0 is unlimited.",
+            )
+        },
+        converter=int,
+    )
+    per_host_limit: int = attr.ib(
+        default=0,
+        metadata={
+            METADATA_TABLE: ConfigMetadata(
+                description="Maximum open connections to a single host, in each pool. 0 is unlimited.",
+            )
+        },
+        converter=int,
+    )
+    keepalive_timeout: float = attr.ib(
+        default=30.0,
+        metadata={
+            METADATA_TABLE: ConfigMetadata(
+                description="Seconds an idle connection is kept open for reuse.",
+            )
+        },
+        converter=float,
+    )
+    dns_cache_ttl: int = attr.ib(
+        default=300,
+        metadata={
+            METADATA_TABLE: ConfigMetadata(
+                description="Seconds resolved addresses are cached for. 0 disables the cache.",
+            )
+        },
+        converter=int,
+    )
+
+    @api_pool_size.validator
+    @cdn_pool_size.validator
+    @per_host_limit.validator
+    @dns_cache_ttl.validator
+    def _not_negative(self, a: attr.Attribute, value: int) -> None:
+        """Validate that connection limits and the dns cache ttl are not negative."""
+        if value < 0:
+            raise ValueError(f"{a.name} must not be negative.")
+
+
 @attr.mutable(slots=True)
 class ThreadConfig:
     """Thread configuration."""
@@ -402,6 +518,32 @@ class ThreadConfig:
         metadata={METADATA_TABLE: ConfigMetadata(description="Channel to use for creating tickets.")},
         converter=int,
     )
+    extra_relay_channel_ids: typing.List[int] = attr.ib(
+        factory=list,
+        metadata={
+            METADATA_TABLE: ConfigMetadata(
+                description="Additional channels to create tickets in, to spread them over more rate limits.",
+                extended_description="In environment variables, separate the ids with commas.",
+            )
+        },
+        converter=_convert_to_id_list,
+    )
+    relay_channel_placement: str = attr.ib(
+        default="round_robin",
+        metadata={
+            METADATA_TABLE: ConfigMetadata(
+                description="How to pick the relay channel of a new ticket, when there is more than one.",
+                extended_description="One of `round_robin`, `least_loaded`, or `hashed`, "
+                "which always puts a user's tickets in the same channel.",
+            )
+        },
+    )
+
+    @relay_channel_placement.validator
+    def _relay_channel_placement_validator(self, a: attr.Attribute, value: str) -> None:
+        """Validate that the placement policy is a known one."""
+        if value not in ("round_robin", "least_loaded", "hashed"):
+            raise ValueError("relay_channel_placement must be round_robin, least_loaded, or hashed.")
 
 
 @attr.s(auto_attribs=True, slots=True)
@@ -427,6 +569,8 @@ class BaseConfig:
         },
     )
     emojis: EmojiConfig = EmojiConfig()
+    metrics: MetricsConfig = MetricsConfig()
+    network: NetworkConfig = NetworkConfig()
     threads: ThreadConfig = ThreadConfig()
 
 
@@ -2,8 +2,10 @@ import asyncio
 import bisect
 import inspect
 import logging
-from typing import Callable, Coroutine, Dict, List, Optional, Tuple, Union
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
 
+from modmail import metrics
 from modmail.log import ModmailLogger
 from modmail.utils.general import module_function_disidenticality
 
@@ -305,7 +307,21 @@ class Dispatcher:
             self.blocking_priorities[event_name] = []
 
         for handler in self.blocking_handlers[event_name]:
-            if await handler(*args, **kwargs):
+            if await self._run_handler(event_name, handler, *args, **kwargs):
                 return
 
-        await asyncio.gather(*(handler(*args, **kwargs) for handler in self.handlers[event_name]))
+        handlers = self.handlers[event_name]
+        await asyncio.gather(
+            *(self._run_handler(event_name, handler, *args, **kwargs) for handler in handlers)
+        )
+
+    @staticmethod
+    async def _run_handler(event_name: str, handler: CoroutineFunction, *args, **kwargs) -> Any:
+        """Run a handler, and record how long it took."""
+        start = time.perf_counter()
+        try:
+            return await handler(*args, **kwargs)
+        finally:
+            metrics.DISPATCHER_HANDLER_DURATION.labels(event_name, handler.__qualname__).observe(
+                time.perf_counter() - start
+            )
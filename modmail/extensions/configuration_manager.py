@@ -16,7 +16,12 @@ from modmail.bot import ModmailBot
 from modmail.log import ModmailLogger
 from modmail.utils import responses
 from modmail.utils.cogs import ExtMetadata, ModmailCog
-from modmail.utils.pagination import ButtonPaginator
+from modmail.utils.pagination import (
+    LinePageSource,
+    StatelessPaginator,
+    register_page_source,
+    unregister_page_source,
+)
 
 
 EXT_METADATA = ExtMetadata()
@@ -173,6 +178,12 @@ class ConfigurationManager(ModmailCog, name="Configuration Manager"):
         self.bot = bot
 
         self.config_fields = get_all_conf_options(type(config.default()))
+        register_page_source("config", self.config_page_source)
+
+    def cog_unload(self) -> None:
+        """Stop responding to config list paginators."""
+        unregister_page_source("config")
+        super().cog_unload()
 
     @commands.group(name="config", aliases=("cfg", "conf"), invoke_without_command=True)
     async def config_group(self, ctx: Context) -> None:
@@ -180,12 +191,10 @@ class ConfigurationManager(ModmailCog, name="Configuration Manager"):
         if ctx.invoked_subcommand is None:
             await ctx.send_help(ctx.command)
 
-    @config_group.command(name="list")
-    async def list_config(self, ctx: Context) -> None:
-        """List the valid configuration options."""
+    async def config_page_source(self, _: str) -> LinePageSource:
+        """Pages listing the valid configuration options, for `config list`."""
         options = {}
 
-        embed = discord.Embed(title="Configuration Options")
         for table, opt in self.config_fields.items():
             # TODO: add flag to skip this check
             if opt.hidden or opt.frozen:
@@ -207,7 +216,14 @@ class ConfigurationManager(ModmailCog, name="Configuration Manager"):
 
             options[key] += "\n".join([f"**{name}**", default, description]).strip() + "\n"
 
-        await ButtonPaginator.paginate(options.values(), ctx.message, embed=embed)
+        return LinePageSource(
+            options.values(), prefix="", suffix="", max_size=4000, title="Configuration Options"
+        )
+
+    @config_group.command(name="list")
+    async def list_config(self, ctx: Context) -> None:
+        """List the valid configuration options."""
+        await StatelessPaginator.paginate("config", "", ctx.message)
 
     _T = typing.TypeVar("_T")
 
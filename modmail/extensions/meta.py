@@ -1,3 +1,4 @@
+import datetime
 import logging
 
 import discord
@@ -6,12 +7,16 @@ from discord.ext import commands
 from modmail.bot import ModmailBot
 from modmail.log import ModmailLogger
 from modmail.utils.cogs import ExtMetadata, ModmailCog
+from modmail.utils.extensions import BOT_MODE, BotModes
+from modmail.utils.pagination import ButtonPaginator
 
 
 log: ModmailLogger = logging.getLogger(__name__)
 
 EXT_METADATA = ExtMetadata()
 
+DEV_MODE_ENABLED = BOT_MODE & BotModes.DEVELOP
+
 
 class Meta(ModmailCog):
     """Meta commands to get info about the bot itself."""
@@ -47,6 +52,31 @@ class Meta(ModmailCog):
             )
         )
 
+    @commands.command(name="loop", enabled=DEV_MODE_ENABLED)
+    async def loop_status(self, ctx: commands.Context) -> None:
+        """Show the event loop's lag, and the stacks of the most recent callbacks which blocked it."""
+        monitor = self.bot.loop_monitor
+        # the description is used by the paginator for the stacks, so the lag is shown in fields
+        embed = discord.Embed(title="Event loop")
+        embed.add_field(name="Lag", value=f"`{monitor.lag * 1000:.1f}`ms")
+        embed.add_field(name="Max lag", value=f"`{monitor.max_lag * 1000:.1f}`ms")
+        embed.add_field(
+            name=f"Blocked over {monitor.threshold * 1000:.0f}ms",
+            value=f"{len(monitor.slow_callbacks)} times",
+        )
+        if not monitor.slow_callbacks:
+            await ctx.send(embed=embed)
+            return
+
+        lines = []
+        # most recent first
+        for record in reversed(monitor.slow_callbacks):
+            started_at = datetime.datetime.fromtimestamp(record.started_at, datetime.timezone.utc)
+            state = "" if record.finished else " (still blocked when captured)"
+            lines.append(f"# blocked for {record.duration:.3f}s at {started_at:%H:%M:%S} UTC{state}")
+            lines.extend(line.rstrip() for line in record.stack)
+        await ButtonPaginator.paginate(lines, ctx.message, embed=embed, prefix="```py", suffix="```")
+
 
 def setup(bot: ModmailBot) -> None:
     """Load the Meta cog."""
@@ -1,10 +1,15 @@
 import asyncio
+import collections
 import contextlib
 import copy
 import datetime
+import functools
 import inspect
 import logging
-from typing import TYPE_CHECKING, Dict, Generator, List, NoReturn, Optional, Set, Tuple, Union
+import pathlib
+import re
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Generator, List, NoReturn, Optional, Set, Tuple, Union
 
 import arrow
 import discord
@@ -13,10 +18,29 @@ from discord.ext import commands
 from discord.ext.commands import Context
 from discord.utils import escape_markdown
 
+from modmail import metrics
+from modmail.log import get_log_context, log_context
 from modmail.utils.cogs import ExtMetadata, ModmailCog
 from modmail.utils.extensions import BOT_MODE, BotModes
-from modmail.utils.threads import Ticket, is_modmail_thread
-from modmail.utils.threads.errors import ThreadAlreadyExistsError, ThreadNotFoundError
+from modmail.utils.pagination import ButtonPaginator
+from modmail.utils.threads import (
+    AttachmentCache,
+    EditCoalescer,
+    PlacementPolicy,
+    RelayChannelPool,
+    SearchIndex,
+    Target,
+    Ticket,
+    TranscriptWriter,
+    TypingDebouncer,
+    configured_relay_channel_ids,
+    is_modmail_thread,
+)
+from modmail.utils.threads.errors import (
+    AttachmentTooLargeError,
+    ThreadAlreadyExistsError,
+    ThreadNotFoundError,
+)
 from modmail.utils.time import TimeStampEnum, get_discord_formatted_timestamp
 from modmail.utils.users import check_can_dm_user
 
@@ -41,6 +65,17 @@ ON_FAILURE_EMOJI = "\u274c"  # :x:
 # This will be part of configuration later, so its stored in globals for now
 FORWARD_USER_TYPING = False  # Library bug prevents this from working right now
 FORWARD_MODERATOR_TYPING = False
+# write a compressed transcript of each ticket, which is uploaded to the relay channel on close
+SAVE_TRANSCRIPTS = True
+# index relayed messages so they can be found with the search command
+INDEX_MESSAGES = True
+MAX_SEARCH_RESULTS = 50
+# re-upload the attachments of replies instead of linking to them, so the reply can still be deleted
+REUPLOAD_ATTACHMENTS = False
+# larger attachments are linked instead, since this is the upload limit in dms
+MAX_REUPLOAD_SIZE = 8 * 1024 * 1024
+# former contents of an edited dm kept on its relayed message, older contents are dropped
+MAX_EDIT_HISTORY = 3
 
 # NOTE: Since discord removed `threads.archiver_id`, (it will always be `None` now), and the
 # only way to get the user who archived the thread is to use the Audit logs.
@@ -55,13 +90,69 @@ CLOSED_COLOUR = discord.Colour.green()
 FORWARDED_DM_COLOR = discord.Colour.dark_teal()  # messages received from dms
 INTERNAL_REPLY_COLOR = discord.Colour.teal()  # messages sent, shown in thread
 
-MAX_CACHED_MESSAGES_PER_THREAD = 10
+# tickets are rebuilt on startup from active threads, and threads archived within this duration
+REHYDRATE_ARCHIVED_WITHIN = datetime.timedelta(days=7)
+MAX_CONCURRENT_REHYDRATIONS = 8
+# dms deleted at once when mirroring deletions from threads, a purge queues the rest behind these
+MAX_CONCURRENT_MIRRORED_DELETES = 4
+# matches the recipient id at the end of the log message embed title, see _start_discord_thread
+RECIPIENT_ID_PATTERN = re.compile(r"\(`(\d+)`\)$")
 
 IMAGE_EXTENSIONS = (".png", ".apng", ".gif", ".webm", "jpg", ".jpeg")
 
 logger: "ModmailLogger" = logging.getLogger(__name__)
 
 
+def _ticket_log_fields(ticket: Ticket) -> Dict[str, int]:
+    """Return the ids of a ticket which are attached to log records about it."""
+    return {
+        "ticket_id": ticket.log_message.id,
+        "thread_id": ticket.thread.id,
+        "recipient_id": ticket.recipient.id,
+    }
+
+
+def _relay_log_context(func: Callable) -> Callable:
+    """
+    Attach the ticket and a relay correlation id to all logs made while relaying a message.
+
+    The relay id is the id of the message which started the relay. If the event which started
+    the relay already set one, that id is kept, so a single message can be traced end to end.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(self: "TicketsCog", ticket: Ticket, message: discord.Message, *args, **kwargs) -> Any:
+        relay_id = get_log_context().get("relay_id", message.id)
+        with log_context(**_ticket_log_fields(ticket), relay_id=relay_id):
+            return await func(self, ticket, message, *args, **kwargs)
+
+    return wrapper
+
+
+def _record_relay_metrics(direction: str) -> Callable[[Callable], Callable]:
+    """Count relays in a direction by their outcome, and record how long successful relays took."""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs) -> Any:
+            start = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except BaseException:
+                metrics.RELAYED_MESSAGES.labels(direction, "failed").inc()
+                raise
+            if result is None:
+                metrics.RELAYED_MESSAGES.labels(direction, "skipped").inc()
+            else:
+                metrics.RELAYED_MESSAGES.labels(direction, "relayed").inc()
+                metrics.RELAY_DURATION.labels(direction).observe(time.perf_counter() - start)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
 class RepliedOrRecentMessageConverter(commands.Converter):
     """
     Custom converter to return discord Message from within modmail threads.
@@ -111,9 +202,8 @@ class RepliedOrRecentMessageConverter(commands.Converter):
             ticket: Ticket = await ctx.bot.get_cog("Threads").fetch_ticket(ctx.channel.id)
             if ticket is None:
                 return or_raise(commands.CommandError("There's no message here to action on!"))
-            try:
-                message = ticket.last_sent_messages[-1]
-            except IndexError:
+            message = ticket.last_sent_messages.last
+            if message is None:
                 return or_raise(commands.CommandError("There's no message here to action on!"))
 
         # undo eating this parameter
@@ -139,6 +229,12 @@ class TicketsCog(ModmailCog, name="Threads"):
         self.relay_channel: Union[discord.TextChannel, discord.PartialMessageable] = (
             self.bot.get_partial_messageable(self.bot.config.user.threads.relay_channel_id)
         )
+        # tickets are spread across all of the relay channels, the one above is only the first of them
+        threads_config = self.bot.config.user.threads
+        self.relay_channels = RelayChannelPool(
+            configured_relay_channel_ids(threads_config) or (threads_config.relay_channel_id,),
+            PlacementPolicy(threads_config.relay_channel_placement),
+        )
 
         self.dms_to_users: Dict[int, int] = dict()  # key: dm_channel.id, value: user.id
 
@@ -152,14 +248,40 @@ class TicketsCog(ModmailCog, name="Threads"):
 
         self.thread_create_delete_lock = asyncio.Lock()
         self.thread_create_lock = asyncio.Lock()
+        # shared by every ticket, so purging several threads at once doesn't flood the rate limits
+        self.mirrored_delete_semaphore = asyncio.Semaphore(MAX_CONCURRENT_MIRRORED_DELETES)
 
         self.use_audit_logs: bool = USE_AUDIT_LOGS
+        # typing indicators are keyed by the recipient id in dms, and by the thread id in threads
+        self.typing_debouncer = TypingDebouncer()
+        self.edit_coalescer = EditCoalescer()
+        self.search_index: Optional[SearchIndex] = SearchIndex() if INDEX_MESSAGES else None
+        self.attachment_cache: Optional[AttachmentCache] = (
+            AttachmentCache(self.bot.http_session) if REUPLOAD_ATTACHMENTS else None
+        )
         self.bot.loop.create_task(self.fetch_necessary_values())
 
     async def init_relay_channel(self) -> None:
         """Fetch the relay channel."""
         self.relay_channel = await self.bot.fetch_channel(self.bot.config.user.threads.relay_channel_id)
 
+    async def pick_relay_channel(self, recipient: discord.abc.User) -> discord.TextChannel:
+        """Pick the relay channel to open a ticket for the recipient in, with the placement policy."""
+        if len(self.relay_channels) > 1:
+            # tickets are stored under both their recipient and thread ids, so only count them once
+            # tickets rebuilt from ids may not know their relay channel, and aren't counted
+            open_tickets = collections.Counter(
+                ticket.relay_channel_id
+                for key, ticket in self.bot._tickets.items()
+                if key == ticket.thread_id and ticket.relay_channel_id is not None
+            )
+            channel_id = self.relay_channels.choose(recipient.id, open_tickets)
+            if channel_id != self.relay_channel.id:
+                return self.bot.get_channel(channel_id) or await self.bot.fetch_channel(channel_id)
+
+        await self.init_relay_channel()
+        return self.relay_channel
+
     async def fetch_necessary_values(self) -> None:
         """Fetch the audit log permission."""
         self.relay_channel: discord.TextChannel = await self.bot.fetch_channel(self.relay_channel.id)
@@ -169,21 +291,135 @@ class TicketsCog(ModmailCog, name="Threads"):
         self.use_audit_logs = USE_AUDIT_LOGS and me.guild_permissions.view_audit_log
         logger.debug("Fetched relay channel and use_audit_log perms")
 
+        await self.rehydrate_tickets()
+
+    async def rehydrate_tickets(self) -> None:
+        """
+        Rebuild tickets from the threads in the relay channels, since tickets are only stored in memory.
+
+        Active threads and threads archived within REHYDRATE_ARCHIVED_WITHIN are restored,
+        unless their log message shows that they were closed. When running as one of several
+        workers, only the tickets owned by this worker are restored.
+        """
+        start = time.perf_counter()
+        relay_channels = {self.relay_channel.id: self.relay_channel}
+        for channel_id in self.relay_channels:
+            if channel_id not in relay_channels:
+                channel = self.bot.get_channel(channel_id) or await self.bot.fetch_channel(channel_id)
+                relay_channels[channel_id] = channel
+
+        threads = [
+            thread
+            for thread in await self.relay_channel.guild.active_threads()
+            if thread.parent_id in relay_channels
+        ]
+        active_count = len(threads)
+
+        # archived threads are returned from the most recently archived
+        cutoff = arrow.utcnow().datetime - REHYDRATE_ARCHIVED_WITHIN
+        for relay_channel in relay_channels.values():
+            async for thread in relay_channel.archived_threads(limit=None):
+                if thread.archive_timestamp < cutoff:
+                    break
+                threads.append(thread)
+
+        if self.bot.cluster is not None:
+            # each worker only rebuilds the tickets it owns. threads missing from the ticket store are
+            # keyed by their own id, and are added to the store once they are rebuilt.
+            keys = {stored.thread_id: stored.dm_channel_id for stored in await self.bot.cluster.store.all()}
+            owned = [self.bot.cluster.owns(keys.get(thread.id, thread.id)) for thread in threads]
+            active_count = sum(owned[:active_count])
+            threads = [thread for thread, owns in zip(threads, owned) if owns]
+
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REHYDRATIONS)
+
+        async def rehydrate(thread: discord.Thread) -> Optional[Ticket]:
+            async with semaphore:
+                return await self._rehydrate_ticket(thread, relay_channels[thread.parent_id])
+
+        results = await asyncio.gather(*(rehydrate(thread) for thread in threads), return_exceptions=True)
+
+        failed = 0
+        for thread, result in zip(threads, results):
+            if isinstance(result, Exception):
+                failed += 1
+                logger.error("Unable to rehydrate the ticket for thread %s.", thread.id, exc_info=result)
+
+        logger.info(
+            "Rehydrated %d tickets from %d active and %d archived threads in %.2f seconds. %d failed.",
+            sum(isinstance(result, Ticket) for result in results),
+            active_count,
+            len(threads) - active_count,
+            time.perf_counter() - start,
+            failed,
+        )
+
+    async def _rehydrate_ticket(
+        self, thread: discord.Thread, relay_channel: Optional[discord.TextChannel] = None
+    ) -> Optional[Ticket]:
+        """Rebuild and save the ticket of a thread, returning None if the thread is not an open ticket."""
+        if thread.id in self.bot._tickets:
+            return None
+
+        relay_channel = relay_channel or self.relay_channel
+        try:
+            log_message = await relay_channel.fetch_message(thread.id)
+        except discord.NotFound:
+            logger.debug("Not rehydrating thread %s as its log message was deleted.", thread.id)
+            return None
+
+        if not log_message.embeds or log_message.embeds[0].colour == CLOSED_COLOUR:
+            return None
+
+        match = RECIPIENT_ID_PATTERN.search(log_message.embeds[0].title or "")
+        if match is None:
+            logger.debug("Not rehydrating thread %s as its recipient could not be found.", thread.id)
+            return None
+
+        recipient_id = int(match.group(1))
+        recipient = self.bot.get_user(recipient_id) or await self.bot.fetch_user(recipient_id)
+        if recipient.dm_channel is None:
+            await recipient.create_dm()
+
+        async with self.thread_create_delete_lock:
+            # the user may have opened a new ticket while this one was being rebuilt
+            if recipient.id in self.bot._tickets:
+                return None
+
+            ticket = Ticket(recipient, thread, log_message=log_message)
+            if SAVE_TRANSCRIPTS:
+                ticket.transcript = TranscriptWriter.for_thread(thread.id)
+            await self.add_ticket(ticket)
+            self.dms_to_users[recipient.dm_channel.id] = recipient.id
+
+        logger.trace("Rehydrated ticket for recipient %s in thread %s.", recipient.id, thread.id)
+        return ticket
+
     def cog_unload(self) -> None:
         """Cancel any tasks that may be running on unload."""
+        self.edit_coalescer.close()
+        # closed without being finalized, so the transcripts of open tickets continue after a restart
+        for ticket in set(self.bot._tickets.values()):
+            if ticket.transcript is not None:
+                ticket.transcript.close()
+        if self.search_index is not None:
+            self.search_index.close()
         super().cog_unload()
 
     async def add_ticket(self, ticket: Ticket, /) -> Ticket:
         """Save a newly created ticket."""
-        self.bot._tickets[ticket.recipient.id] = ticket
-        self.bot._tickets[ticket.thread.id] = ticket
+        self.bot._tickets[ticket.recipient_id] = ticket
+        self.bot._tickets[ticket.thread_id] = ticket
+        if self.bot.cluster is not None:
+            await self.bot.cluster.add_ticket(ticket)
         return ticket
 
     async def fetch_ticket(self, id: int, /, raise_exception: bool = False) -> Optional[Ticket]:
         """
         Fetch a ticket from the tickets dict.
 
-        In the future this will be hooked into the database.
+        When running as one of several workers, tickets opened by other workers are rebuilt from
+        the shared ticket store the first time they are needed.
 
         By default, returns None if a ticket cannot be found.
         However, if raise_exception is True, then this function will raise a ThreadNotFoundError
@@ -191,14 +427,34 @@ class TicketsCog(ModmailCog, name="Threads"):
         # given that this is an async method, it is expected to yield somewhere
         # this gives way to any waiting coroutines while here, temporarily
         await asyncio.sleep(0)
-        try:
-            ticket = self.bot._tickets[id]
-        except KeyError:
-            if raise_exception:
-                raise ThreadNotFoundError(f"Could not find thread from id {id}.")
+        ticket = self.bot._tickets.get(id)
+        if ticket is None and self.bot.cluster is not None:
+            ticket = await self._load_stored_ticket(id)
+        if ticket is None and raise_exception:
+            raise ThreadNotFoundError(f"Could not find thread from id {id}.")
+        return ticket
+
+    async def _load_stored_ticket(self, id: int, /) -> Optional[Ticket]:
+        """Rebuild a ticket from the shared ticket store, returning None if it isn't an open ticket."""
+        stored = await self.bot.cluster.store.get(id)
+        if stored is None:
             return None
+
+        try:
+            thread, relay_channel = [
+                self.bot.get_channel(channel_id) or await self.bot.fetch_channel(channel_id)
+                for channel_id in (stored.thread_id, stored.relay_channel_id)
+            ]
+        except discord.NotFound:
+            pass
         else:
-            return ticket
+            await self._rehydrate_ticket(thread, relay_channel)
+
+        ticket = self.bot._tickets.get(id)
+        if ticket is None:
+            logger.debug("Removing the stored ticket of closed thread %s.", stored.thread_id)
+            await self.bot.cluster.store.remove(stored.thread_id)
+        return ticket
 
     def get_user_from_dm_channel_id(self, id: int, /) -> int:
         """Get a user id from a dm channel id. Raises a KeyError if user is not found."""
@@ -280,6 +536,10 @@ class TicketsCog(ModmailCog, name="Threads"):
         """
         recipient = recipient or initial_message.author
 
+        # a ticket opened by another worker is only in the shared store until it is fetched here
+        if self.bot.cluster is not None:
+            await self.fetch_ticket(recipient.id)
+
         # lock this next session, since we're checking if a thread already exists here
         # we want to ensure that anything entering this section can get validated.
         async with self.thread_create_delete_lock:
@@ -298,6 +558,8 @@ class TicketsCog(ModmailCog, name="Threads"):
                 has_sent_initial_message=send_initial_message,
                 log_message=thread_msg,
             )
+            if SAVE_TRANSCRIPTS:
+                ticket.transcript = TranscriptWriter.for_thread(thread_channel.id)
             # add the ticket as both the recipient and the thread ids so
             # the tickets can be retrieved from both users or threads.
             await self.add_ticket(ticket)
@@ -325,9 +587,9 @@ class TicketsCog(ModmailCog, name="Threads"):
         Sends an initial message, and returns the thread and the first message sent in the thread.
         Any kwargs not defined in the method signature are forwarded to the discord.Messageable.send method
         """
-        await self.init_relay_channel()
-
         recipient = recipient or message.author
+        relay_channel = await self.pick_relay_channel(recipient)
+
         if send_kwargs.get("allowed_mentions") is None:
             send_kwargs["allowed_mentions"] = discord.AllowedMentions(
                 everyone=False, users=False, roles=True, replied_user=False
@@ -357,7 +619,7 @@ class TicketsCog(ModmailCog, name="Threads"):
             value=get_discord_formatted_timestamp(arrow.utcnow(), TimeStampEnum.RELATIVE_TIME),
         )
 
-        relayed_msg = await self.relay_channel.send(content=mention, embed=embed, **send_kwargs)
+        relayed_msg = await relay_channel.send(content=mention, embed=embed, **send_kwargs)
         try:
             thread_channel = await relayed_msg.create_thread(
                 name=f"{recipient!s}".replace("#", "-"),
@@ -384,10 +646,7 @@ class TicketsCog(ModmailCog, name="Threads"):
         try:
             user_message = ticket.messages[message]
         except KeyError:
-            try:
-                ticket.last_sent_messages.remove(message)
-            except ValueError:
-                pass
+            ticket.last_sent_messages.discard(message)
             await ctx.send(
                 "Sorry, this is not a message that I can edit.",
                 reference=message.to_reference(fail_if_not_exists=False),
@@ -401,6 +660,64 @@ class TicketsCog(ModmailCog, name="Threads"):
             )
         return user_message, message
 
+    def write_transcript(
+        self,
+        ticket: Ticket,
+        target: Target,
+        source: discord.Message,
+        mirror: discord.Message,
+        contents: Optional[str] = None,
+    ) -> None:
+        """Write a relayed message pair to the ticket's transcript, if it has one."""
+        if ticket.transcript is None:
+            return
+        try:
+            ticket.transcript.write_pair(target, source, mirror, contents)
+        except ValueError:
+            logger.exception("Unable to write to the transcript of thread %s.", ticket.thread.id)
+
+    def index_message(
+        self,
+        ticket: Ticket,
+        message: discord.Message,
+        thread_message: discord.Message,
+        contents: Optional[str] = None,
+    ) -> None:
+        """Queue a relayed message to be added to the search index."""
+        if self.search_index is not None:
+            self.search_index.add(message, thread_message, ticket.recipient.id, contents)
+
+    async def upload_transcript(
+        self, ticket: Ticket, closer: Optional[Union[discord.User, discord.Member]] = None
+    ) -> Optional[discord.Message]:
+        """Finalize the ticket's transcript, and upload it in reply to the ticket's log message."""
+        if ticket.transcript is None:
+            return None
+
+        path = await asyncio.wrap_future(ticket.transcript.finalize(closed_by=getattr(closer, "id", None)))
+        if path.stat().st_size > ticket.thread.guild.filesize_limit:
+            logger.warning(
+                "The transcript of thread %s is too large to upload, it is saved at %s.",
+                ticket.thread.id,
+                path,
+            )
+            return None
+
+        try:
+            return await ticket.log_message.channel.send(
+                content=f"Transcript of {ticket.thread.mention}",
+                file=ticket.transcript.to_file(),
+                reference=ticket.log_message.to_reference(fail_if_not_exists=False),
+                allowed_mentions=discord.AllowedMentions.none(),
+            )
+        except discord.HTTPException:
+            logger.exception(
+                "Unable to upload the transcript of thread %s, it is saved at %s.",
+                ticket.thread.id,
+                path,
+            )
+            return None
+
     @contextlib.asynccontextmanager
     async def handle_success(self, ctx: Context) -> Generator[None, None, None]:
         """If any exceptions are thrown, a failure emoji is added and the exception is reraised."""
@@ -419,11 +736,58 @@ class TicketsCog(ModmailCog, name="Threads"):
         """Remove provided messages from last sent messages if no errors."""
         yield
         for message in messages:
-            try:
-                ticket.last_sent_messages.remove(message)
-            except ValueError:
-                pass
+            ticket.last_sent_messages.discard(message)
+
+    async def cache_attachments(
+        self, attachments: List[discord.Attachment]
+    ) -> Tuple[List[Tuple[discord.Attachment, pathlib.Path]], List[discord.Attachment]]:
+        """
+        Download attachments so they can be re-uploaded.
 
+        Returns the attachments which were cached with the paths of their copies,
+        and the attachments which have to be linked instead.
+        The copies are pinned in the cache, and must be released once they have been uploaded.
+        """
+        if self.attachment_cache is None:
+            return [], list(attachments)
+
+        fetches = [
+            asyncio.ensure_future(self.attachment_cache.fetch(a, max_size=MAX_REUPLOAD_SIZE))
+            for a in attachments
+        ]
+        try:
+            results = await asyncio.gather(*fetches, return_exceptions=True)
+        except asyncio.CancelledError:
+            # the copies which were already fetched will never be uploaded
+            for fetch in fetches:
+                if fetch.done() and not fetch.cancelled() and fetch.exception() is None:
+                    self.attachment_cache.release(fetch.result())
+            raise
+
+        uploads, linked = [], []
+        cancelled = None
+        for attachment, result in zip(attachments, results):
+            if isinstance(result, AttachmentTooLargeError):
+                linked.append(attachment)
+            elif isinstance(result, Exception):
+                logger.warning("Unable to download attachment %s, linking to it instead.", attachment.id)
+                linked.append(attachment)
+            elif isinstance(result, BaseException):
+                cancelled = result
+            else:
+                uploads.append((attachment, result))
+        if cancelled is not None:
+            self.release_attachments(uploads)
+            raise cancelled
+        return uploads, linked
+
+    def release_attachments(self, uploads: List[Tuple[discord.Attachment, pathlib.Path]]) -> None:
+        """Release the cached copies of attachments once they have been uploaded."""
+        for _, path in uploads:
+            self.attachment_cache.release(path)
+
+    @_relay_log_context
+    @_record_relay_metrics("to_user")
     async def relay_message_to_user(
         self, ticket: Ticket, message: discord.Message, contents: str = None, *, delete: bool = True
     ) -> discord.Message:
@@ -434,10 +798,11 @@ class TicketsCog(ModmailCog, name="Threads"):
 
         # thread -> dm
         logger.debug(
-            "Relaying message id {message.id} by {message.author} "
-            "from thread {thread.id} to dm channel {dm_channel.id}.".format(
-                message=message, thread=ticket.thread, dm_channel=ticket.recipient.dm_channel
-            )
+            "Relaying message id %s by %s from thread %s to dm channel %s.",
+            message.id,
+            message.author,
+            ticket.thread.id,
+            ticket.recipient.dm_channel.id,
         )
 
         embeds: List[Embed] = [
@@ -461,56 +826,94 @@ class TicketsCog(ModmailCog, name="Threads"):
                 )
             except KeyError:
                 pass
-        if len(message.attachments) > 0:
-            # don't delete when forwarding a message that has attachments,
-            # as that will invalidate the attachments
-            delete = False
-            for a in message.attachments:
-                # featuring the first image attachment as the embed image
-                if a.url.lower().endswith(IMAGE_EXTENSIONS):
-                    if not embeds[0].image:
-                        embeds[0].set_image(url=a.url)
-                        continue
-                embeds[0].add_field(name=a.filename, value=a.proxy_url, inline=False)
-
+        sticker = None
         if len(message.stickers):
             # since users can only send one sticker right now, we only care about the first one
             sticker = await message.stickers[0].fetch()
-            # IF its possible, add the sticker url to the embed attachment
             if (
                 getattr(sticker, "format", discord.StickerFormatType.lottie)
                 == discord.StickerFormatType.lottie
             ):
                 await message.channel.send("Nope! This sticker of a type which can't be shown to the user.")
                 return None
-            else:
-                if len(embeds[0].image) == 0:
-                    embeds[0].set_image(url=sticker.url)
-                else:
-                    embeds.append(Embed().set_image(url=sticker.url))
 
-        sent_message = await ticket.recipient.send(embeds=embeds, reference=dm_reference_message)
-        # deep copy embeds to not have an internal race condition.
-        embeds = copy.deepcopy(embeds)
+        # attachments are fetched last, since their cached copies are pinned until they are uploaded
+        uploads: List[Tuple[discord.Attachment, pathlib.Path]] = []
+        if len(message.attachments) > 0:
+            uploads, linked = await self.cache_attachments(message.attachments)
+            if linked:
+                # don't delete when forwarding a message that has linked attachments,
+                # as that will invalidate the attachments
+                delete = False
+            for a in linked:
+                # featuring the first image attachment as the embed image
+                if a.url.lower().endswith(IMAGE_EXTENSIONS):
+                    if not embeds[0].image:
+                        embeds[0].set_image(url=a.url)
+                        continue
+                embeds[0].add_field(name=a.filename, value=a.proxy_url, inline=False)
 
-        # also relay it in the thread channel
-        embeds[0].set_footer(text=f"User ID: {message.author.id}")
+        if sticker is not None:
+            # IF its possible, add the sticker url to the embed attachment
+            if len(embeds[0].image) == 0:
+                embeds[0].set_image(url=sticker.url)
+            else:
+                embeds.append(Embed().set_image(url=sticker.url))
+
+        # the thread mirror uses a deep copy, since both messages are sent at the same time.
+        thread_embeds = copy.deepcopy(embeds)
+        thread_embeds[0].set_footer(text=f"User ID: {message.author.id}")
+        thread_embeds[0].colour = INTERNAL_REPLY_COLOR
 
-        embeds[0].colour = INTERNAL_REPLY_COLOR
-        guild_message = await ticket.thread.send(embeds=embeds, reference=guild_reference_message)
+        def files() -> Optional[List[discord.File]]:
+            # each message needs its own file objects, but they are read from the same cached copy
+            return [AttachmentCache.to_file(a, path) for a, path in uploads] or None
 
+        # the dm and the thread mirror don't depend on each other, so send them concurrently.
+        try:
+            sent_message, guild_message = await asyncio.gather(
+                ticket.recipient.send(embeds=embeds, files=files(), reference=dm_reference_message),
+                ticket.thread.send(embeds=thread_embeds, files=files(), reference=guild_reference_message),
+                return_exceptions=True,
+            )
+        finally:
+            self.release_attachments(uploads)
+        if isinstance(sent_message, BaseException):
+            # the user never received the message, so the mirror would be misleading
+            if not isinstance(guild_message, BaseException):
+                self.thread_deleted_messages.add(guild_message.id)
+                try:
+                    await guild_message.delete()
+                except discord.HTTPException:
+                    logger.warning("Unable to delete the mirror of message %s.", message.id, exc_info=True)
+            raise sent_message
+        if isinstance(guild_message, BaseException):
+            # the original message is kept, so the reply is still shown in the thread
+            logger.error("Relayed message %s to the user, but could not mirror it to the thread.", message.id)
+            raise guild_message
+
+        # only delete the original message once both the user and the thread have it
         if delete:
-            await message.delete()
+            try:
+                await message.delete()
+            except discord.HTTPException:
+                logger.warning("Unable to delete message %s after relaying it.", message.id)
 
-        # add last sent message to the list
+        # sending a message clears the bot's typing indicators
+        self.typing_debouncer.cancel(ticket.recipient_id)
+        self.typing_debouncer.cancel(ticket.thread_id)
+
+        # add last sent message to the list, which is bounded by MAX_CACHED_MESSAGES_PER_THREAD
         ticket.last_sent_messages.append(guild_message)
-        if len(ticket.last_sent_messages) > MAX_CACHED_MESSAGES_PER_THREAD:
-            ticket.last_sent_messages.pop(0)  # keep list length to MAX_CACHED_MESSAGES_PER_THREAD
 
         # add messages to the dict
         ticket.messages[guild_message] = sent_message
+        self.write_transcript(ticket, Target.USER, message, sent_message, contents)
+        self.index_message(ticket, message, guild_message, contents)
         return sent_message
 
+    @_relay_log_context
+    @_record_relay_metrics("to_guild")
     async def relay_message_to_guild(
         self, ticket: Ticket, message: discord.Message, contents: Optional[str] = None
     ) -> discord.Message:
@@ -520,10 +923,11 @@ class TicketsCog(ModmailCog, name="Threads"):
 
         # dm -> thread
         logger.debug(
-            "Relaying message id {message.id} from dm channel {dm_channel.id}"
-            " with {message.author} to thread {thread.id}.".format(
-                message=message, thread=ticket.thread, dm_channel=ticket.recipient.dm_channel
-            )
+            "Relaying message id %s from dm channel %s with %s to thread %s.",
+            message.id,
+            ticket.recipient.dm_channel.id,
+            message.author,
+            ticket.thread.id,
         )
         # make a reply if it was a reply
         guild_reference_message = None
@@ -602,14 +1006,18 @@ class TicketsCog(ModmailCog, name="Threads"):
             and send_kwargs.get("stickers") is None
         ):
             logger.info(
-                f"SKIPPING relay of message id {message.id} from {message.author!s} due to nothing to relay."
+                "SKIPPING relay of message id %s from %s due to nothing to relay.", message.id, message.author
             )
             return None
 
         sent_message = await ticket.thread.send(embed=embed, reference=guild_reference_message, **send_kwargs)
+        # sending a message clears the bot's typing indicator
+        self.typing_debouncer.cancel(ticket.thread_id)
 
         # add messages to the dict
         ticket.messages[message] = sent_message
+        self.write_transcript(ticket, Target.MODMAIL, message, sent_message, contents)
+        self.index_message(ticket, message, sent_message, contents)
         return sent_message
 
     async def mark_thread_responded(self, ticket: Ticket) -> bool:
@@ -788,7 +1196,7 @@ class TicketsCog(ModmailCog, name="Threads"):
                 try:
                     await ticket.recipient.send(embed=thread_close_embed)
                 except discord.HTTPException:
-                    logger.debug(f"{ticket.recipient} is unable to be DMed. Skipping.")
+                    logger.debug("%s is unable to be DMed. Skipping.", ticket.recipient)
                     pass
 
             try:
@@ -805,18 +1213,26 @@ class TicketsCog(ModmailCog, name="Threads"):
                     # not a problem if the user is already removed
                     pass
 
+            if self.bot.cluster is not None:
+                await self.bot.cluster.remove_ticket(ticket)
+
+            self.typing_debouncer.cancel(ticket.recipient_id)
+            self.typing_debouncer.cancel(ticket.thread_id)
+
             del ticket.messages
 
         if (log_embeds := ticket.log_message.embeds)[0].colour != CLOSED_COLOUR:
             log_embeds[0].colour = CLOSED_COLOUR
             await ticket.log_message.edit(embeds=log_embeds)
 
+        await self.upload_transcript(ticket, closer)
+
         await ticket.thread.edit(archived=True, locked=False)
 
         if not closer:
-            logger.debug(f"{closer!s} has closed thread {ticket.thread!s}.")
+            logger.debug("%s has closed thread %s.", closer, ticket.thread)
         else:
-            logger.debug(f"{ticket.thread!s} has been closed. A user was not provided.")
+            logger.debug("%s has been closed. A user was not provided.", ticket.thread)
 
     @is_modmail_thread()
     @commands.group(invoke_without_command=True)
@@ -830,7 +1246,49 @@ class TicketsCog(ModmailCog, name="Threads"):
 
         await self.close_thread(ticket, ctx.author, contents=contents)
 
-    @ModmailCog.listener(name="on_message")
+    @commands.command()
+    @commands.guild_only()
+    async def search(self, ctx: Context, *, query: str) -> None:
+        """Search the messages of every ticket for all of the provided words."""
+        await self.send_search_results(ctx, query)
+
+    @commands.command(aliases=("usersearch",))
+    @commands.guild_only()
+    async def search_user(self, ctx: Context, user: discord.User, *, query: str) -> None:
+        """Search the messages of tickets with the provided user for all of the provided words."""
+        await self.send_search_results(ctx, query, user)
+
+    async def send_search_results(
+        self, ctx: Context, query: str, user: Optional[discord.abc.User] = None
+    ) -> None:
+        """Search the messages of every ticket, or only the tickets with the user, and page the results."""
+        if self.search_index is None:
+            await ctx.send("Message indexing is disabled, so tickets cannot be searched.")
+            return
+
+        async with ctx.typing():
+            results = await self.search_index.search(
+                query, recipient_id=getattr(user, "id", None), limit=MAX_SEARCH_RESULTS
+            )
+
+        if not results:
+            await ctx.send("No messages matched that search.")
+            return
+
+        lines = []
+        for result in results:
+            timestamp = get_discord_formatted_timestamp(
+                arrow.get(result.created_at), TimeStampEnum.RELATIVE_TIME
+            )
+            lines.append(
+                f"**[{escape_markdown(result.author)}]({result.jump_url})** in <#{result.thread_id}> "
+                f"{timestamp}\n{result.snippet}\n"
+            )
+
+        embed = Embed(title=f"Search results for {query}"[:256], colour=INTERNAL_REPLY_COLOR)
+        await ButtonPaginator.paginate(lines, ctx.message, embed=embed)
+
+    @ModmailCog.listener(name="on_dm_relay")
     async def on_dm_message(self, message: discord.Message) -> None:
         """Relay all dms to a thread channel."""
         author = message.author
@@ -841,82 +1299,101 @@ class TicketsCog(ModmailCog, name="Threads"):
         if message.guild:
             return
 
-        ticket = await self.fetch_ticket(author.id)
-        if ticket is None:
-            # Thread doesn't exist, so create one.
-            async with self.thread_create_lock:
-                try:
-                    ticket = await self.create_ticket(message, raise_for_preexisting=True)
-                except ThreadAlreadyExistsError:
-                    # the thread already exists, so we still need to relay the message
-                    # thankfully a keyerror should NOT happen now
-                    ticket = await self.fetch_ticket(author.id)
-                    msg = await self.relay_message_to_guild(ticket, message)
-                else:
-                    msg = await self.relay_message_to_guild(ticket, message)
-                    if msg is None:
-                        return
-                    await message.channel.send(
-                        embeds=[
-                            Embed(
-                                title="Ticket Opened",
-                                description=f"Thanks for dming {self.bot.user.name}! "
-                                "A member of our staff will be with you shortly!",
-                                timestamp=message.created_at,
-                            )
-                        ]
-                    )
-        else:
-            msg = await self.relay_message_to_guild(ticket, message)
-            if msg is None:
-                return
+        with log_context(relay_id=message.id, recipient_id=author.id):
+            ticket = await self.fetch_ticket(author.id)
+            if ticket is None:
+                # Thread doesn't exist, so create one.
+                async with self.thread_create_lock:
+                    try:
+                        ticket = await self.create_ticket(message, raise_for_preexisting=True)
+                    except ThreadAlreadyExistsError:
+                        # the thread already exists, so we still need to relay the message
+                        # thankfully a keyerror should NOT happen now
+                        ticket = await self.fetch_ticket(author.id)
+                        msg = await self.relay_message_to_guild(ticket, message)
+                    else:
+                        msg = await self.relay_message_to_guild(ticket, message)
+                        if msg is None:
+                            return
+                        await message.channel.send(
+                            embeds=[
+                                Embed(
+                                    title="Ticket Opened",
+                                    description=f"Thanks for dming {self.bot.user.name}! "
+                                    "A member of our staff will be with you shortly!",
+                                    timestamp=message.created_at,
+                                )
+                            ]
+                        )
+            else:
+                msg = await self.relay_message_to_guild(ticket, message)
+                if msg is None:
+                    return
 
-        await message.add_reaction(ON_SUCCESS_EMOJI)
+            await message.add_reaction(ON_SUCCESS_EMOJI)
 
     @ModmailCog.listener(name="on_raw_message_edit")
     async def on_dm_message_edit(self, payload: discord.RawMessageUpdateEvent) -> None:
         """
         Receive a dm message edit, and edit the message in the channel.
 
+        Users often edit a message several times in a row, so edits are coalesced,
+        and only the last edit in each EDIT_COALESCE_WINDOW is relayed.
+
         In the future, this will be expanded to use a modified paginator.
         """
         if payload.guild_id is not None:
             return
 
+        # edits which don't change the content, such as embeds being added to links, aren't relayed
+        if payload.data.get("content") is None:
+            return
+
         if payload.data["author"]["id"] == self.bot.user.id:
             return
 
-        logger.trace(
-            f'User ID {payload.data["author"]["id"]} has edited a message '
-            f"in their dms with id {payload.message_id}"
-        )
-        ticket = await self.fetch_ticket(int(payload.data["author"]["id"]))
+        self.edit_coalescer.submit(payload.message_id, payload, self.relay_dm_message_edit)
+
+    async def relay_dm_message_edit(self, payload: discord.RawMessageUpdateEvent) -> None:
+        """Relay the last edit of a dm message to the thread, keeping the most recent former contents."""
+        author_id = payload.data["author"]["id"]
+        logger.trace("User ID %s has edited a message in their dms with id %s", author_id, payload.message_id)
+        ticket = await self.fetch_ticket(int(author_id))
         if ticket is None:
             logger.debug(
-                f"User {payload.data['author']['id']} edited a message in dms which "
-                "was related to a non-existant ticket."
+                "User %s edited a message in dms which was related to a non-existant ticket.", author_id
             )
             return
 
-        guild_msg = ticket.messages[payload.message_id]
+        try:
+            guild_msg = ticket.messages[payload.message_id]
+        except KeyError:
+            # the message was never relayed, or the ticket was closed during the coalesce window
+            logger.debug("Not relaying the edit of message %s, it has no relayed copy.", payload.message_id)
+            return
 
-        new_embed = guild_msg.embeds[0]
+        with log_context(**_ticket_log_fields(ticket), relay_id=payload.message_id):
+            new_embed = guild_msg.embeds[0]
 
-        data = payload.data
-        if data.get("content") is not None:
             new_embed.insert_field_at(0, name="Former contents", value=new_embed.description)
-            new_embed.description = data["content"]
-
-        await guild_msg.edit(embed=new_embed)
-
-        dm_channel = self.bot.get_partial_messageable(payload.channel_id, type=discord.DMChannel)
-        await dm_channel.send(
-            embed=discord.Embed(
-                "Successfully edited message.",
-                footer_text=f"Message ID: {payload.message_id}",
-            ),
-            reference=discord.MessageReference(message_id=payload.message_id, channel_id=payload.channel_id),
-        )
+            new_embed.description = payload.data["content"]
+            # newer contents are inserted first, so the oldest are dropped from the end
+            former = [i for i, field in enumerate(new_embed.fields) if field.name == "Former contents"]
+            for i in reversed(former[MAX_EDIT_HISTORY:]):
+                new_embed.remove_field(i)
+
+            await guild_msg.edit(embed=new_embed)
+
+            dm_channel = self.bot.get_partial_messageable(payload.channel_id, type=discord.DMChannel)
+            await dm_channel.send(
+                embed=discord.Embed(
+                    "Successfully edited message.",
+                    footer_text=f"Message ID: {payload.message_id}",
+                ),
+                reference=discord.MessageReference(
+                    message_id=payload.message_id, channel_id=payload.channel_id
+                ),
+            )
 
     @ModmailCog.listener(name="on_raw_message_delete")
     async def on_dm_message_delete(self, payload: discord.RawMessageDeleteEvent) -> None:
@@ -928,8 +1405,12 @@ class TicketsCog(ModmailCog, name="Threads"):
         if payload.guild_id is not None:
             return
 
+        # an edit made just before the message was deleted must not be relayed after the deletion
+        if self.edit_coalescer.cancel(payload.message_id):
+            logger.debug("Dropped the pending edit of deleted message %s.", payload.message_id)
+
         if payload.message_id in self.dm_deleted_messages:
-            logger.debug(f"Ignoring message deleted by self in {payload.channel_id}")
+            logger.debug("Ignoring message deleted by self in %s", payload.channel_id)
             self.dm_deleted_messages.remove(payload.message_id)
             return
 
@@ -943,28 +1424,31 @@ class TicketsCog(ModmailCog, name="Threads"):
             self.dms_to_users[payload.channel_id] = author_id
 
         logger.trace(
-            f"A message from {author_id} in dm channel {payload.channel_id} has "
-            f"been deleted with id {payload.message_id}."
+            "A message from %s in dm channel %s has been deleted with id %s.",
+            author_id,
+            payload.channel_id,
+            payload.message_id,
         )
         ticket = await self.fetch_ticket(author_id)
         if ticket is None:
             logger.debug(
-                f"User {author_id} edited a message in dms which was related to a non-existant ticket."
+                "User %s edited a message in dms which was related to a non-existant ticket.", author_id
             )
             return
 
-        guild_msg = ticket.messages[payload.message_id]
+        with log_context(**_ticket_log_fields(ticket), relay_id=payload.message_id):
+            guild_msg = ticket.messages[payload.message_id]
 
-        new_embed = guild_msg.embeds[0]
+            new_embed = guild_msg.embeds[0]
 
-        new_embed.colour = discord.Colour.red()
-        new_embed.insert_field_at(
-            0, name="Deleted", value=f"Deleted at {get_discord_formatted_timestamp(arrow.utcnow())}"
-        )
-        await guild_msg.edit(embed=new_embed)
+            new_embed.colour = discord.Colour.red()
+            new_embed.insert_field_at(
+                0, name="Deleted", value=f"Deleted at {get_discord_formatted_timestamp(arrow.utcnow())}"
+            )
+            await guild_msg.edit(embed=new_embed)
 
-        dm_channel = self.bot.get_partial_messageable(payload.channel_id, type=discord.DMChannel)
-        await dm_channel.send(embed=discord.Embed("Successfully deleted message."))
+            dm_channel = self.bot.get_partial_messageable(payload.channel_id, type=discord.DMChannel)
+            await dm_channel.send(embed=discord.Embed("Successfully deleted message."))
 
     @ModmailCog.listener(name="on_raw_message_delete")
     async def on_thread_message_delete(self, payload: discord.RawMessageDeleteEvent) -> None:
@@ -975,7 +1459,8 @@ class TicketsCog(ModmailCog, name="Threads"):
         if payload.message_id in self.thread_deleted_messages:
             self.thread_deleted_messages.remove(payload.message_id)
             logger.debug(
-                f"SKIPPING mirror of deleted message {payload.message_id} since it was deleted via a command."
+                "SKIPPING mirror of deleted message %s since it was deleted via a command.",
+                payload.message_id,
             )
             return
 
@@ -994,11 +1479,88 @@ class TicketsCog(ModmailCog, name="Threads"):
             # message was deleted as a command
             return
 
-        logger.info(
-            f"Relaying manual message deletion in {payload.channel_id} to {ticket.recipient.dm_channel}"
-        )
-        self.dm_deleted_messages.add(dm_msg.id)
-        await dm_msg.delete()
+        with log_context(**_ticket_log_fields(ticket), relay_id=payload.message_id):
+            logger.info(
+                "Relaying manual message deletion in %s to %s",
+                payload.channel_id,
+                ticket.recipient.dm_channel,
+            )
+            await self.delete_mirrored_messages([dm_msg])
+
+    @ModmailCog.listener(name="on_raw_bulk_message_delete")
+    async def on_thread_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent) -> None:
+        """
+        Delete the dms of messages which were purged from a thread.
+
+        Users can't bulk delete messages in dms, so only purges in threads are mirrored.
+        """
+        if payload.guild_id is None:
+            return
+
+        ticket = await self.fetch_ticket(payload.channel_id)
+        if ticket is None or ticket.thread.id != payload.channel_id:
+            return
+
+        dm_messages = []
+        for message_id in payload.message_ids:
+            if message_id in self.thread_deleted_messages:
+                self.thread_deleted_messages.remove(message_id)
+                continue
+            try:
+                dm_messages.append(ticket.messages[message_id])
+            except KeyError:
+                # not a relayed message, or it was deleted as a command
+                continue
+
+        if not dm_messages:
+            return
+
+        with log_context(**_ticket_log_fields(ticket)):
+            logger.info(
+                "Relaying the purge of %d messages in %s to %s",
+                len(payload.message_ids),
+                payload.channel_id,
+                ticket.recipient.dm_channel,
+            )
+            await self.delete_mirrored_messages(dm_messages)
+
+    async def delete_mirrored_messages(self, dm_messages: List[discord.Message]) -> int:
+        """
+        Delete the bot's messages in a ticket's dms, mirroring their deletion in the thread.
+
+        Bots can't bulk delete messages in dms, so each message takes its own request. The requests
+        share a small number of slots with every other ticket, and discord.py waits out the rate
+        limit of the dm channel, so a large purge is spread out instead of being sent all at once.
+        Messages sent by the user can't be deleted by the bot, and are skipped.
+
+        Returns the number of deleted messages.
+        """
+        dm_messages = [msg for msg in dm_messages if msg.author.id == self.bot.user.id]
+        # once the recipient blocks the bot, every remaining request would fail the same way
+        forbidden = False
+
+        async def delete(dm_msg: discord.Message) -> bool:
+            nonlocal forbidden
+            async with self.mirrored_delete_semaphore:
+                if forbidden:
+                    return False
+                self.dm_deleted_messages.add(dm_msg.id)
+                try:
+                    await dm_msg.delete()
+                except discord.NotFound:
+                    # already gone, so no delete event will arrive for it
+                    self.dm_deleted_messages.discard(dm_msg.id)
+                    return False
+                except discord.HTTPException as e:
+                    self.dm_deleted_messages.discard(dm_msg.id)
+                    if isinstance(e, discord.Forbidden):
+                        forbidden = True
+                    logger.warning("Unable to delete message %s in dms.", dm_msg.id, exc_info=True)
+                    return False
+                return True
+
+        results = await asyncio.gather(*(delete(dm_msg) for dm_msg in dm_messages))
+        return sum(results)
 
     @ModmailCog.listener(name="on_typing")
     async def on_typing(
@@ -1019,8 +1581,8 @@ class TicketsCog(ModmailCog, name="Threads"):
             if ticket is None:
                 # Thread doesn't exist, so there's nowhere to relay the typing event.
                 return
-            logger.debug(f"Relaying typing event from {user!s} in {channel!s} to {ticket.recipient!s}.")
-            await ticket.recipient.trigger_typing()
+            logger.debug("Relaying typing event from %s in %s to %s.", user, channel, ticket.recipient)
+            await self.typing_debouncer.trigger(ticket.recipient, ticket.recipient_id)
 
         # ! Due to a library bug this tree will never be run
         # it can be tracked here: https://github.com/Rapptz/discord.py/issues/7432
@@ -1030,9 +1592,9 @@ class TicketsCog(ModmailCog, name="Threads"):
                 # User doesn't have a ticket, so nowhere to relay the event.
                 return
             else:
-                logger.debug(f"Relaying typing event from {user!s} in {channel!s} to {ticket.recipient!s}.")
+                logger.debug("Relaying typing event from %s in %s to %s.", user, channel, ticket.thread)
 
-                await ticket.thread.trigger_typing()
+                await self.typing_debouncer.trigger(ticket.thread, ticket.thread_id)
 
         else:
             return
@@ -1048,10 +1610,10 @@ class TicketsCog(ModmailCog, name="Threads"):
         if before.archived != after.archived and not after.archived:
             return
 
-        # channel must have the parent of the relay channel
+        # channel must have one of the relay channels as its parent
         # while this should never change, I'm using `before` in case for some reason
         # threads get the support to change their parent channel, which would be great.
-        if before.parent_id != self.relay_channel.id:
+        if before.parent_id not in self.relay_channels:
             return
         # ignore the bot closing threads
         # NOTE: archiver_id is always gonna be None.
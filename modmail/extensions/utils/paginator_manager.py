@@ -7,6 +7,7 @@ from typing import TYPE_CHECKING
 from discord import InteractionType
 
 from modmail.utils.cogs import ModmailCog
+from modmail.utils.pagination import PaginatorState, StatelessPaginator
 
 
 if TYPE_CHECKING:
@@ -19,7 +20,7 @@ logger: ModmailLogger = logging.getLogger(__name__)
 
 
 class PaginatorManager(ModmailCog):
-    """Handles paginators that were still active when the bot shut down."""
+    """Handles stateless paginators, and paginators that were still active when the bot shut down."""
 
     def __init__(self, bot: ModmailBot):
         self.bot = bot
@@ -27,7 +28,7 @@ class PaginatorManager(ModmailCog):
     @ModmailCog.listener()
     async def on_interaction(self, interaction: Interaction) -> None:
         """
-        Remove components from paginator messages if they fail.
+        Turn the pages of stateless paginators, and remove components from paginator messages if they fail.
 
         The paginator handles all interactions while it is active, but if the bot is restarted,
         those interactions stop being dealt with.
@@ -38,8 +39,14 @@ class PaginatorManager(ModmailCog):
         # paginator only has component interactions
         if not interaction.type == InteractionType.component:
             return
-        logger.debug(f"Interaction sent by {interaction.user}.")
-        logger.trace(f"Interaction data: {interaction.data}")
+        logger.debug("Interaction sent by %s.", interaction.user)
+        logger.trace("Interaction data: %s", interaction.data)
+
+        state = PaginatorState.from_custom_id(interaction.data["custom_id"])
+        if state is not None:
+            await StatelessPaginator.handle_interaction(interaction, state)
+            return
+
         if (
             interaction.data["custom_id"].startswith("pag_")
             and interaction.message.author.id == self.bot.user.id
@@ -1,13 +1,45 @@
+import atexit
+import collections
+import contextlib
+import contextvars
+import datetime
 import functools
+import gzip
+import json
 import logging
+import logging.handlers
+import os
 import pathlib
-from typing import Any, Dict, Union
+import queue
+import random
+import re
+import shutil
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+
+try:
+    # python 3.14 added zstandard to the standard library
+    from compression import zstd
+except ImportError:
+    zstd = None
 
 
 __all__ = [
     "DEFAULT",
     "get_logging_level",
+    "get_log_format",
+    "get_log_rotation",
     "set_logger_levels",
+    "set_logger_rate_limits",
+    "get_log_context",
+    "log_context",
+    "ContextFilter",
+    "CompressingRotatingFileHandler",
+    "JSONFormatter",
+    "RateLimitFilter",
     "ModmailLogger",
 ]
 
@@ -18,6 +50,16 @@ logging.addLevelName(logging.NOTICE, "NOTICE")
 
 DEFAULT = logging.INFO
 
+LOG_FORMATS = ("text", "json")
+LOG_COMPRESSIONS = ("auto", "gzip", "zstd", "none")
+
+LOG_FILE_SIZE = 8 * (2**10) ** 2  # 8MB, discord upload limit
+
+_SIZE_SUFFIXES = {"": 1, "k": 2**10, "m": 2**20, "g": 2**30}
+_DURATION_SUFFIXES = {"": 1, "s": 1, "m": 60, "h": 60 * 60, "d": 60 * 60 * 24}
+
+_log_context: "contextvars.ContextVar[Dict[str, Any]]" = contextvars.ContextVar("modmail_log_context")
+
 
 def get_log_level_from_name(name: Union[str, int]) -> int:
     """Find the logging level given the provided name."""
@@ -66,6 +108,70 @@ def get_logging_level() -> None:
     return level
 
 
+def get_log_format() -> str:
+    """
+    Get the configured log output format, defaulting to text.
+
+    Set MODMAIL_LOG_FORMAT to `json` to emit one json object per line instead of the human readable format.
+    """
+    key = "MODMAIL_LOG_FORMAT"
+    log_format = _get_env().get(key, LOG_FORMATS[0]).strip().lower()
+    if log_format not in LOG_FORMATS:
+        print(
+            f"Environment variable {key} must be one of {', '.join(LOG_FORMATS)}.\n"
+            f"To resolve this issue, set {key} to a valid value, or remove it from the environment.\n"
+            "It is also possible that it is sourced from an .env file."
+        )
+        exit(1)
+    return log_format
+
+
+def _parse_env_quantity(key: str, default: int, suffixes: Dict[str, int]) -> int:
+    """Parse an integer with an optional unit suffix from the environment, exiting if it is invalid."""
+    value = _get_env().get(key, None)
+    if value is None:
+        return default
+
+    match = re.fullmatch(r"\s*(\d+)\s*([a-z]?)\s*", value.lower())
+    if match is None or match.group(2) not in suffixes:
+        print(
+            f"Environment variable {key} must be an integer, optionally followed by one of the units "
+            f"{', '.join(unit for unit in suffixes if unit)}.\n"
+            f"To resolve this issue, set {key} to a valid value, or remove it from the environment.\n"
+            "It is also possible that it is sourced from an .env file."
+        )
+        exit(1)
+    return int(match.group(1)) * suffixes[match.group(2)]
+
+
+def get_log_rotation() -> Dict[str, Any]:
+    """
+    Get the configured log file rotation settings.
+
+    MODMAIL_LOG_MAX_BYTES: rotate once the log file reaches this size, eg `8M`. 0 disables.
+    MODMAIL_LOG_ROTATE_INTERVAL: rotate after this much time has passed, eg `6h`. 0 disables.
+    MODMAIL_LOG_DISK_BUDGET: total size of the log file and all archives, eg `512M`. 0 disables.
+    MODMAIL_LOG_COMPRESSION: one of auto, gzip, zstd, or none. Auto uses zstd when available.
+
+    The returned dict can be passed as keyword arguments to CompressingRotatingFileHandler.
+    """
+    compression = _get_env().get("MODMAIL_LOG_COMPRESSION", "auto").strip().lower()
+    if compression not in LOG_COMPRESSIONS:
+        print(
+            f"Environment variable MODMAIL_LOG_COMPRESSION must be one of {', '.join(LOG_COMPRESSIONS)}.\n"
+            "To resolve this issue, set it to a valid value, or remove it from the environment.\n"
+            "It is also possible that it is sourced from an .env file."
+        )
+        exit(1)
+
+    return {
+        "max_bytes": _parse_env_quantity("MODMAIL_LOG_MAX_BYTES", LOG_FILE_SIZE, _SIZE_SUFFIXES),
+        "interval": _parse_env_quantity("MODMAIL_LOG_ROTATE_INTERVAL", 0, _DURATION_SUFFIXES),
+        "disk_budget": _parse_env_quantity("MODMAIL_LOG_DISK_BUDGET", LOG_FILE_SIZE * 8, _SIZE_SUFFIXES),
+        "compression": compression,
+    }
+
+
 def set_logger_levels() -> None:
     """
     Set all loggers to the provided environment variables.
@@ -86,6 +192,68 @@ def set_logger_levels() -> None:
         for logger in loggers.split(","):
             logging.getLogger(logger.strip()).setLevel(level)
 
+    set_logger_rate_limits()
+
+
+def _parse_logger_options(key: str, parse: Callable[[str], Any]) -> Dict[str, Any]:
+    """Parse a comma separated list of `logger=value` pairs from the environment, exiting if invalid."""
+    value = _get_env().get(key, None)
+    if not value:
+        return {}
+
+    options = {}
+    for item in value.split(","):
+        name, _, option = item.partition("=")
+        try:
+            options[name.strip()] = parse(option.strip())
+        except ValueError:
+            print(
+                f"Environment variable {key} has an invalid entry {item.strip()!r}.\n"
+                f"To resolve this issue, fix or remove the entry from {key}.\n"
+                "It is also possible that it is sourced from an .env file."
+            )
+            exit(1)
+    return options
+
+
+def _parse_rate(option: str) -> Tuple[int, float]:
+    count, _, per = option.partition("/")
+    count, per = int(count), float(per)
+    if count < 0 or per <= 0:
+        raise ValueError("rate must be a positive amount of records per a positive amount of seconds")
+    return count, per
+
+
+def _parse_sample_rate(option: str) -> float:
+    rate = float(option)
+    if not 0 <= rate <= 1:
+        raise ValueError("sample rate must be between 0 and 1")
+    return rate
+
+
+def set_logger_rate_limits() -> None:
+    """
+    Attach a RateLimitFilter to loggers provided by environment variables.
+
+    MODMAIL_LOGGERS_RATELIMIT is split by `,` into `logger=count/seconds` pairs,
+    eg `modmail.extensions.threads=20/60` allows 20 records from each log call per minute.
+
+    MODMAIL_LOGGERS_SAMPLE is split by `,` into `logger=rate` pairs,
+    eg `modmail.utils.pagination=0.1` keeps roughly one in ten records.
+    """
+    rate_limits = _parse_logger_options("MODMAIL_LOGGERS_RATELIMIT", _parse_rate)
+    sample_rates = _parse_logger_options("MODMAIL_LOGGERS_SAMPLE", _parse_sample_rate)
+
+    for name in rate_limits.keys() | sample_rates.keys():
+        logger = logging.getLogger(name)
+        for existing in logger.filters[:]:
+            if isinstance(existing, RateLimitFilter):
+                logger.removeFilter(existing)
+                existing.close()
+
+        rate, per = rate_limits.get(name, (None, None))
+        logger.addFilter(RateLimitFilter(rate=rate, per=per, sample_rate=sample_rates.get(name)))
+
 
 def get_log_dir() -> pathlib.Path:
     """
@@ -118,6 +286,348 @@ def get_log_dir() -> pathlib.Path:
     return log_path.resolve()
 
 
+def get_log_context() -> Dict[str, Any]:
+    """Return the fields which are currently attached to log records created in this context."""
+    return _log_context.get({})
+
+
+@contextlib.contextmanager
+def log_context(**fields: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Attach the provided fields to all log records created within this context.
+
+    Contexts can be nested, inner fields are merged with and take precedence over the outer fields.
+    As this uses contextvars, the fields are also inherited by any tasks created within the context.
+    """
+    token = _log_context.set({**get_log_context(), **fields})
+    try:
+        yield _log_context.get()
+    finally:
+        _log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Add the current log context to each record as the `context` attribute."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Attach the context. This never filters out a record."""
+        if not hasattr(record, "context"):
+            record.context = get_log_context()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Sample and/or rate limit records from a logger.
+
+    Records are grouped by their level and unformatted message, so every call site is limited
+    separately, regardless of the arguments it was called with.
+
+    `rate` records of each group are allowed through every `per` seconds, and `sample_rate` is the
+    chance of keeping a record that was not rate limited. Every `summary_interval` seconds, a summary
+    of how many records of each group were suppressed is logged, either before the group's next record
+    which is let through, or from a background thread if the group has gone quiet. Any remaining
+    summaries are logged when the filter is closed, which happens at exit.
+
+    Like all logger filters, this only applies to records made directly with the logger it is attached to,
+    not records propagated from its children.
+    """
+
+    MAX_GROUPS = 1024
+
+    def __init__(
+        self,
+        *,
+        rate: Optional[int] = None,
+        per: Optional[float] = None,
+        sample_rate: Optional[float] = None,
+        summary_interval: Optional[float] = None,
+    ):
+        super().__init__()
+        if (rate is None) != (per is None):
+            raise ValueError("rate and per must be provided together.")
+        self.rate = rate
+        self.per = per
+        self.sample_rate = sample_rate
+        self.summary_interval = summary_interval if summary_interval is not None else (per or 60.0)
+
+        # maps (levelno, msg) to [window start, records in window, suppressed, last summary, first record]
+        self._groups: "collections.OrderedDict[Tuple[int, Any], List]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        # started once a record is first suppressed, so filters which never suppress anything don't need it
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+    def _get_group(self, record: logging.LogRecord, now: float) -> Tuple[List, Optional[logging.LogRecord]]:
+        """Return the record's group, and the last summary of the group evicted to make room for it."""
+        key = (record.levelno, record.msg)
+        group = self._groups.get(key)
+        evicted = None
+        if group is None:
+            group = self._groups[key] = [now, 0, 0, now, record]
+            if len(self._groups) > self.MAX_GROUPS:
+                # the evicted group's suppressed records would otherwise never be reported
+                _, oldest = self._groups.popitem(last=False)
+                evicted = self._take_summary(oldest, now, force=True)
+        else:
+            self._groups.move_to_end(key)
+        return group, evicted
+
+    def _allowed(self, group: List, now: float) -> bool:
+        if self.rate is not None:
+            if now - group[0] >= self.per:
+                group[0], group[1] = now, 0
+            if group[1] >= self.rate:
+                return False
+            group[1] += 1
+        if self.sample_rate is not None and random.random() >= self.sample_rate:
+            return False
+        return True
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Return whether the record should be logged, logging a summary of suppressed records if due."""
+        now = time.monotonic()
+        summary = None
+        with self._lock:
+            group, evicted = self._get_group(record, now)
+            allowed = self._allowed(group, now)
+            if allowed:
+                summary = self._take_summary(group, now)
+            else:
+                group[2] += 1
+                if self._flusher is None and not self._closed.is_set():
+                    self._start_flusher()
+
+        for pending in (evicted, summary):
+            if pending is not None:
+                self._emit(pending)
+        return allowed
+
+    def _take_summary(self, group: List, now: float, force: bool = False) -> Optional[logging.LogRecord]:
+        """Return the summary of a group's suppressed records if one is due, and reset its count."""
+        suppressed, since, first = group[2], group[3], group[4]
+        if not suppressed or (not force and now - since < self.summary_interval):
+            return None
+        group[2], group[3] = 0, now
+        return logging.LogRecord(
+            first.name,
+            first.levelno,
+            first.pathname,
+            first.lineno,
+            "Suppressed %d similar records in the last %.0f seconds: %r",
+            (suppressed, now - since, first.msg),
+            None,
+            func=first.funcName,
+        )
+
+    @staticmethod
+    def _emit(summary: logging.LogRecord) -> None:
+        # bypass the logger's filters, including this one, while still propagating to handlers
+        logging.getLogger(summary.name).callHandlers(summary)
+
+    def _start_flusher(self) -> None:
+        self._flusher = threading.Thread(
+            target=self._flush_periodically, name="modmail-log-summaries", daemon=True
+        )
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.wait(self.summary_interval):
+            self.flush()
+
+    def flush(self, force: bool = False) -> None:
+        """Log the summaries which are due, or every pending summary if forced."""
+        now = time.monotonic()
+        with self._lock:
+            summaries = [self._take_summary(group, now, force) for group in self._groups.values()]
+        for summary in summaries:
+            if summary is not None:
+                self._emit(summary)
+
+    def close(self) -> None:
+        """Stop the background thread, and log every pending summary."""
+        self._closed.set()
+        if self._flusher is not None:
+            atexit.unregister(self.close)
+            self._flusher.join(timeout=5)
+            self._flusher = None
+        self.flush(force=True)
+
+
+class CompressingRotatingFileHandler(logging.handlers.BaseRotatingHandler):
+    """
+    A file handler which rotates by size and/or time, and compresses the rotated files.
+
+    Rotated files are renamed to `<filename>.<timestamp>` and compressed on a background thread,
+    so emitting a record never waits on compression. After each compression, the oldest archives
+    are deleted until the log file and all of its archives fit within `disk_budget` bytes.
+    """
+
+    def __init__(
+        self,
+        filename: Union[str, os.PathLike],
+        *,
+        max_bytes: int = 0,
+        interval: int = 0,
+        disk_budget: int = 0,
+        compression: str = "auto",
+        encoding: Optional[str] = "utf-8",
+    ):
+        super().__init__(filename, "a", encoding=encoding)
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.disk_budget = disk_budget
+
+        if compression == "auto":
+            compression = "gzip" if zstd is None else "zstd"
+        elif compression == "zstd" and zstd is None:
+            logging.getLogger(__name__).warning("zstd is not available on this python, using gzip instead.")
+            compression = "gzip"
+        self.compression = compression
+
+        self.rollover_at = self._compute_rollover_at()
+
+        self._archive_queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._archive_thread = threading.Thread(
+            target=self._archive_worker, name="modmail-log-archiver", daemon=True
+        )
+        self._archive_thread.start()
+
+        # compress anything left over from an unclean shutdown, and apply the budget
+        for path in self._archived_files():
+            if not path.endswith((".gz", ".zst")):
+                self._archive_queue.put(path)
+        self._archive_queue.put("")
+
+    def _compute_rollover_at(self) -> Optional[float]:
+        if self.interval <= 0:
+            return None
+        return time.time() + self.interval
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:  # noqa: N802
+        """
+        Determine if the log file should be rolled over.
+
+        Unlike logging.handlers.RotatingFileHandler, this does not format the record an extra time to
+        find its exact length. The file may exceed max_bytes by a single record.
+        """
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        if self.max_bytes > 0:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.stream.tell() >= self.max_bytes:
+                return True
+        return False
+
+    def doRollover(self) -> None:  # noqa: N802
+        """Rename the current log file, and queue it to be compressed."""
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            timestamp = time.strftime("%Y%m%d-%H%M%S")
+            dest = f"{self.baseFilename}.{timestamp}"
+            count = 0
+            while any(os.path.exists(dest + ext) for ext in ("", ".gz", ".zst")):
+                count += 1
+                dest = f"{self.baseFilename}.{timestamp}-{count}"
+            os.rename(self.baseFilename, dest)
+            self._archive_queue.put(dest)
+
+        self.stream = self._open()
+        self.rollover_at = self._compute_rollover_at()
+
+    def _archived_files(self) -> List[str]:
+        """Return the rotated files of this log, oldest first."""
+        directory, name = os.path.split(self.baseFilename)
+        files = []
+        for entry in os.scandir(directory):
+            if entry.name.startswith(name + ".") and entry.is_file():
+                files.append(entry.path)
+        return sorted(files, key=os.path.getmtime)
+
+    def _compress(self, path: str) -> None:
+        if self.compression == "none":
+            return
+        if self.compression == "zstd":
+            dest, opener = path + ".zst", zstd.open
+        else:
+            dest, opener = path + ".gz", gzip.open
+        with open(path, "rb") as src, opener(dest, "wb") as dst:
+            shutil.copyfileobj(src, dst, 2**20)
+        shutil.copystat(path, dest)
+        os.remove(path)
+
+    def _enforce_disk_budget(self) -> None:
+        if self.disk_budget <= 0:
+            return
+        archives = self._archived_files()
+        sizes = {path: os.path.getsize(path) for path in archives}
+        total = sum(sizes.values())
+        if os.path.exists(self.baseFilename):
+            total += os.path.getsize(self.baseFilename)
+        for path in archives:
+            if total <= self.disk_budget:
+                break
+            os.remove(path)
+            total -= sizes[path]
+
+    def _archive_worker(self) -> None:
+        """Compress rotated files as they are queued. An empty string only applies the disk budget."""
+        while True:
+            path = self._archive_queue.get()
+            try:
+                if path is None:
+                    # the log file has grown since the last rotation, so apply the budget a final time
+                    self._enforce_disk_budget()
+                    return
+                if path:
+                    self._compress(path)
+                self._enforce_disk_budget()
+            except Exception:
+                # we can't log this with the logging system, as that could recurse into this handler
+                traceback.print_exc()
+            finally:
+                self._archive_queue.task_done()
+
+    def close(self) -> None:
+        """Close the log file, and wait for any queued archives to be compressed."""
+        super().close()
+        if self._archive_thread.is_alive():
+            self._archive_queue.put(None)
+            self._archive_thread.join(timeout=30)
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Format records as compact, single line json objects.
+
+    Any fields added with `log_context` are included as top level keys of the object.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format the provided record as json."""
+        data = {
+            "time": datetime.datetime.fromtimestamp(record.created, tz=datetime.timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        data.update(getattr(record, "context", None) or get_log_context())
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(data, separators=(",", ":"), default=str)
+
+
 class ModmailLogger(logging.Logger):
     """Custom logging class implementation."""
 
@@ -130,7 +640,9 @@ class ModmailLogger(logging.Logger):
 
         logger.trace("Houston, we have a %s", "low-level problem", exc_info=1)
         """
-        self.log(logging.TRACE, msg, *args, **kwargs)
+        if self.isEnabledFor(logging.TRACE):
+            kwargs["stacklevel"] = kwargs.get("stacklevel", 1) + 1
+            self._log(logging.TRACE, msg, args, **kwargs)
 
     def notice(self, msg: Any, *args, **kwargs) -> None:
         """
@@ -141,4 +653,6 @@ class ModmailLogger(logging.Logger):
 
         logger.notice("Houston, we have a %s", "not-quite-a-warning problem", exc_info=1)
         """
-        self.log(logging.NOTICE, msg, *args, **kwargs)
+        if self.isEnabledFor(logging.NOTICE):
+            kwargs["stacklevel"] = kwargs.get("stacklevel", 1) + 1
+            self._log(logging.NOTICE, msg, args, **kwargs)
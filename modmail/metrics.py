@@ -0,0 +1,446 @@
+"""
+Runtime metrics, exposed in the Prometheus text format.
+
+Metrics are always collected, since recording them is only a few dictionary lookups.
+They are only served if the metrics endpoint is enabled in the configuration, by a small aiohttp server
+which runs on the bot's event loop.
+"""
+
+import bisect
+import contextlib
+import logging
+import math
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import aiohttp
+import aiohttp.web
+import discord
+
+
+if TYPE_CHECKING:  # pragma: nocover
+    from modmail.log import ModmailLogger
+
+logger: "ModmailLogger" = logging.getLogger(__name__)
+
+__all__ = (
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricsServer",
+    "Registry",
+    "REGISTRY",
+    "connection_trace_config",
+    "instrument_http",
+    "rate_limit_trace_config",
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Registry:
+    """A collection of metrics, which can be rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, "_Metric"] = {}
+
+    def register(self, metric: "_Metric") -> None:
+        """Add a metric to the registry. Metric names must be unique."""
+        if metric.name in self._metrics:
+            raise ValueError(f"A metric named {metric.name} is already registered.")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    """Base class of all metrics, which may have a child per set of label values."""
+
+    type: str
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        *,
+        registry: Optional[Registry] = REGISTRY,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        if registry is not None:
+            registry.register(self)
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: Any) -> Any:
+        """Return the child of this metric with the provided label values."""
+        key = tuple(str(value) for value in values)
+        try:
+            return self._children[key]
+        except KeyError:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} has labels {self.labelnames}, but got {values}.") from None
+            child = self._children[key] = self._new_child()
+            return child
+
+    def _child_samples(self, labels: Tuple[str, ...], child: Any) -> Iterator[str]:
+        yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(child.get())}"
+
+    def samples(self) -> Iterator[str]:
+        """Yield a line for each sample of this metric."""
+        for labels, child in list(self._children.items()):
+            yield from self._child_samples(labels, child)
+
+
+class _Value:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def get(self) -> float:
+        if self.function is not None:
+            return self.function()
+        return self.value
+
+
+class _CounterValue(_Value):
+    __slots__ = ()
+
+    def inc(self, amount: float = 1) -> None:
+        """Increase the counter. Counters can only go up."""
+        if amount < 0:
+            raise ValueError("Counters can only be increased.")
+        self.value += amount
+
+
+class _GaugeValue(_Value):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1) -> None:
+        """Decrease the gauge."""
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        """Set the gauge to a value."""
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Use the value returned by the function whenever the gauge is read."""
+        self.function = function
+
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * len(upper_bounds)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record an observation."""
+        self.counts[bisect.bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+
+    @contextlib.contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the number of seconds spent in the context."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Counter(_Metric):
+    """A value which only goes up, such as the number of relayed messages."""
+
+    type = "counter"
+
+    def _new_child(self) -> _CounterValue:
+        return _CounterValue()
+
+    def inc(self, amount: float = 1) -> None:
+        """Increase the counter of a metric without labels."""
+        self._children[()].inc(amount)
+
+
+class Gauge(_Metric):
+    """A value which can go up and down, such as the number of open tickets."""
+
+    type = "gauge"
+
+    def _new_child(self) -> _GaugeValue:
+        return _GaugeValue()
+
+    def inc(self, amount: float = 1) -> None:
+        """Increase the gauge of a metric without labels."""
+        self._children[()].inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        """Decrease the gauge of a metric without labels."""
+        self._children[()].dec(amount)
+
+    def set(self, value: float) -> None:
+        """Set the gauge of a metric without labels."""
+        self._children[()].set(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the gauge of a metric without labels from a function."""
+        self._children[()].set_function(function)
+
+
+class Histogram(_Metric):
+    """Counts observations, such as request durations, in buckets."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        *,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        registry: Optional[Registry] = REGISTRY,
+    ):
+        self.upper_bounds = tuple(sorted(buckets))
+        if self.upper_bounds[-1] != math.inf:
+            self.upper_bounds += (math.inf,)
+        super().__init__(name, documentation, labelnames, registry=registry)
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.upper_bounds)
+
+    def observe(self, value: float) -> None:
+        """Record an observation of a metric without labels."""
+        self._children[()].observe(value)
+
+    def time(self) -> contextlib.AbstractContextManager:
+        """Observe the time spent in the context, for a metric without labels."""
+        return self._children[()].time()
+
+    def _child_samples(self, labels: Tuple[str, ...], child: _HistogramValue) -> Iterator[str]:
+        names = self.labelnames + ("le",)
+        cumulative = 0
+        for upper_bound, count in zip(self.upper_bounds, child.counts):
+            cumulative += count
+            label_string = _format_labels(names, labels + (_format_value(upper_bound),))
+            yield f"{self.name}_bucket{label_string} {cumulative}"
+        label_string = _format_labels(self.labelnames, labels)
+        yield f"{self.name}_sum{label_string} {_format_value(child.sum)}"
+        yield f"{self.name}_count{label_string} {cumulative}"
+
+
+OPEN_TICKETS = Gauge("modmail_open_tickets", "Number of open tickets.")
+RELAYED_MESSAGES = Counter(
+    "modmail_relayed_messages_total",
+    "Messages relayed between users and threads, by direction and outcome.",
+    ("direction", "outcome"),
+)
+RELAY_DURATION = Histogram(
+    "modmail_relay_duration_seconds", "Time taken to relay a message, by direction.", ("direction",)
+)
+DISCORD_REQUEST_DURATION = Histogram(
+    "modmail_discord_request_duration_seconds",
+    "Time taken by requests to discord's REST api, including waiting for rate limits.",
+    ("method", "route", "status"),
+)
+DISCORD_RATE_LIMITED = Counter(
+    "modmail_discord_rate_limited_total", "Responses from discord with a 429 status, by scope.", ("scope",)
+)
+EVENT_LOOP_LAG = Gauge("modmail_event_loop_lag_seconds", "Most recently measured event loop lag.")
+EVENT_LOOP_LAG_HISTOGRAM = Histogram(
+    "modmail_event_loop_lag_distribution_seconds",
+    "Distribution of event loop lag.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+DISPATCHER_HANDLER_DURATION = Histogram(
+    "modmail_dispatcher_handler_duration_seconds",
+    "Time taken by dispatcher event handlers, by event and handler.",
+    ("event", "handler"),
+)
+HTTP_CONNECTIONS = Counter(
+    "modmail_http_connections_total",
+    "Connections used for http requests, by pool and whether they were new or reused.",
+    ("pool", "connection"),
+)
+HTTP_CONNECTION_WAIT = Histogram(
+    "modmail_http_connection_wait_seconds",
+    "Time requests waited for a free connection in a full pool.",
+    ("pool",),
+)
+DNS_CACHE = Counter(
+    "modmail_dns_cache_total", "Host name lookups, by pool and whether they were cached.", ("pool", "result")
+)
+
+
+def instrument_http(http: discord.http.HTTPClient) -> None:
+    """
+    Record the duration of every request made by discord.py, the 429s it receives, and its connection reuse.
+
+    discord.py retries rate limited requests itself, so the 429s are counted with a trace config
+    on its session, which only exists once the bot has logged in. Connections are traced the same way.
+    """
+    request = http.request
+
+    async def timed_request(route: discord.http.Route, **kwargs) -> Any:
+        status = "error"
+        start = time.perf_counter()
+        try:
+            response = await request(route, **kwargs)
+            status = "ok"
+            return response
+        except discord.HTTPException as e:
+            status = str(e.status)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            DISCORD_REQUEST_DURATION.labels(route.method, route.path, status).observe(duration)
+
+    http.request = timed_request
+
+    # discord.py does not allow passing trace configs to the session it creates
+    session = getattr(http, "_HTTPClient__session", None)
+    if isinstance(session, aiohttp.ClientSession):
+        session.trace_configs.append(rate_limit_trace_config())
+        session.trace_configs.append(connection_trace_config("api"))
+    else:
+        logger.warning("Unable to trace 429s and connections, discord.py's session could not be found.")
+
+
+def rate_limit_trace_config() -> aiohttp.TraceConfig:
+    """Return a trace config which counts responses with a 429 status."""
+
+    async def on_request_end(
+        session: aiohttp.ClientSession, context: Any, params: aiohttp.TraceRequestEndParams
+    ) -> None:
+        if params.response.status == 429:
+            DISCORD_RATE_LIMITED.labels(params.response.headers.get("X-RateLimit-Scope", "unknown")).inc()
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.freeze()
+    return trace_config
+
+
+def connection_trace_config(pool: str) -> aiohttp.TraceConfig:
+    """Return a trace config which records connection reuse, pool waits, and dns cache hits for a pool."""
+
+    async def on_connection_queued_start(
+        session: aiohttp.ClientSession, context: Any, params: aiohttp.TraceConnectionQueuedStartParams
+    ) -> None:
+        context.queued_at = time.perf_counter()
+
+    async def on_connection_queued_end(
+        session: aiohttp.ClientSession, context: Any, params: aiohttp.TraceConnectionQueuedEndParams
+    ) -> None:
+        HTTP_CONNECTION_WAIT.labels(pool).observe(time.perf_counter() - context.queued_at)
+
+    async def on_connection_create_end(
+        session: aiohttp.ClientSession, context: Any, params: aiohttp.TraceConnectionCreateEndParams
+    ) -> None:
+        HTTP_CONNECTIONS.labels(pool, "new").inc()
+
+    async def on_connection_reuseconn(
+        session: aiohttp.ClientSession, context: Any, params: aiohttp.TraceConnectionReuseconnParams
+    ) -> None:
+        HTTP_CONNECTIONS.labels(pool, "reused").inc()
+
+    async def on_dns_cache_hit(
+        session: aiohttp.ClientSession, context: Any, params: aiohttp.TraceDnsCacheHitParams
+    ) -> None:
+        DNS_CACHE.labels(pool, "hit").inc()
+
+    async def on_dns_cache_miss(
+        session: aiohttp.ClientSession, context: Any, params: aiohttp.TraceDnsCacheMissParams
+    ) -> None:
+        DNS_CACHE.labels(pool, "miss").inc()
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_queued_start.append(on_connection_queued_start)
+    trace_config.on_connection_queued_end.append(on_connection_queued_end)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+    trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+    trace_config.freeze()
+    return trace_config
+
+
+class MetricsServer:
+    """
+    Serves the metrics of a registry at `/metrics`.
+
+    Event loop lag is measured by `modmail.monitor.LoopMonitor`, which runs whether or not this is enabled.
+    """
+
+    def __init__(self, host: str, port: int, *, registry: Registry = REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._runner: Optional[aiohttp.web.AppRunner] = None
+
+        self.app = aiohttp.web.Application()
+        self.app.router.add_get("/metrics", self._metrics)
+
+    async def _metrics(self, request: aiohttp.web.Request) -> aiohttp.web.Response:
+        body = self.registry.render().encode()
+        return aiohttp.web.Response(body=body, headers={"Content-Type": CONTENT_TYPE})
+
+    @property
+    def addresses(self) -> List[Any]:
+        """The addresses the server is listening on."""
+        return self._runner.addresses if self._runner is not None else []
+
+    async def start(self) -> None:
+        """Start serving metrics on the running event loop."""
+        self._runner = aiohttp.web.AppRunner(self.app, handle_signals=False, access_log=None)
+        await self._runner.setup()
+        await aiohttp.web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("Serving metrics on http://%s:%s/metrics", self.host, self.port)
+
+    async def close(self) -> None:
+        """Stop serving metrics."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
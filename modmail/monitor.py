@@ -0,0 +1,137 @@
+"""
+Event loop lag and slow callback monitoring.
+
+A task on the event loop wakes up at a fixed interval, and measures how late it was woken up.
+A watchdog thread checks that the task keeps waking up. If it doesn't for longer than a threshold,
+the loop is blocked, so the watchdog captures the stack of the event loop's thread, showing what is
+blocking it. This is similar to asyncio's debug mode, but only costs a wake up every so often,
+so it is safe to run in production.
+"""
+
+import asyncio
+import collections
+import dataclasses
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import TYPE_CHECKING, Deque, List, Optional
+
+from modmail import metrics
+
+
+if TYPE_CHECKING:  # pragma: nocover
+    from modmail.log import ModmailLogger
+
+logger: "ModmailLogger" = logging.getLogger(__name__)
+
+__all__ = ("LoopMonitor", "SlowCallback")
+
+# how often the lag is measured
+LAG_SAMPLE_INTERVAL = 0.1
+# how long the loop may be blocked before its stack is captured
+SLOW_CALLBACK_THRESHOLD = 0.25
+MAX_SLOW_CALLBACKS = 20
+MAX_STACK_DEPTH = 30
+
+SLOW_CALLBACKS = metrics.Counter(
+    "modmail_slow_callbacks_total", "Times the event loop was blocked for longer than the threshold."
+)
+
+
+@dataclasses.dataclass
+class SlowCallback:
+    """A period of time when the event loop was blocked, and what it was doing."""
+
+    started_at: float
+    stack: List[str]
+    duration: float
+    finished: bool = False
+
+
+class LoopMonitor:
+    """Measures event loop lag, and captures the stacks of callbacks which block the loop."""
+
+    def __init__(
+        self,
+        *,
+        interval: float = LAG_SAMPLE_INTERVAL,
+        threshold: float = SLOW_CALLBACK_THRESHOLD,
+        max_records: int = MAX_SLOW_CALLBACKS,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.slow_callbacks: Deque[SlowCallback] = collections.deque(maxlen=max_records)
+
+        self._last_tick = time.monotonic()
+        self._current: Optional[SlowCallback] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        """Whether the monitor has been started, and not stopped."""
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start monitoring the running event loop. Must be called from the event loop's thread."""
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._measure_lag())
+        self._watchdog = threading.Thread(target=self._watch, name="modmail-loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        """Stop monitoring the event loop."""
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def _measure_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - expected)
+            self.max_lag = max(self.max_lag, self.lag)
+            metrics.EVENT_LOOP_LAG.set(self.lag)
+            metrics.EVENT_LOOP_LAG_HISTOGRAM.observe(self.lag)
+
+            now = time.monotonic()
+            current, self._current = self._current, None
+            if current is not None:
+                current.duration = max(current.duration, now - self._last_tick - self.interval)
+                current.finished = True
+                logger.warning("The event loop was blocked for %.3fs.", current.duration)
+            self._last_tick = now
+
+    def _watch(self) -> None:
+        """Capture the stack of the event loop's thread when it stops ticking. Runs in its own thread."""
+        while not self._stopped.wait(self.threshold / 2):
+            blocked_for = time.monotonic() - self._last_tick - self.interval
+            if blocked_for < self.threshold or self._current is not None:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.format_stack(frame, limit=MAX_STACK_DEPTH)
+            record = SlowCallback(time.time() - blocked_for, stack, blocked_for)
+            self._current = record
+            self.slow_callbacks.append(record)
+            SLOW_CALLBACKS.inc()
+            logger.warning(
+                "The event loop has been blocked for more than %.3fs, in:\n%s", blocked_for, "".join(stack)
+            )
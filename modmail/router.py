@@ -0,0 +1,84 @@
+import enum
+import logging
+import re
+from typing import TYPE_CHECKING, List, Optional, Pattern, Tuple
+
+import discord
+
+
+if TYPE_CHECKING:  # pragma: nocover
+    from modmail.bot import ModmailBot
+    from modmail.log import ModmailLogger
+logger: "ModmailLogger" = logging.getLogger(__name__)
+
+# dispatched for every dm the bot receives, in place of relying on on_message
+DM_RELAY_EVENT = "dm_relay"
+
+
+class Route(enum.Flag):
+    """Where a message is sent by the router. A dm which starts with a prefix goes to both places."""
+
+    IGNORE = 0
+    DM_RELAY = enum.auto()
+    COMMAND = enum.auto()
+
+
+class MessageRouter:
+    """
+    Classifies each incoming message once, so that messages only go through the work they need.
+
+    Only messages which start with a command prefix are parsed as commands, and every dm is relayed,
+    so relaying a dm skips creating a command context and handling its errors entirely.
+
+    The prefixes are matched with a single compiled pattern, which is rebuilt only when the
+    configured prefix or the bot user changes.
+    """
+
+    def __init__(self, bot: "ModmailBot"):
+        self.bot = bot
+        self._key: Optional[Tuple[str, bool, Optional[int]]] = None
+        self._prefixes: List[str] = []
+        self._pattern: Optional[Pattern] = None
+
+    def _compile(self) -> None:
+        bot_config = self.bot.config.user.bot
+        user_id = self.bot.user.id if self.bot.user is not None else None
+        key = (bot_config.prefix, bot_config.prefix_when_mentioned, user_id)
+        if key == self._key:
+            return
+
+        prefixes = []
+        if bot_config.prefix_when_mentioned and user_id is not None:
+            # the same as commands.when_mentioned
+            prefixes.extend((f"<@{user_id}> ", f"<@!{user_id}> "))
+        prefixes.append(bot_config.prefix)
+        self._prefixes = prefixes
+        # the longest prefix is tried first, so a shorter prefix can't hide a longer one
+        self._pattern = re.compile("|".join(map(re.escape, sorted(prefixes, key=len, reverse=True))))
+        self._key = key
+        logger.debug("Compiled the prefix matcher for prefixes %s.", prefixes)
+
+    @property
+    def prefixes(self) -> List[str]:
+        """The current command prefixes."""
+        self._compile()
+        return list(self._prefixes)
+
+    def is_command(self, content: str) -> bool:
+        """Return whether the content starts with a command prefix."""
+        self._compile()
+        return self._pattern.match(content) is not None
+
+    def classify(self, message: discord.Message) -> Route:
+        """Return where the message should be sent."""
+        author = message.author
+        if self.bot.user is not None and author.id == self.bot.user.id:
+            return Route.IGNORE
+
+        route = Route.IGNORE
+        if message.guild is None:
+            route |= Route.DM_RELAY
+        # discord.py never runs commands from bots
+        if not author.bot and self.is_command(message.content):
+            route |= Route.COMMAND
+        return route
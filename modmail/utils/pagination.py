@@ -6,8 +6,24 @@ Originally adapated from: https://github.com/khk4912/EZPaginator/tree/84b5213741
 
 from __future__ import annotations
 
+import asyncio
+import collections
 import logging
-from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+from collections.abc import AsyncIterable, AsyncIterator, Iterator
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import discord
 from discord import ButtonStyle, ui
@@ -34,11 +50,179 @@ STOP_PAGINATE_EMOJI = "\u274c"  # [:x:] This is an emoji, which is treated diffe
 
 NO_EMBED_FOOTER_BUMP = 15
 
+# rendered pages kept by a LinePageSource, older pages are rendered again if they are needed
+MAX_CACHED_PAGES = 16
+
+# stateless paginators keep their state in the custom ids of their buttons,
+# which discord limits to 100 characters
+STATELESS_PREFIX = "spag"
+MAX_CUSTOM_ID_LENGTH = 100
+
 _AUTOGENERATE = object()
+_END = object()
 
 
 logger: ModmailLogger = logging.getLogger(__name__)
 
+Lines = Union[Iterable[str], AsyncIterable, Callable[[], Union[Iterable[str], AsyncIterable]]]
+
+
+class PageSource:
+    """
+    Provides the pages of a paginator, as they are needed.
+
+    Subclasses implement `get_page`, and set `total` once the number of pages is known.
+    """
+
+    #: The number of pages, or None if it isn't known yet.
+    total: Optional[int] = None
+    #: Shown as the embed title by stateless paginators.
+    title: Optional[str] = None
+
+    @property
+    def first_index(self) -> int:
+        """The index of the first page which can still be shown."""
+        return 0
+
+    async def get_page(self, index: int) -> str:
+        """Return the page at the index, raising IndexError if there is no such page."""
+        raise NotImplementedError
+
+    async def has_page(self, index: int) -> bool:
+        """Return whether there is a page at the index."""
+        try:
+            await self.get_page(index)
+        except IndexError:
+            return False
+        return True
+
+
+class ListPageSource(PageSource):
+    """A source of pages which have already been rendered."""
+
+    def __init__(self, pages: Sequence[str]):
+        self.pages = pages
+
+    @property
+    def total(self) -> int:
+        """The number of pages."""
+        return len(self.pages)
+
+    async def get_page(self, index: int) -> str:
+        """Return the page at the index, raising IndexError if there is no such page."""
+        if index < 0:
+            raise IndexError(index)
+        return self.pages[index]
+
+
+class LinePageSource(PageSource):
+    """
+    Renders pages from lines, only reading as many lines as are needed for the requested page.
+
+    `lines` can be an iterable or an async iterable of lines, or a function returning one.
+    Only the most recently used pages are kept. If an older page is needed again, the lines are read
+    again from the start, unless they are an iterator, in which case the older pages can't be shown.
+    The total number of pages is unknown until all of the lines have been read.
+    """
+
+    def __init__(
+        self,
+        lines: Lines,
+        *,
+        prefix: str = "```",
+        suffix: str = "```",
+        max_size: int = 2000,
+        linesep: str = "\n",
+        max_cached_pages: int = MAX_CACHED_PAGES,
+        title: Optional[str] = None,
+    ):
+        self.lines = lines
+        self.title = title
+        self.prefix = prefix
+        self.suffix = suffix
+        self.max_size = max_size
+        self.linesep = linesep
+        self.max_cached_pages = max_cached_pages
+        self.total = None
+
+        self.restartable = callable(lines) or not isinstance(lines, (Iterator, AsyncIterator))
+        self._cache: collections.OrderedDict[int, str] = collections.OrderedDict()
+        self._iterator: Optional[Union[Iterator, AsyncIterator]] = None
+        self._packer: Optional[DpyPaginator] = None
+        # index of the page the iterator will render next
+        self._next_index = 0
+        # pages are rendered in order, so concurrent button presses must take turns
+        self._lock = asyncio.Lock()
+
+    @property
+    def first_index(self) -> int:
+        """The index of the first page which can still be shown."""
+        if self.restartable:
+            return 0
+        return min(self._cache, default=self._next_index)
+
+    async def _restart(self) -> None:
+        if self._iterator is not None:
+            if hasattr(self._iterator, "aclose"):
+                await self._iterator.aclose()
+            elif hasattr(self._iterator, "close"):
+                self._iterator.close()
+
+        lines = self.lines() if callable(self.lines) else self.lines
+        self._iterator = lines.__aiter__() if isinstance(lines, AsyncIterable) else iter(lines)
+        self._packer = DpyPaginator(self.prefix, self.suffix, self.max_size, self.linesep)
+        self._next_index = 0
+
+    async def _next_line(self) -> Any:
+        if isinstance(self._iterator, AsyncIterator):
+            try:
+                return await self._iterator.__anext__()
+            except StopAsyncIteration:
+                return _END
+        return next(self._iterator, _END)
+
+    async def _render_next(self) -> Optional[str]:
+        """Read lines until the next page is full, returning None if there are no more pages."""
+        # the packer closes a page when a line doesn't fit on it
+        while not self._packer._pages:
+            line = await self._next_line()
+            if line is _END:
+                # close the last page, if anything was added to it
+                pages = self._packer.pages
+                return pages.pop(0) if pages else None
+            self._packer.add_line(line)
+        return self._packer._pages.pop(0)
+
+    async def get_page(self, index: int) -> str:
+        """Return the page at the index, raising IndexError if there is no such page."""
+        if index < 0 or (self.total is not None and index >= self.total):
+            raise IndexError(index)
+        if index in self._cache:
+            self._cache.move_to_end(index)
+            return self._cache[index]
+
+        async with self._lock:
+            if index in self._cache:
+                # rendered while waiting for the lock
+                return self._cache[index]
+            if self._iterator is None or index < self._next_index:
+                if self._iterator is not None and not self.restartable:
+                    raise IndexError(index)
+                await self._restart()
+
+            while self._next_index <= index:
+                page = await self._render_next()
+                if page is None:
+                    self.total = self._next_index
+                    raise IndexError(index)
+                self._cache[self._next_index] = page
+                self._next_index += 1
+                if len(self._cache) > self.max_cached_pages:
+                    self._cache.popitem(last=False)
+
+        self._cache.move_to_end(index)
+        return self._cache[index]
+
 
 class ButtonPaginator(ui.View, DpyPaginator):
     """
@@ -50,6 +234,8 @@ class ButtonPaginator(ui.View, DpyPaginator):
         Context of the message.
     contents : List[str]
         List of contents.
+    source : PageSource
+        Provides the pages. Contents which aren't a list are rendered lazily, with a LinePageSource.
     timeout : float, default 180
         A timeout of receiving Interactions.
     only : discord.abc.User, optional
@@ -60,7 +246,7 @@ class ButtonPaginator(ui.View, DpyPaginator):
 
     def __init__(
         self,
-        contents: Union[List[str], str],
+        contents: Union[List[str], str, Lines, PageSource],
         /,
         source_message: Optional[discord.Message] = None,
         embed: Union[Embed, bool, None] = _AUTOGENERATE,
@@ -87,6 +273,8 @@ class ButtonPaginator(ui.View, DpyPaginator):
         """
         self.index = 0
         self._pages: List[str] = []
+        self.current_page = ""
+        self.has_next = False
         self.prefix = prefix
         self.suffix = suffix
         self.max_size = max_size
@@ -147,9 +335,18 @@ class ButtonPaginator(ui.View, DpyPaginator):
                 footer_text = embed.footer
         self.footer_text = footer_text
         self.clear()
-        for line in contents:
-            self.add_line(line)
-        self.close_page()
+        if isinstance(contents, PageSource):
+            self.source = contents
+        elif isinstance(contents, (list, tuple)):
+            # these are already in memory, so the pages might as well be too
+            for line in contents:
+                self.add_line(line)
+            self.close_page()
+            self.source = ListPageSource(self._pages)
+        else:
+            self.source = LinePageSource(
+                contents, prefix=prefix, suffix=suffix, max_size=self.max_size, linesep=linesep
+            )
         # create the super so the children attributes are set
         super().__init__()
 
@@ -162,7 +359,7 @@ class ButtonPaginator(ui.View, DpyPaginator):
     @classmethod
     async def paginate(
         cls,
-        contents: Optional[List[str]] = None,
+        contents: Union[List[str], str, Lines, PageSource, None] = None,
         source_message: discord.Message = None,
         /,
         timeout: float = 180,
@@ -205,9 +402,10 @@ class ButtonPaginator(ui.View, DpyPaginator):
         elif channel is None:
             channel = source_message.channel
 
+        await paginator.load_page()
         paginator.update_states()
         # if there's only one page, don't send the view
-        if len(paginator.pages) < 2:
+        if not paginator.has_next:
             if paginator.embed:
                 await channel.send(embeds=[paginator.embed])
             else:
@@ -215,7 +413,8 @@ class ButtonPaginator(ui.View, DpyPaginator):
 
             return
 
-        if len(paginator.pages) < (show_jump_buttons_min_pages or 3):
+        total = paginator.source.total
+        if total is not None and total < (show_jump_buttons_min_pages or 3):
             for item in paginator.children:
                 if getattr(item, "custom_id", None) in ["pag_jump_first", "pag_jump_last"]:
                     paginator.remove_item(item)
@@ -246,6 +445,15 @@ class ButtonPaginator(ui.View, DpyPaginator):
         )
         return False
 
+    async def load_page(self) -> None:
+        """Get the current page from the source, and whether there is a page after it."""
+        try:
+            self.current_page = await self.source.get_page(self.index)
+        except IndexError:
+            # the source has no pages at all
+            self.current_page = ""
+        self.has_next = await self.source.has_page(self.index + 1)
+
     def update_states(self) -> None:
         """
         Disable specific components depending on paginator page and length.
@@ -253,9 +461,13 @@ class ButtonPaginator(ui.View, DpyPaginator):
         If the paginator has less than two pages, the jump buttons will be disabled.
         If the paginator is on the first page, the jump first/move back buttons will be disabled.
         if the paginator is on the last page, the jump last/move forward buttons will be disabled.
+        The jump last button is also disabled until the number of pages is known.
+
+        `load_page` must be awaited first, to get the current page.
         """
         # update the footer
-        page_indicator = f"Page {self.index+1}/{len(self._pages)}"
+        total = self.source.total
+        page_indicator = f"Page {self.index+1}/{total if total is not None else '?'}"
         if self.footer_text:
             footer_text = f"{self.footer_text} ({page_indicator})"
         else:
@@ -263,29 +475,29 @@ class ButtonPaginator(ui.View, DpyPaginator):
 
         if self.embed is None:
             self.content = (self.title or "") + "\n"
-            self.content += self._pages[self.index]
+            self.content += self.current_page
             self.content += "\n" + footer_text
 
         else:
-            self.embed.description = self._pages[self.index]
+            self.embed.description = self.current_page
             self.embed.set_footer(text=footer_text)
 
         # determine if the jump buttons should be enabled
-        more_than_two_pages = len(self._pages) > 2
+        more_than_two_pages = total is None or total > 2
         components = {
             "pag_jump_first": more_than_two_pages,
             "pag_prev": True,
             "pag_next": True,
-            "pag_jump_last": more_than_two_pages,
+            "pag_jump_last": more_than_two_pages and total is not None,
         }
 
-        if self.index == 0:
+        if self.index <= self.source.first_index:
             # on the first page, disable buttons that would go to this page.
             logger.trace("Paginator is on the first page, disabling jump to first and previous buttons.")
             components["pag_jump_first"] = False
             components["pag_prev"] = False
 
-        elif self.index == len(self._pages) - 1:
+        if not self.has_next:
             # on the last page, disable buttons that would go to this page.
             logger.trace("Paginator is on the last page, disabling jump to last and next buttons.")
             components["pag_next"] = False
@@ -300,6 +512,7 @@ class ButtonPaginator(ui.View, DpyPaginator):
 
     async def send_page(self, interaction: Interaction) -> None:
         """Send new page to discord, after updating the view to have properly disabled buttons."""
+        await self.load_page()
         self.update_states()
 
         if self.embed:
@@ -310,7 +523,7 @@ class ButtonPaginator(ui.View, DpyPaginator):
     @ui.button(label=JUMP_FIRST_LABEL, custom_id="pag_jump_first", style=ButtonStyle.primary)
     async def go_first(self, _: Button, interaction: Interaction) -> None:
         """Move the paginator to the first page."""
-        self.index = 0
+        self.index = self.source.first_index
         await self.send_page(interaction)
 
     @ui.button(label=BACK_LABEL, custom_id="pag_prev", style=ButtonStyle.primary)
@@ -328,7 +541,7 @@ class ButtonPaginator(ui.View, DpyPaginator):
     @ui.button(label=JUMP_LAST_LABEL, custom_id="pag_jump_last", style=ButtonStyle.primary)
     async def go_last(self, _: Button, interaction: Interaction) -> None:
         """Move the paginator to the last page."""
-        self.index = len(self._pages) - 1
+        self.index = self.source.total - 1
         await self.send_page(interaction)
 
     # NOTE: This method cannot be named `stop`, due to inheriting the method named stop from ui.View
@@ -337,3 +550,179 @@ class ButtonPaginator(ui.View, DpyPaginator):
         """Stop the paginator early."""
         await interaction.response.defer()
         self.stop()
+
+
+PageSourceFactory = Callable[[str], Awaitable[PageSource]]
+
+#: Factories of the page sources stateless paginators can show, by name.
+PAGE_SOURCES: Dict[str, PageSourceFactory] = {}
+
+
+def register_page_source(name: str, factory: PageSourceFactory) -> None:
+    """
+    Register a factory of page sources, which stateless paginators can then show.
+
+    The factory is called with the key the paginator was created with, and must return the same pages
+    every time it is called with that key, since it is called again whenever a button is pressed.
+    """
+    if ":" in name:
+        raise InvalidArgumentError("Page source names can't contain a colon.")
+    PAGE_SOURCES[name] = factory
+
+
+def unregister_page_source(name: str) -> None:
+    """Remove a page source factory, so its paginators stop responding."""
+    PAGE_SOURCES.pop(name, None)
+
+
+class PaginatorState(NamedTuple):
+    """The state of a stateless paginator, as stored in the custom id of one of its buttons."""
+
+    action: str
+    index: int
+    owner_id: int
+    source: str
+    key: str
+
+    def to_custom_id(self) -> str:
+        """Encode the state to a custom id, raising InvalidArgumentError if it is too long."""
+        custom_id = ":".join(
+            (STATELESS_PREFIX, self.action, str(self.index), str(self.owner_id), self.source, self.key)
+        )
+        if len(custom_id) > MAX_CUSTOM_ID_LENGTH:
+            raise InvalidArgumentError(f"The page source key {self.key!r} is too long to store in a button.")
+        return custom_id
+
+    @classmethod
+    def from_custom_id(cls, custom_id: str) -> Optional[PaginatorState]:
+        """Decode a custom id, returning None if it does not belong to a stateless paginator."""
+        parts = custom_id.split(":", 5)
+        if len(parts) != 6 or parts[0] != STATELESS_PREFIX:
+            return None
+        _, action, index, owner_id, source, key = parts
+        try:
+            return cls(action, int(index), int(owner_id), source, key)
+        except ValueError:
+            return None
+
+
+class StatelessPaginator:
+    """
+    A paginator which holds no state while it waits for button presses.
+
+    The requested page, the name of a registered page source, and the key to create it with are
+    stored in each button's custom id. When a button is pressed, the PaginatorManager creates the page
+    source again and renders the requested page, so open paginators use no memory, and keep working
+    after a restart.
+    """
+
+    BUTTONS = {
+        "first": JUMP_FIRST_LABEL,
+        "prev": BACK_LABEL,
+        "next": FORWARD_LABEL,
+        "last": JUMP_LAST_LABEL,
+    }
+
+    @classmethod
+    async def render(cls, source: PageSource, state: PaginatorState) -> Tuple[Embed, Optional[ui.View]]:
+        """Render the page of the state, and the buttons to move from it, if there is more than one page."""
+        index = state.index
+        try:
+            page = await source.get_page(index)
+        except IndexError:
+            # the contents may have changed since the paginator was sent
+            index = source.first_index
+            try:
+                page = await source.get_page(index)
+            except IndexError:
+                page = ""
+        has_next = await source.has_page(index + 1)
+        first = source.first_index
+        total = source.total
+
+        embed = Embed(title=source.title, description=page)
+        embed.set_footer(text=f"Page {index + 1}/{total if total is not None else '?'}")
+        if index <= first and not has_next:
+            return embed, None
+
+        targets = {
+            "first": first,
+            "prev": max(index - 1, first),
+            "next": index + 1,
+            "last": total - 1 if total is not None else index,
+        }
+        enabled = {
+            "first": index > first,
+            "prev": index > first,
+            "next": has_next,
+            "last": has_next and total is not None,
+        }
+        # the buttons are only used to send their components, so the view is never waited on
+        view = ui.View(timeout=None)
+        for action, label in cls.BUTTONS.items():
+            custom_id = state._replace(action=action, index=targets[action]).to_custom_id()
+            view.add_item(
+                ui.Button(
+                    label=label, custom_id=custom_id, style=ButtonStyle.primary, disabled=not enabled[action]
+                )
+            )
+        custom_id = state._replace(action="stop", index=index).to_custom_id()
+        view.add_item(ui.Button(emoji=STOP_PAGINATE_EMOJI, custom_id=custom_id, style=ButtonStyle.grey))
+        # stopped views aren't kept in the bot's view store after they are sent
+        view.stop()
+        return embed, view
+
+    @classmethod
+    async def paginate(
+        cls,
+        source_name: str,
+        key: str = "",
+        source_message: Optional[discord.Message] = None,
+        /,
+        *,
+        channel: Optional[discord.abc.Messageable] = None,
+        only: Optional[Union[discord.Object, discord.abc.User]] = None,
+    ) -> discord.Message:
+        """
+        Send the first page of a registered page source.
+
+        Only the author of the source message can use the paginator, unless `only` is provided.
+        One of source message or channel is required.
+        """
+        if channel is None and source_message is None:
+            raise MissingAttributeError("Both channel and source_message are None.")
+        elif channel is None:
+            channel = source_message.channel
+
+        if only is None and source_message is not None:
+            only = source_message.author
+
+        state = PaginatorState("first", 0, only.id if only is not None else 0, source_name, key)
+        source = await PAGE_SOURCES[source_name](key)
+        embed, view = await cls.render(source, state)
+        if view is None:
+            return await channel.send(embed=embed)
+        return await channel.send(embed=embed, view=view)
+
+    @classmethod
+    async def handle_interaction(cls, interaction: Interaction, state: PaginatorState) -> None:
+        """Respond to a button press on a stateless paginator."""
+        if state.owner_id and interaction.user.id != state.owner_id:
+            await interaction.response.send_message(
+                content="You are not authorised to use this paginator.", ephemeral=True
+            )
+            return
+
+        if state.action == "stop":
+            await interaction.response.edit_message(view=None)
+            return
+
+        factory = PAGE_SOURCES.get(state.source)
+        if factory is None:
+            logger.debug(f"Page source {state.source} of a paginator is not registered.")
+            await interaction.response.send_message(content="This paginator has expired.", ephemeral=True)
+            await interaction.message.edit(view=None)
+            return
+
+        embed, view = await cls.render(await factory(state.key), state)
+        await interaction.response.edit_message(embed=embed, view=view)
@@ -0,0 +1,54 @@
+import asyncio
+import concurrent.futures
+import pathlib
+import sqlite3
+from typing import Any, Callable, Optional
+
+
+class BackgroundDatabase:
+    """
+    A sqlite database which is only ever used from its own background thread.
+
+    The event loop never waits on disk, or on another process' write. Since there is only one thread,
+    queued work runs in the order it was submitted. Each function is called with the connection,
+    followed by its arguments.
+    """
+
+    def __init__(self, path: pathlib.Path, schema: str, *, thread_name: str, timeout: float = 5.0):
+        self.path = path
+        self.schema = schema
+        self.timeout = timeout
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix=thread_name)
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database, creating it if needed. This must only be called on the executor thread."""
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute(self.schema)
+            self._connection = connection
+        return self._connection
+
+    def _call(self, func: Callable[..., Any], *args: Any) -> Any:
+        return func(self._connect(), *args)
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> concurrent.futures.Future:
+        """Queue a call with the connection, without waiting for it."""
+        return self._executor.submit(self._call, func, *args)
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Call a function with the connection, and return its result."""
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def close(self) -> None:
+        """Close the database once all of the queued work has finished."""
+        self._executor.submit(self._close)
+        self._executor.shutdown(wait=False)
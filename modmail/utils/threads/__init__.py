@@ -1,3 +1,13 @@
+from modmail.utils.threads.attachments import AttachmentCache
+from modmail.utils.threads.debounce import EditCoalescer, TypingDebouncer
 from modmail.utils.threads.decorators import is_modmail_thread
-from modmail.utils.threads.errors import ThreadAlreadyExistsError, ThreadException, ThreadNotFoundError
-from modmail.utils.threads.models import MessageDict, Target, Ticket
+from modmail.utils.threads.errors import (
+    AttachmentTooLargeError,
+    ThreadAlreadyExistsError,
+    ThreadException,
+    ThreadNotFoundError,
+)
+from modmail.utils.threads.models import MessageDict, RecentMessages, Target, Ticket
+from modmail.utils.threads.placement import PlacementPolicy, RelayChannelPool, configured_relay_channel_ids
+from modmail.utils.threads.search import SearchIndex, SearchResult
+from modmail.utils.threads.transcripts import TranscriptWriter
@@ -0,0 +1,259 @@
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import logging
+import os
+import pathlib
+import tempfile
+from typing import TYPE_CHECKING, IO, Any, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+import discord
+
+from modmail.config import CONFIG_DIRECTORY
+from modmail.utils.threads.errors import AttachmentTooLargeError
+
+
+if TYPE_CHECKING:  # pragma: nocover
+    from modmail.log import ModmailLogger
+logger: "ModmailLogger" = logging.getLogger(__name__)
+
+ATTACHMENT_CACHE_DIRECTORY = CONFIG_DIRECTORY / "attachment_cache"
+
+CHUNK_SIZE = 64 * 1024
+# files are evicted, least recently used first, once the cache is larger than this
+MAX_CACHE_SIZE = 512 * 1024 * 1024
+# how many attachment ids are remembered, so an attachment relayed again isn't downloaded again
+MAX_REMEMBERED_ATTACHMENTS = 4096
+
+# the cache directory is only touched from this thread, so the event loop never waits on disk,
+# and a file is never deleted by an eviction queued before it was written again.
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="modmail-attachments")
+
+
+def _run(func: Callable[..., Any], *args: Any) -> asyncio.Future:
+    """Queue a call on the cache's disk thread."""
+    return asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+def _scan(directory: pathlib.Path) -> List[Tuple[float, str, int]]:
+    """Return the modification time, digest and size of each cached file, deleting unfinished downloads."""
+    directory.mkdir(parents=True, exist_ok=True)
+    found = []
+    for path in directory.iterdir():
+        if path.is_file():
+            # an unfinished download from a previous run
+            path.unlink(missing_ok=True)
+            continue
+        for file in path.iterdir():
+            stat = file.stat()
+            found.append((stat.st_mtime, file.name, stat.st_size))
+    return found
+
+
+def _write_chunk(file: IO[bytes], sha256: Any, chunk: bytes) -> None:
+    sha256.update(chunk)
+    file.write(chunk)
+
+
+def _store(temp_path: pathlib.Path, path: pathlib.Path) -> None:
+    path.parent.mkdir(exist_ok=True)
+    temp_path.replace(path)
+
+
+def _discard(temp_path: pathlib.Path, path: pathlib.Path) -> None:
+    """Delete a download whose contents are already cached, and mark the cached copy as used."""
+    temp_path.unlink(missing_ok=True)
+    os.utime(path)
+
+
+def _touch(path: pathlib.Path) -> None:
+    try:
+        os.utime(path)
+    except OSError:
+        logger.warning("Unable to update the modification time of %s.", path)
+
+
+def _delete(paths: List[pathlib.Path]) -> None:
+    for path in paths:
+        try:
+            path.unlink(missing_ok=True)
+        except OSError:
+            logger.warning("Unable to delete the cached attachment at %s.", path)
+
+
+class AttachmentCache:
+    """
+    Content addressed disk cache of downloaded attachments.
+
+    Attachments are streamed to disk in chunks, and never held in memory as a whole. Each file is stored
+    under the sha256 of its contents, so identical files are only stored once. Fetching an attachment
+    which is already being downloaded waits for that download, rather than starting another.
+
+    Fetched files are pinned, and are never evicted until they are released again once uploaded.
+    The index of the cache is only touched from the event loop, so it needs no locking, while the files
+    themselves are only touched from a background thread, in the order that work was queued.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        directory: pathlib.Path = ATTACHMENT_CACHE_DIRECTORY,
+        *,
+        max_size: int = MAX_CACHE_SIZE,
+    ):
+        self.session = session
+        self.directory = directory
+        self.max_size = max_size
+
+        # key: sha256 of the contents, value: size, in least recently used order
+        self._files: Optional["collections.OrderedDict[str, int]"] = None
+        self._size = 0
+        self._scanning: Optional[asyncio.Future] = None
+        # key: attachment id, value: sha256 of the contents
+        self._digests: "collections.OrderedDict[int, str]" = collections.OrderedDict()
+        # key: attachment id, value: the download in progress
+        self._downloads: Dict[int, asyncio.Future] = dict()
+        # key: sha256 of the contents, value: how many fetched paths haven't been released yet
+        self._pins: "collections.Counter[str]" = collections.Counter()
+        # key: attachment id, value: how many fetches are waiting for its download
+        self._waiting: "collections.Counter[int]" = collections.Counter()
+
+    def _path(self, digest: str) -> pathlib.Path:
+        return self.directory / digest[:2] / digest
+
+    async def _load(self) -> "collections.OrderedDict[str, int]":
+        """Index the files already in the cache directory, oldest first."""
+        if self._files is not None:
+            return self._files
+
+        if self._scanning is None:
+            self._scanning = _run(_scan, self.directory)
+        # shielded, so one fetch being cancelled doesn't cancel the scan for the others
+        found = await asyncio.shield(self._scanning)
+        if self._files is None:
+            self._files = collections.OrderedDict((digest, size) for _, digest, size in sorted(found))
+            self._size = sum(self._files.values())
+        return self._files
+
+    def _prune(self) -> None:
+        """Evict the least recently used files not in use, until the cache is within its maximum size."""
+        # a finished download is in use until the fetches waiting for it have pinned it
+        downloaded = {self._digests.get(attachment_id) for attachment_id in self._waiting}
+        evicted = []
+        for digest in list(self._files):
+            if self._size <= self.max_size or len(self._files) <= 1:
+                break
+            if self._pins[digest] or digest in downloaded:
+                continue
+            self._size -= self._files.pop(digest)
+            evicted.append(self._path(digest))
+        if evicted:
+            _run(_delete, evicted)
+
+    async def fetch(self, attachment: discord.Attachment, *, max_size: int) -> pathlib.Path:
+        """
+        Return the path of a cached copy of the attachment, downloading it if it is not cached.
+
+        The path is pinned, so it isn't evicted before it is uploaded, and must be passed to `release` after.
+        Raises AttachmentTooLargeError if the attachment is larger than max_size bytes.
+        """
+        if attachment.size > max_size:
+            raise AttachmentTooLargeError(f"Attachment {attachment.id} is {attachment.size} bytes.")
+
+        files = await self._load()
+        digest = self._digests.get(attachment.id)
+        if digest is not None and digest in files:
+            self._digests.move_to_end(attachment.id)
+            files.move_to_end(digest)
+            self._pins[digest] += 1
+            path = self._path(digest)
+            _run(_touch, path)
+            return path
+
+        download = self._downloads.get(attachment.id)
+        if download is None:
+            download = asyncio.ensure_future(self._download(attachment, max_size))
+            self._downloads[attachment.id] = download
+            download.add_done_callback(lambda _: self._downloads.pop(attachment.id, None))
+        self._waiting[attachment.id] += 1
+        try:
+            # shielded, so one relay being cancelled doesn't cancel the download for the others
+            digest = await asyncio.shield(download)
+        finally:
+            self._waiting[attachment.id] -= 1
+            if not self._waiting[attachment.id]:
+                del self._waiting[attachment.id]
+        self._pins[digest] += 1
+        return self._path(digest)
+
+    def release(self, path: pathlib.Path) -> None:
+        """Unpin a path returned by `fetch` once it has been uploaded, so it can be evicted again."""
+        digest = path.name
+        self._pins[digest] -= 1
+        if self._pins[digest] <= 0:
+            del self._pins[digest]
+        self._prune()
+
+    def _remember(self, attachment_id: int, digest: str) -> None:
+        self._digests[attachment_id] = digest
+        self._digests.move_to_end(attachment_id)
+        if len(self._digests) > MAX_REMEMBERED_ATTACHMENTS:
+            self._digests.popitem(last=False)
+
+    async def _download(self, attachment: discord.Attachment, max_size: int) -> str:
+        """Stream the attachment into the cache, and return the sha256 of its contents."""
+        sha256 = hashlib.sha256()
+        size = 0
+        file = await _run(
+            functools.partial(tempfile.NamedTemporaryFile, prefix=".", dir=self.directory, delete=False)
+        )
+        temp_path = pathlib.Path(file.name)
+        try:
+            try:
+                async with self.session.get(attachment.url, raise_for_status=True) as resp:
+                    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > max_size:
+                            raise AttachmentTooLargeError(
+                                f"Attachment {attachment.id} is over {max_size} bytes."
+                            )
+                        await _run(_write_chunk, file, sha256, chunk)
+            finally:
+                await _run(file.close)
+
+            digest = sha256.hexdigest()
+            path = self._path(digest)
+            if digest in self._files:
+                # identical contents are already cached under another attachment.
+                # that copy is written before this is run, since the disk work is done in order.
+                self._files.move_to_end(digest)
+                self._remember(attachment.id, digest)
+                await _run(_discard, temp_path, path)
+                return digest
+
+            # indexed before it is stored, so another download of the same contents reuses this copy
+            self._files[digest] = size
+            self._size += size
+            self._remember(attachment.id, digest)
+            stored = _run(_store, temp_path, path)
+            self._prune()
+            try:
+                await stored
+            except BaseException:
+                if self._files.pop(digest, None) is not None:
+                    self._size -= size
+                raise
+        except BaseException:
+            await _run(functools.partial(temp_path.unlink, missing_ok=True))
+            raise
+
+        logger.trace("Cached attachment %s as %s, %s bytes.", attachment.id, digest, size)
+        return digest
+
+    @staticmethod
+    def to_file(attachment: discord.Attachment, path: pathlib.Path) -> discord.File:
+        """Return a file to re-upload a cached attachment with, with the original filename."""
+        return discord.File(path, filename=attachment.filename, spoiler=attachment.is_spoiler())
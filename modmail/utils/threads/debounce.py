@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict
+
+import discord
+
+from modmail import metrics
+
+
+if TYPE_CHECKING:  # pragma: nocover
+    from modmail.log import ModmailLogger
+logger: "ModmailLogger" = logging.getLogger(__name__)
+
+# how long discord shows a typing indicator for, after it is triggered
+TYPING_INDICATOR_DURATION = 10.0
+# indicators older than the window are forgotten once this many channels have one
+MAX_TRACKED_INDICATORS = 256
+# how long edits of the same message are collected for, before only the last one is applied
+EDIT_COALESCE_WINDOW = 2.0
+
+TYPING_EVENTS = metrics.Counter(
+    "modmail_typing_events_total",
+    "Typing events relayed to tickets, by whether they triggered an indicator or were suppressed.",
+    ("result",),
+)
+COALESCED_EDITS = metrics.Counter(
+    "modmail_coalesced_edits_total", "Message edits which were replaced by a later edit of the same message."
+)
+
+
+class TypingDebouncer:
+    """
+    Relays typing events, triggering at most one typing indicator per channel each window.
+
+    A triggered indicator is shown for about ten seconds, so triggering it again within that time
+    has no visible effect, and only uses up the typing endpoint's rate limit. Sending a message
+    clears the indicator, so relaying a message to a channel cancels its indicator, and the next
+    typing event triggers a new one.
+    """
+
+    def __init__(self, window: float = TYPING_INDICATOR_DURATION):
+        self.window = window
+        self.suppressed = 0
+        # channel id -> when its indicator was triggered
+        self._triggered: Dict[int, float] = {}
+
+    def _prune(self, now: float) -> None:
+        """Forget the indicators which have already expired."""
+        self._triggered = {
+            channel_id: triggered
+            for channel_id, triggered in self._triggered.items()
+            if now - triggered < self.window
+        }
+
+    async def trigger(self, channel: discord.abc.Messageable, channel_id: int) -> bool:
+        """
+        Trigger a typing indicator in the channel, unless one is already being shown.
+
+        Returns whether the indicator was triggered.
+        """
+        now = time.monotonic()
+        triggered = self._triggered.get(channel_id)
+        if triggered is not None and now - triggered < self.window:
+            self.suppressed += 1
+            TYPING_EVENTS.labels("suppressed").inc()
+            return False
+
+        # marked before triggering, so typing events received while waiting on discord are suppressed
+        self._triggered[channel_id] = now
+        if len(self._triggered) > MAX_TRACKED_INDICATORS:
+            self._prune(now)
+        try:
+            await channel.trigger_typing()
+        except discord.HTTPException:
+            self._triggered.pop(channel_id, None)
+            logger.debug("Unable to trigger typing in %s.", channel_id, exc_info=True)
+            return False
+        TYPING_EVENTS.labels("triggered").inc()
+        return True
+
+    def cancel(self, channel_id: int) -> None:
+        """Forget the channel's indicator, since a message was sent in it."""
+        self._triggered.pop(channel_id, None)
+
+
+class EditCoalescer:
+    """
+    Collects the edits of each message over a short window, and only applies the last of them.
+
+    The window starts at the first edit of a message, so an edit is never delayed by more than
+    the window, however often the message is edited.
+    """
+
+    def __init__(self, window: float = EDIT_COALESCE_WINDOW):
+        self.window = window
+        self.coalesced = 0
+        # message id -> the latest edit, and the task which will apply it
+        self._latest: Dict[int, Any] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def submit(self, message_id: int, edit: Any, apply: Callable[[Any], Awaitable[None]]) -> None:
+        """Apply the edit once the window of the message is over, unless it is replaced by a later edit."""
+        if message_id in self._tasks:
+            self.coalesced += 1
+            COALESCED_EDITS.inc()
+        else:
+            self._tasks[message_id] = asyncio.create_task(self._apply(message_id, apply))
+        self._latest[message_id] = edit
+
+    async def _apply(self, message_id: int, apply: Callable[[Any], Awaitable[None]]) -> None:
+        # cancel and close forget the edit themselves, since a task cancelled before it starts never runs
+        await asyncio.sleep(self.window)
+        # edits received from here on start a new window
+        del self._tasks[message_id]
+        edit = self._latest.pop(message_id)
+        try:
+            await apply(edit)
+        except Exception:
+            logger.error("Unable to apply the edit of message %s.", message_id, exc_info=True)
+
+    def cancel(self, message_id: int) -> bool:
+        """
+        Drop the pending edit of a message, such as when the message is deleted.
+
+        Returns whether there was an edit which hadn't started being applied.
+        """
+        task = self._tasks.pop(message_id, None)
+        if task is None:
+            return False
+        task.cancel()
+        del self._latest[message_id]
+        return True
+
+    def close(self) -> None:
+        """Cancel the edits which haven't been applied yet."""
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self._latest.clear()
@@ -4,6 +4,8 @@ from discord.ext import commands
 from discord.ext.commands import Context
 from discord.threads import Thread
 
+from modmail.utils.threads.placement import configured_relay_channel_ids
+
 
 def is_modmail_thread() -> Callable:
     """Check to see whether the channel in which the command is invoked is a discord thread or not."""
@@ -14,11 +16,10 @@ def is_modmail_thread() -> Callable:
 
         All modmail thread channels are a thread, so if it isn't we know we can stop checking at that point.
         If it is a thread channel, then we also know it must have a parent attribute, so we can safely
-        check if the id is the same as the configured thread log channel id.
+        check if the id is one of the configured relay channel ids.
         """
-        return (
-            isinstance(ctx.channel, Thread)
-            and ctx.channel.parent.id == ctx.bot.config.user.threads.relay_channel_id
+        return isinstance(ctx.channel, Thread) and ctx.channel.parent.id in configured_relay_channel_ids(
+            ctx.bot.config.user.threads
         )
 
     return commands.check(predicate)
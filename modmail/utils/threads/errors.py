@@ -14,3 +14,9 @@ class ThreadAlreadyExistsError(ThreadException):
     """Raised when a thread already exists."""
 
     pass
+
+
+class AttachmentTooLargeError(ThreadException):
+    """Raised when an attachment is too large to be re-uploaded."""
+
+    pass
@@ -1,14 +1,17 @@
 import logging
 from enum import IntEnum, auto
-from typing import TYPE_CHECKING, List, Optional, Union
+from typing import TYPE_CHECKING, Iterator, List, Optional, Union
 
 import discord
 
 
 if TYPE_CHECKING:  # pragma: nocover
     from modmail.log import ModmailLogger
+    from modmail.utils.threads.transcripts import TranscriptWriter
 logger: "ModmailLogger" = logging.getLogger(__name__)
 
+MAX_CACHED_MESSAGES_PER_THREAD = 10
+
 
 class Target(IntEnum):
     """Targets for thread messages."""
@@ -41,21 +44,114 @@ class MessageDict(dict):
         return super().__delitem__(getattr(key, "id", key))
 
 
+class RecentMessages:
+    """
+    A bounded, insertion ordered collection of recently sent messages.
+
+    Messages can be looked up by either the message or its id.
+    Once full, appending a message drops the oldest message.
+
+    The messages are kept in a plain list, since there are only ever a few of them and an open ticket
+    holds one of these for as long as it is open. Scanning a list this short is about as fast as
+    hashing, and takes a fraction of the memory of a dict.
+    """
+
+    __slots__ = ("maxlen", "_messages")
+
+    def __init__(self, maxlen: int = MAX_CACHED_MESSAGES_PER_THREAD):
+        self.maxlen = maxlen
+        self._messages: List[discord.Message] = []
+
+    def _index(self, message: Union[discord.Message, int]) -> Optional[int]:
+        message_id = getattr(message, "id", message)
+        for index, recent in enumerate(self._messages):
+            if recent.id == message_id:
+                return index
+        return None
+
+    def append(self, message: discord.Message) -> None:
+        """Add a message as the most recent, dropping the oldest message if full."""
+        self.discard(message)
+        self._messages.append(message)
+        if len(self._messages) > self.maxlen:
+            del self._messages[0]
+
+    def discard(self, message: Union[discord.Message, int]) -> None:
+        """Remove a message or message id if it is present."""
+        index = self._index(message)
+        if index is not None:
+            del self._messages[index]
+
+    def remove(self, message: Union[discord.Message, int]) -> None:
+        """Remove a message or message id, raising a ValueError if it is not present."""
+        index = self._index(message)
+        if index is None:
+            raise ValueError(f"{message!r} is not a recent message.")
+        del self._messages[index]
+
+    @property
+    def last(self) -> Optional[discord.Message]:
+        """The most recent message, or None if there are no messages."""
+        if not self._messages:
+            return None
+        return self._messages[-1]
+
+    def __contains__(self, message: Union[discord.Message, int]) -> bool:
+        return self._index(message) is not None
+
+    def __iter__(self) -> Iterator[discord.Message]:
+        return iter(self._messages)
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __repr__(self) -> str:
+        messages = [message.id for message in self._messages]
+        return f"<{self.__class__.__name__} maxlen={self.maxlen} messages={messages}>"
+
+
 class Ticket:
     """
     Represents a ticket.
 
     This class represents a ticket for Modmail.  A ticket is a way to send
     messages to a specific user.
+
+    The ids of the recipient, thread, log message, and relay channel are always stored, although the
+    relay channel of a ticket made with `from_ids` is None unless it is provided.
+    Tickets made with `from_ids` resolve the objects from the client's cache when they are first accessed.
+
+    Tickets opened or rebuilt by the bot hold on to their objects instead. discord.py only keeps weak
+    references to users, and drops threads from its cache once they are archived, but a ticket has to
+    reach both for as long as it is open. The log message also holds the embed which records whether
+    the ticket has been answered. As the client caches these objects anyway, holding them costs no
+    more than holding their ids.
     """
 
-    recipient: discord.User
-    thread: discord.Thread
+    __slots__ = (
+        "recipient_id",
+        "thread_id",
+        "log_message_id",
+        "relay_channel_id",
+        "messages",
+        "close_after",
+        "_last_sent_messages",
+        "has_sent_initial_message",
+        "transcript",
+        "_client",
+        "_recipient",
+        "_thread",
+        "_log_message",
+    )
+
+    recipient_id: int
+    thread_id: int
+    log_message_id: int
+    relay_channel_id: Optional[int]
     messages: MessageDict
-    log_message: discord.Message
-    close_after: Optional[int] = None
-    last_sent_messages: List[discord.Message] = list()
+    close_after: Optional[int]
     has_sent_initial_message: bool
+    transcript: Optional["TranscriptWriter"]
 
     def __init__(
         self,
@@ -71,13 +167,102 @@ class Ticket:
         At least thread and user are required.
         log_message and close_after are automatically gathered from the thread object
         """
+        self._client: Optional[discord.Client] = None
+        self._recipient: Optional[discord.User] = None
+        self._thread: Optional[discord.Thread] = None
+        self._log_message: Optional[Union[discord.Message, discord.PartialMessage]] = None
+
         self.thread = thread
         self.recipient = recipient
-        self.log_message: Union[discord.Message, discord.PartialMessage] = (
-            log_message or self.thread.parent.get_partial_message(self.thread.id)
-        )
+        self.log_message = log_message or self.thread.parent.get_partial_message(self.thread.id)
         self.messages = MessageDict()
+        self._last_sent_messages: Optional[RecentMessages] = None
         self.close_after = self.thread.auto_archive_duration
         self.has_sent_initial_message = has_sent_initial_message
+        self.transcript = None
+
+        logger.trace("Created a Ticket object for recipient %s with thread %s.", recipient, thread)
+
+    @classmethod
+    def from_ids(
+        cls,
+        client: discord.Client,
+        recipient_id: int,
+        thread_id: int,
+        *,
+        log_message_id: Optional[int] = None,
+        relay_channel_id: Optional[int] = None,
+        has_sent_initial_message: bool = True,
+        close_after: Optional[int] = None,
+    ) -> "Ticket":
+        """
+        Create a ticket which only stores ids, resolving the objects from the client when accessed.
+
+        The log message id defaults to the thread id, as ticket threads are started from their log message.
+        """
+        self = cls.__new__(cls)
+        self._client = client
+        self._recipient = None
+        self._thread = None
+        self._log_message = None
+
+        self.recipient_id = recipient_id
+        self.thread_id = thread_id
+        self.log_message_id = log_message_id or thread_id
+        self.relay_channel_id = relay_channel_id
+        self.messages = MessageDict()
+        self._last_sent_messages: Optional[RecentMessages] = None
+        self.close_after = close_after
+        self.has_sent_initial_message = has_sent_initial_message
+        self.transcript = None
+
+        logger.trace("Created a Ticket object for recipient %s with thread %s.", recipient_id, thread_id)
+        return self
+
+    @property
+    def last_sent_messages(self) -> RecentMessages:
+        """
+        The most recent messages sent by staff in the thread, oldest first.
+
+        This is created when it is first used, as most tickets are waiting on a staff reply.
+        """
+        if self._last_sent_messages is None:
+            self._last_sent_messages = RecentMessages(MAX_CACHED_MESSAGES_PER_THREAD)
+        return self._last_sent_messages
+
+    @property
+    def recipient(self) -> Optional[discord.User]:
+        """The user this ticket is with."""
+        if self._recipient is None and self._client is not None:
+            self._recipient = self._client.get_user(self.recipient_id)
+        return self._recipient
+
+    @recipient.setter
+    def recipient(self, recipient: discord.User) -> None:
+        self._recipient = recipient
+        self.recipient_id = recipient.id
+
+    @property
+    def thread(self) -> Optional[discord.Thread]:
+        """The thread this ticket is relayed to."""
+        if self._thread is None and self._client is not None:
+            self._thread = self._client.get_channel(self.thread_id)
+        return self._thread
+
+    @thread.setter
+    def thread(self, thread: discord.Thread) -> None:
+        self._thread = thread
+        self.thread_id = thread.id
+        self.relay_channel_id = thread.parent_id
+
+    @property
+    def log_message(self) -> Optional[Union[discord.Message, discord.PartialMessage]]:
+        """The message in the relay channel which the thread was started from."""
+        if self._log_message is None and self.thread is not None and self.thread.parent is not None:
+            self._log_message = self.thread.parent.get_partial_message(self.log_message_id)
+        return self._log_message
 
-        logger.trace(f"Created a Ticket object for recipient {recipient} with thread {thread}.")
+    @log_message.setter
+    def log_message(self, log_message: Union[discord.Message, discord.PartialMessage]) -> None:
+        self._log_message = log_message
+        self.log_message_id = log_message.id
@@ -0,0 +1,70 @@
+import enum
+import hashlib
+import itertools
+from typing import TYPE_CHECKING, Iterable, Iterator, Mapping, Tuple
+
+
+if TYPE_CHECKING:  # pragma: nocover
+    from modmail.config import ThreadConfig
+
+
+class PlacementPolicy(enum.Enum):
+    """How the relay channel for a new ticket is picked, when there is more than one."""
+
+    ROUND_ROBIN = "round_robin"
+    LEAST_LOADED = "least_loaded"
+    HASHED = "hashed"
+
+
+def configured_relay_channel_ids(threads_config: "ThreadConfig") -> Tuple[int, ...]:
+    """Return the ids of all configured relay channels, starting with the main relay channel."""
+    ids = [threads_config.relay_channel_id, *threads_config.extra_relay_channel_ids]
+    # keep the configured order, but drop unset and duplicate ids
+    return tuple(dict.fromkeys(channel_id for channel_id in ids if channel_id))
+
+
+class RelayChannelPool:
+    """
+    The channels tickets are created in, and the policy used to pick one for each new ticket.
+
+    Every message sent in a channel shares that channel's rate limits, so spreading tickets over
+    several channels lets more tickets be opened at once.
+    """
+
+    def __init__(self, channel_ids: Iterable[int], policy: PlacementPolicy = PlacementPolicy.ROUND_ROBIN):
+        self.channel_ids = tuple(channel_ids)
+        if not self.channel_ids:
+            raise ValueError("At least one relay channel is required.")
+        self.policy = policy
+        self._ids = frozenset(self.channel_ids)
+        self._round_robin = itertools.cycle(self.channel_ids)
+
+    def __contains__(self, channel_id: int) -> bool:
+        return channel_id in self._ids
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.channel_ids)
+
+    def __len__(self) -> int:
+        return len(self.channel_ids)
+
+    def choose(self, user_id: int, open_tickets: Mapping[int, int]) -> int:
+        """
+        Return the id of the channel to create a ticket for the provided user in.
+
+        `open_tickets` is the number of open tickets in each channel, by channel id.
+        """
+        if len(self.channel_ids) == 1:
+            return self.channel_ids[0]
+
+        if self.policy is PlacementPolicy.LEAST_LOADED:
+            # ties go to the channel configured first
+            return min(self.channel_ids, key=lambda channel_id: open_tickets.get(channel_id, 0))
+
+        if self.policy is PlacementPolicy.HASHED:
+            # hashed rather than taken modulo, since the low bits of snowflakes aren't evenly spread.
+            # the same user always gets the same channel, as long as the pool doesn't change.
+            digest = hashlib.blake2b(user_id.to_bytes(8, "big"), digest_size=8).digest()
+            return self.channel_ids[int.from_bytes(digest, "big") % len(self.channel_ids)]
+
+        return next(self._round_robin)
@@ -0,0 +1,144 @@
+import concurrent.futures
+import logging
+import pathlib
+import sqlite3
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple
+
+import discord
+
+from modmail.config import CONFIG_DIRECTORY
+from modmail.utils.sqlite import BackgroundDatabase
+
+
+if TYPE_CHECKING:  # pragma: nocover
+    from modmail.log import ModmailLogger
+logger: "ModmailLogger" = logging.getLogger(__name__)
+
+SEARCH_INDEX_PATH = CONFIG_DIRECTORY / "modmail_search.sqlite3"
+
+SNIPPET_MARKER = "**"
+SNIPPET_TOKENS = 16
+
+_CREATE_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5(
+    content,
+    author,
+    author_id UNINDEXED,
+    recipient_id UNINDEXED,
+    guild_id UNINDEXED,
+    thread_id UNINDEXED,
+    message_id UNINDEXED,
+    created_at UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+_INSERT = "INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+_SEARCH = f"""
+SELECT
+    author, author_id, recipient_id, guild_id, thread_id, message_id, created_at,
+    snippet(messages, 0, '{SNIPPET_MARKER}', '{SNIPPET_MARKER}', '...', {SNIPPET_TOKENS})
+FROM messages
+WHERE messages MATCH ? {{recipient_filter}}
+ORDER BY rank
+LIMIT ?
+"""
+
+
+@dataclass(frozen=True)
+class SearchResult:
+    """A relayed message which matched a search."""
+
+    author: str
+    author_id: int
+    recipient_id: int
+    guild_id: int
+    thread_id: int
+    message_id: int
+    created_at: str
+    snippet: str
+
+    @property
+    def jump_url(self) -> str:
+        """Link to the message in the ticket's thread."""
+        return f"https://discord.com/channels/{self.guild_id}/{self.thread_id}/{self.message_id}"
+
+
+def to_match_query(query: str) -> str:
+    """
+    Convert plain text into an fts5 query which matches messages containing every word.
+
+    Each word is quoted, so characters which are part of the fts5 query syntax are searched literally.
+    """
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in query.split())
+
+
+class SearchIndex:
+    """
+    Full text index of relayed messages, stored in sqlite with fts5.
+
+    The database is only used from a background thread, so messages are indexed in the order
+    they were submitted.
+    """
+
+    def __init__(self, path: pathlib.Path = SEARCH_INDEX_PATH):
+        self.path = path
+        self._database = BackgroundDatabase(path, _CREATE_TABLE, thread_name="modmail-search")
+
+    @staticmethod
+    def _insert(connection: sqlite3.Connection, row: Tuple) -> None:
+        try:
+            with connection:
+                connection.execute(_INSERT, row)
+        except sqlite3.Error:
+            logger.exception("Unable to index message %s.", row[6])
+
+    def add(
+        self,
+        message: discord.Message,
+        thread_message: discord.Message,
+        recipient_id: int,
+        content: Optional[str] = None,
+    ) -> concurrent.futures.Future:
+        """
+        Queue a relayed message to be indexed, without waiting for it to be written.
+
+        `message` is the message which was relayed, and `thread_message` is the copy of it in the thread,
+        which search results link to.
+        """
+        row = (
+            message.content if content is None else content,
+            str(message.author),
+            message.author.id,
+            recipient_id,
+            thread_message.guild.id,
+            thread_message.channel.id,
+            thread_message.id,
+            message.created_at.isoformat(),
+        )
+        return self._database.submit(self._insert, row)
+
+    @staticmethod
+    def _search(
+        connection: sqlite3.Connection, query: str, recipient_id: Optional[int], limit: int
+    ) -> List[SearchResult]:
+        params: List[Any] = [to_match_query(query)]
+        if recipient_id is not None:
+            recipient_filter = "AND recipient_id = ?"
+            params.append(recipient_id)
+        else:
+            recipient_filter = ""
+        params.append(limit)
+
+        rows = connection.execute(_SEARCH.format(recipient_filter=recipient_filter), params)
+        return [SearchResult(*row) for row in rows]
+
+    async def search(self, query: str, *, recipient_id: int = None, limit: int = 50) -> List[SearchResult]:
+        """Return the best matching messages for the query, optionally only from tickets with a recipient."""
+        if not query.split():
+            return []
+        return await self._database.run(self._search, query, recipient_id, limit)
+
+    def close(self) -> None:
+        """Close the database once every queued message has been indexed."""
+        self._database.close()
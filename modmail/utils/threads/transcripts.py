@@ -0,0 +1,197 @@
+import concurrent.futures
+import datetime
+import gzip
+import json
+import logging
+import pathlib
+import zlib
+from typing import TYPE_CHECKING, IO, Any, Dict, List, Optional
+
+import discord
+
+from modmail.config import CONFIG_DIRECTORY
+from modmail.utils.threads.models import Target
+
+
+if TYPE_CHECKING:  # pragma: nocover
+    from modmail.log import ModmailLogger
+logger: "ModmailLogger" = logging.getLogger(__name__)
+
+TRANSCRIPT_DIRECTORY = CONFIG_DIRECTORY / "transcripts"
+
+# flush the compressed stream to disk every this many records, so a crash loses at most this many.
+# flushing more often than this noticeably hurts the compression ratio of short messages.
+FLUSH_EVERY = 16
+READ_CHUNK_SIZE = 64 * 1024
+
+# every transcript is written from this thread, so the event loop never waits on disk,
+# and the records of each transcript are written in the order they were submitted.
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="modmail-transcripts")
+
+
+def recover_tail(path: pathlib.Path) -> bytes:
+    """
+    Cut an unterminated gzip member off the end of a transcript, and return the lines it held.
+
+    A transcript which wasn't closed, because the bot crashed, ends with a gzip member that has no
+    trailer. Once another member is appended after it, the whole file can no longer be read.
+    The complete lines which can still be read from that member are returned, to be written again.
+    """
+    if not path.exists():
+        return b""
+
+    # the end of the last complete member, and the output of the member after it
+    complete_size = consumed = 0
+    pending: List[bytes] = []
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    with open(path, "rb") as f:
+        try:
+            while chunk := f.read(READ_CHUNK_SIZE):
+                while chunk:
+                    pending.append(decompressor.decompress(chunk))
+                    if not decompressor.eof:
+                        consumed += len(chunk)
+                        break
+                    # the member ended part way through the chunk, and the rest starts the next member
+                    consumed += len(chunk) - len(decompressor.unused_data)
+                    complete_size = consumed
+                    chunk = decompressor.unused_data
+                    pending = []
+                    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        except zlib.error:
+            logger.warning("The transcript at %s is corrupt after byte %d.", path, complete_size)
+
+    if complete_size == path.stat().st_size:
+        return b""
+
+    data = b"".join(pending)
+    with open(path, "r+b") as f:
+        f.truncate(complete_size)
+    logger.info("Recovered the unterminated end of the transcript at %s.", path)
+    return data[: data.rfind(b"\n") + 1]
+
+
+class TranscriptWriter:
+    """
+    Append-only, gzip compressed, json lines transcript of a ticket.
+
+    Each relayed message pair is written as it happens, so the history is never held in memory.
+    Writes are queued to a background thread, and never block the event loop.
+
+    The file is opened in append mode, so a transcript can be continued after a restart;
+    gzip readers treat the appended members as one continuous stream. If the previous writer
+    wasn't closed, the end of its member is repaired before appending.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self._file: Optional[IO[bytes]] = None
+        self._unflushed = 0
+        self._closed = False
+        _executor.submit(self._open)
+
+    @classmethod
+    def for_thread(cls, thread_id: int) -> "TranscriptWriter":
+        """Open the transcript for the provided thread id in the transcript directory."""
+        return cls(TRANSCRIPT_DIRECTORY / f"{thread_id}.jsonl.gz")
+
+    @property
+    def closed(self) -> bool:
+        """Whether this transcript has been closed or finalized."""
+        return self._closed
+
+    def _open(self) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            recovered = recover_tail(self.path)
+            self._file = gzip.open(self.path, "ab")
+            if recovered:
+                self._file.write(recovered)
+        except (OSError, zlib.error):
+            logger.exception("Unable to open the transcript at %s.", self.path)
+
+    def _write_line(self, line: bytes) -> None:
+        if self._file is None:
+            return
+        try:
+            self._file.write(line)
+            self._unflushed += 1
+            if self._unflushed >= FLUSH_EVERY:
+                self._file.flush()
+                self._unflushed = 0
+        except OSError:
+            logger.exception("Unable to write to the transcript at %s.", self.path)
+
+    def write(self, record: Dict[str, Any]) -> concurrent.futures.Future:
+        """Queue a single record to be written to the transcript."""
+        if self._closed:
+            raise ValueError("Cannot write to a closed transcript.")
+        record.setdefault("time", datetime.datetime.now(datetime.timezone.utc).isoformat())
+        line = json.dumps(record, separators=(",", ":"), default=str).encode() + b"\n"
+        return _executor.submit(self._write_line, line)
+
+    def write_pair(
+        self,
+        target: Target,
+        source: discord.Message,
+        mirror: discord.Message,
+        content: Optional[str] = None,
+    ) -> concurrent.futures.Future:
+        """
+        Queue a relayed message pair to be written to the transcript.
+
+        `source` is the message which was relayed, and `mirror` is the message the bot sent.
+        """
+        return self.write(
+            {
+                "time": source.created_at.isoformat(),
+                "target": target.name.lower(),
+                "author_id": source.author.id,
+                "author": str(source.author),
+                "message_id": source.id,
+                "mirror_id": mirror.id,
+                "content": source.content if content is None else content,
+                "attachments": [attachment.url for attachment in source.attachments],
+                "stickers": [sticker.name for sticker in source.stickers],
+            }
+        )
+
+    def _close(self) -> pathlib.Path:
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                logger.exception("Unable to close the transcript at %s.", self.path)
+            self._file = None
+        return self.path
+
+    def close(self) -> concurrent.futures.Future:
+        """
+        Close the file once the queued records are written, without ending the transcript.
+
+        The transcript can then be continued by a new writer, such as after a restart.
+        """
+        if self._closed:
+            return _executor.submit(lambda: self.path)
+        self._closed = True
+        return _executor.submit(self._close)
+
+    def finalize(self, **fields: Any) -> concurrent.futures.Future:
+        """
+        Write a closing record with the provided fields, and close the file.
+
+        Returns a future of the transcript's path, which is done once the file is closed.
+        """
+        if not self._closed:
+            self.write({"event": "closed", **fields})
+        return self.close()
+
+    def to_file(self) -> discord.File:
+        """
+        Return the finalized transcript as a discord.File.
+
+        The file is streamed from disk when uploaded, rather than being read into memory.
+        """
+        if not self._closed:
+            raise ValueError("Transcripts must be finalized before being uploaded.")
+        return discord.File(self.path, filename=self.path.name)
@@ -0,0 +1,102 @@
+"""
+Benchmark the cost of relay logging when the relevant log levels are disabled.
+
+This compares the eager `str.format` style messages which the relay methods used to build
+against the lazy `%` style arguments they use now.
+
+Run with `python -m tests.benchmarks.bench_logging`.
+"""
+
+import logging
+import time
+
+from modmail.log import ModmailLogger
+
+
+ITERATIONS = 200_000
+
+
+class _FakeUser:
+    """Stand-in for discord.User, including the cost of its __str__."""
+
+    def __init__(self, id: int):
+        self.id = id
+        self.name = "user"
+        self.discriminator = "0001"
+
+    def __str__(self) -> str:
+        return f"{self.name}#{self.discriminator}"
+
+
+class _FakeMessage:
+    def __init__(self, id: int, author: _FakeUser):
+        self.id = id
+        self.author = author
+
+
+class _FakeChannel:
+    def __init__(self, id: int):
+        self.id = id
+
+
+def eager_relay(logger: ModmailLogger, message: _FakeMessage, thread: _FakeChannel, dm: _FakeChannel) -> None:
+    """The logging done by a single relay in each direction, before the change."""
+    logger.debug(
+        "Relaying message id {message.id} by {message.author} "
+        "from thread {thread.id} to dm channel {dm_channel.id}.".format(
+            message=message, thread=thread, dm_channel=dm
+        )
+    )
+    logger.debug(
+        "Relaying message id {message.id} from dm channel {dm_channel.id}"
+        " with {message.author} to thread {thread.id}.".format(message=message, thread=thread, dm_channel=dm)
+    )
+    logger.trace(f"User ID {message.author.id} has edited a message in their dms with id {message.id}")
+
+
+def lazy_relay(logger: ModmailLogger, message: _FakeMessage, thread: _FakeChannel, dm: _FakeChannel) -> None:
+    """The logging done by a single relay in each direction, after the change."""
+    logger.debug(
+        "Relaying message id %s by %s from thread %s to dm channel %s.",
+        message.id,
+        message.author,
+        thread.id,
+        dm.id,
+    )
+    logger.debug(
+        "Relaying message id %s from dm channel %s with %s to thread %s.",
+        message.id,
+        dm.id,
+        message.author,
+        thread.id,
+    )
+    logger.trace("User ID %s has edited a message in their dms with id %s", message.author.id, message.id)
+
+
+def measure(func, logger: ModmailLogger) -> float:  # noqa: ANN001
+    """Return the cpu time in nanoseconds spent per call of func."""
+    message = _FakeMessage(1, _FakeUser(2))
+    thread, dm = _FakeChannel(3), _FakeChannel(4)
+    start = time.process_time_ns()
+    for _ in range(ITERATIONS):
+        func(logger, message, thread, dm)
+    return (time.process_time_ns() - start) / ITERATIONS
+
+
+def main() -> None:
+    """Run the benchmark and print the results."""
+    logging.setLoggerClass(ModmailLogger)
+    logger: ModmailLogger = logging.getLogger("modmail.benchmarks.logging")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    eager = measure(eager_relay, logger)
+    lazy = measure(lazy_relay, logger)
+    print(f"Per relay logging cost with DEBUG and TRACE disabled ({ITERATIONS:,} iterations)")
+    print(f"  eager formatting: {eager:8.0f} ns")
+    print(f"  lazy formatting:  {lazy:8.0f} ns")
+    print(f"  speedup:          {eager / lazy:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
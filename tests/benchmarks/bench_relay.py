@@ -0,0 +1,264 @@
+"""
+Benchmark ticket relays end to end, without a connection to discord.
+
+Synthetic tickets are driven through `TicketsCog`: a dm opens each ticket, then the user and staff
+trade messages, and staff edit a reply, delete a reply, and close the ticket.
+Every REST call made on the mocks from `tests.mocks` goes through `FakeHTTP`. That adds a configurable
+round trip time and injects 429 responses, which are retried after `retry_after` like discord.py does.
+
+Reported are relayed messages per second, the p50 and p99 latency of each operation,
+and the memory allocated by modmail's own code for each open ticket.
+The mocks are much slower to create than real discord objects, so compare runs against each other,
+rather than against production.
+
+`--event-loop compare` runs the benchmark on asyncio's event loop and then on uvloop, if it is installed,
+and reports the difference in throughput.
+
+Run with `python -m tests.benchmarks.bench_relay --help` to see the options.
+"""
+
+import argparse
+import asyncio
+import collections
+import datetime
+import random
+import statistics
+import time
+import tracemalloc
+import unittest.mock
+from typing import Any, Callable, Dict, List, Optional
+
+import discord
+
+import modmail.utils.embeds
+from modmail import set_event_loop_policy
+from modmail.extensions import threads
+from modmail.utils.threads import Ticket
+from tests import mocks
+
+
+class FakeHTTP:
+    """
+    Stand in for discord's REST api, which only adds latency and rate limits.
+
+    `latency` and `jitter` are in seconds. Each request is rate limited with a chance of
+    `rate_limit_chance`, in which case it is retried after `retry_after` seconds.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.01,
+        rate_limit_chance: float = 0.0,
+        retry_after: float = 0.5,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_chance = rate_limit_chance
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+        self.requests = 0
+        self.rate_limited = 0
+
+    def _round_trip(self) -> float:
+        return max(0.0, self.random.gauss(self.latency, self.jitter))
+
+    async def request(self, result: Callable[[], Any]) -> Any:
+        """Simulate a single request, retrying it if it was rate limited, and return the result."""
+        while True:
+            self.requests += 1
+            await asyncio.sleep(self._round_trip())
+            if self.random.random() >= self.rate_limit_chance:
+                return result()
+            self.rate_limited += 1
+            await asyncio.sleep(self.retry_after)
+
+    def route(self, result: Callable[[], Any] = lambda: None) -> unittest.mock.AsyncMock:
+        """Return a mock coroutine method which makes a request through this fake api."""
+
+        async def call(*args, **kwargs) -> Any:
+            return await self.request(result)
+
+        return unittest.mock.AsyncMock(side_effect=call)
+
+
+class RelayHarness:
+    """Builds mocks wired to a FakeHTTP, and drives tickets through a TicketsCog."""
+
+    def __init__(self, http: FakeHTTP):
+        self.http = http
+        self.latencies: Dict[str, List[float]] = collections.defaultdict(list)
+        self.relayed_messages = 0
+
+        self.bot = mocks.MockBot()
+        self.bot._tickets = dict()
+        self.staff = mocks.MockMember(name="staff")
+        self.guild = mocks.MockGuild()
+        self.relay_channel = mocks.MockTextChannel(guild=self.guild)
+        self.relay_channel.send = self.http.route(self._make_log_message)
+
+        self.cog = threads.TicketsCog(self.bot)
+        self.cog.relay_channel = self.relay_channel
+        # the relay channel is already set, so skip fetching it again
+        self.cog.init_relay_channel = unittest.mock.AsyncMock()
+
+    def _make_message(self, **kwargs) -> mocks.MockMessage:
+        defaults = {"attachments": [], "stickers": [], "reference": None, "activity": None, "content": ""}
+        message = mocks.MockMessage(**collections.ChainMap(kwargs, defaults))
+        message.created_at = datetime.datetime.now(datetime.timezone.utc)
+        message.edit = self.http.route()
+        message.delete = self.http.route()
+        message.add_reaction = self.http.route()
+        return message
+
+    def _make_bot_message(self, channel: Any = None) -> mocks.MockMessage:
+        return self._make_message(author=self.bot.user, channel=channel, embeds=[discord.Embed()])
+
+    def _make_thread(self) -> mocks.MockThread:
+        thread = mocks.MockThread(guild=self.guild, parent=self.relay_channel, auto_archive_duration=1440)
+        thread.send = self.http.route(lambda: self._make_bot_message(thread))
+        thread.edit = self.http.route()
+        return thread
+
+    def _make_log_message(self) -> mocks.MockMessage:
+        message = self._make_message(
+            author=self.bot.user,
+            channel=self.relay_channel,
+            embeds=[discord.Embed(colour=threads.NO_REPONSE_COLOUR)],
+        )
+        message.create_thread = self.http.route(self._make_thread)
+        return message
+
+    def make_user(self) -> mocks.MockUser:
+        """Create a user who can be sent dms through the fake api."""
+        user = mocks.MockUser(discriminator="0001")
+        user.send = self.http.route(lambda: self._make_bot_message(user.dm_channel))
+        return user
+
+    async def _timed(self, operation: str, coro: Any) -> Any:
+        start = time.perf_counter()
+        result = await coro
+        self.latencies[operation].append(time.perf_counter() - start)
+        return result
+
+    def _staff_context(self, ticket: Ticket) -> mocks.MockContext:
+        message = self._make_message(author=self.staff, channel=ticket.thread)
+        return mocks.MockContext(bot=self.bot, author=self.staff, channel=ticket.thread, message=message)
+
+    async def open_ticket(self, user: mocks.MockUser, messages: int) -> Ticket:
+        """Open a ticket with a dm, and relay the user's and staff's messages."""
+        dm = self._make_message(author=user, guild=None, content="I need some help")
+        dm.channel.send = self.http.route()
+        await self._timed("open", self.cog.on_dm_message(dm))
+        self.relayed_messages += 1
+        ticket = self.bot._tickets[user.id]
+
+        for i in range(messages):
+            dm = self._make_message(author=user, guild=None, content=f"message {i}")
+            await self._timed("dm", self.cog.on_dm_message(dm))
+
+            ctx = self._staff_context(ticket)
+            await self._timed("reply", self.cog.reply.callback(self.cog, ctx, message=f"reply {i}"))
+            self.relayed_messages += 2
+
+        return ticket
+
+    async def finish_ticket(self, ticket: Ticket) -> None:
+        """Edit and delete the last reply, and close the ticket."""
+        ctx = self._staff_context(ticket)
+        last = ticket.last_sent_messages.last
+        await self._timed("edit", self.cog.edit.callback(self.cog, ctx, (last, None), content="edited"))
+        await self._timed("delete", self.cog.delete.callback(self.cog, ctx, (last, None)))
+        await self._timed("close", self.cog.close_thread(ticket, self.staff))
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile))]
+
+
+async def run(args: argparse.Namespace, event_loop: str = "asyncio") -> float:
+    """Run the benchmark with the parsed command line arguments, print the results, and return messages/s."""
+    modmail.utils.embeds.patch_embed()
+    http = FakeHTTP(args.latency, args.jitter, args.rate_limit_chance, args.retry_after, args.seed)
+    harness = RelayHarness(http)
+    users = [harness.make_user() for _ in range(args.tickets)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def open_ticket(user: mocks.MockUser) -> Ticket:
+        async with semaphore:
+            return await harness.open_ticket(user, args.messages)
+
+    async def finish_ticket(ticket: Ticket) -> None:
+        async with semaphore:
+            await harness.finish_ticket(ticket)
+
+    # only count memory allocated by modmail, since the mocks are much larger than real objects
+    tracemalloc.start()
+    start = time.perf_counter()
+    tickets = await asyncio.gather(*(open_ticket(user) for user in users))
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(True, "*/modmail/*")])
+    tracemalloc.stop()
+
+    await asyncio.gather(*(finish_ticket(ticket) for ticket in tickets))
+    elapsed = time.perf_counter() - start
+    harness.cog.cog_unload()
+
+    ticket_memory = sum(stat.size for stat in snapshot.statistics("filename")) / len(tickets)
+    print(
+        f"{args.tickets} tickets, {args.messages} message pairs each, {args.concurrency} at a time, "
+        f"{args.latency * 1000:.0f}ms latency, {args.rate_limit_chance:.0%} rate limited, {event_loop}"
+    )
+    print(f"  elapsed:          {elapsed:8.2f} s")
+    print(f"  relayed messages: {harness.relayed_messages / elapsed:8.1f} per second")
+    print(f"  requests:         {http.requests:8d} ({http.rate_limited} rate limited)")
+    print(f"  memory:           {ticket_memory:8.0f} bytes per open ticket")
+    print(f"  {'operation':10} {'count':>6} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+    for operation, latencies in harness.latencies.items():
+        print(
+            f"  {operation:10} {len(latencies):6d} {_percentile(latencies, 0.5) * 1000:8.1f} "
+            f"{_percentile(latencies, 0.99) * 1000:8.1f} {statistics.mean(latencies) * 1000:8.1f}"
+        )
+    return harness.relayed_messages / elapsed
+
+
+def main() -> None:
+    """Parse the command line and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=100, help="number of tickets to open")
+    parser.add_argument("--messages", type=int, default=5, help="user and staff message pairs per ticket")
+    parser.add_argument("--concurrency", type=int, default=25, help="tickets being driven at once")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean REST round trip in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="standard deviation of the round trip")
+    parser.add_argument("--rate-limit-chance", type=float, default=0.0, help="chance of a 429 per request")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="seconds to wait after a 429")
+    parser.add_argument("--seed", type=int, default=None, help="seed for latency and rate limits")
+    parser.add_argument(
+        "--event-loop",
+        choices=("asyncio", "uvloop", "compare"),
+        default="asyncio",
+        help="event loop to run on, or compare runs on both",
+    )
+    args = parser.parse_args()
+
+    requested = ("asyncio", "uvloop") if args.event_loop == "compare" else (args.event_loop,)
+    throughput = {}
+    with unittest.mock.patch.object(threads, "SAVE_TRANSCRIPTS", False), unittest.mock.patch.object(
+        threads, "INDEX_MESSAGES", False
+    ):
+        for event_loop in requested:
+            event_loop = set_event_loop_policy(event_loop)
+            if event_loop in throughput:
+                # uvloop is not installed, so this would only repeat the asyncio run
+                continue
+            throughput[event_loop] = asyncio.run(run(args, event_loop))
+
+    if len(throughput) == 2:
+        change = throughput["uvloop"] / throughput["asyncio"] - 1
+        print(f"uvloop relayed {change:+.1%} messages per second compared to asyncio")
+
+
+if __name__ == "__main__":
+    main()
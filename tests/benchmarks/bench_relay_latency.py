@@ -0,0 +1,75 @@
+"""
+Benchmark the end to end latency of relaying a staff reply to a user.
+
+Each REST call made by `TicketsCog.relay_message_to_user` is given the same simulated round trip time,
+using the test mocks. The dm and the thread mirror are sent concurrently, and the staff message is deleted
+once the dm has been sent, so a reply takes two round trips rather than three.
+
+Run with `python -m tests.benchmarks.bench_relay_latency`.
+"""
+
+import asyncio
+import datetime
+import statistics
+import time
+import unittest.mock
+
+import modmail.utils.embeds
+from modmail.extensions import threads
+from modmail.utils.threads import Ticket
+from tests import mocks
+
+
+ROUND_TRIP = 0.05
+RELAYS = 20
+
+
+def _rest_call(result: object = None) -> unittest.mock.AsyncMock:
+    async def call(*args, **kwargs) -> object:
+        await asyncio.sleep(ROUND_TRIP)
+        return result if result is not None else mocks.MockMessage()
+
+    return unittest.mock.AsyncMock(side_effect=call)
+
+
+async def measure() -> list:
+    """Return the latency of each relay in seconds."""
+    modmail.utils.embeds.patch_embed()
+    bot = mocks.MockBot()
+    bot._tickets = dict()
+    with unittest.mock.patch.object(threads, "SAVE_TRANSCRIPTS", False), unittest.mock.patch.object(
+        threads, "INDEX_MESSAGES", False
+    ):
+        cog = threads.TicketsCog(bot)
+
+    thread = mocks.MockThread()
+    thread.send = _rest_call()
+    recipient = mocks.MockUser()
+    recipient.send = _rest_call()
+    ticket = Ticket(recipient, thread, log_message=mocks.MockMessage())
+
+    latencies = []
+    for _ in range(RELAYS):
+        message = mocks.MockMessage(attachments=[], stickers=[], reference=None)
+        message.author.colour = 5
+        message.created_at = datetime.datetime.now(datetime.timezone.utc)
+        message.delete = _rest_call()
+        start = time.perf_counter()
+        await cog.relay_message_to_user(ticket, message, "benchmark reply")
+        latencies.append(time.perf_counter() - start)
+
+    cog.cog_unload()
+    return latencies
+
+
+def main() -> None:
+    """Run the benchmark and print the results."""
+    latencies = asyncio.run(measure())
+    print(f"Reply relay latency with a {ROUND_TRIP * 1000:.0f}ms round trip per REST call ({RELAYS} relays)")
+    print(f"  sequential calls would take: {3 * ROUND_TRIP * 1000:6.1f} ms")
+    print(f"  median:                      {statistics.median(latencies) * 1000:6.1f} ms")
+    print(f"  max:                         {max(latencies) * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
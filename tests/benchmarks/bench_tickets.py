@@ -0,0 +1,106 @@
+"""
+Benchmark the memory used by open tickets.
+
+This compares the slotted Ticket model against the previous model, which had an instance __dict__.
+The previous model shared one list of recent messages between every ticket, which was a bug,
+so it is measured with a list per ticket, the way it was intended to work.
+
+Tickets are measured both before any staff replies, and once their recent messages are full.
+
+Run with `python -m tests.benchmarks.bench_tickets`.
+"""
+
+import collections
+import tracemalloc
+from typing import Callable, List
+
+from modmail.utils.threads.models import MAX_CACHED_MESSAGES_PER_THREAD, MessageDict, Ticket
+
+
+TICKETS = 10_000
+
+
+class _FakeUser:
+    def __init__(self, id: int):
+        self.id = id
+
+
+class _FakeChannel:
+    def __init__(self, id: int):
+        self.id = id
+
+    def get_partial_message(self, id: int) -> "_FakeMessage":
+        return _FakeMessage(id)
+
+
+class _FakeThread:
+    def __init__(self, id: int, parent: _FakeChannel):
+        self.id = id
+        self.parent = parent
+        self.parent_id = parent.id
+        self.auto_archive_duration = 1440
+
+
+class _FakeMessage:
+    def __init__(self, id: int):
+        self.id = id
+
+
+class _DictTicket:
+    """The ticket model before it used slots, with a list of recent messages per ticket."""
+
+    def __init__(self, recipient: _FakeUser, thread: _FakeThread, *, log_message: _FakeMessage = None):
+        self.thread = thread
+        self.recipient = recipient
+        self.log_message = log_message or self.thread.parent.get_partial_message(self.thread.id)
+        self.messages = MessageDict()
+        self.last_sent_messages = list()
+        self.close_after = self.thread.auto_archive_duration
+        self.has_sent_initial_message = True
+        self.transcript = None
+
+
+def measure(make_ticket: Callable[[int], object], recent_messages: int) -> float:
+    """Return the bytes allocated per ticket, when each ticket has that many recent messages."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+
+    tickets: List[object] = []
+    for i in range(TICKETS):
+        ticket = make_ticket(i)
+        for message in _SHARED_MESSAGES[:recent_messages]:
+            # the same messages for every ticket, so only the containers are measured
+            ticket.last_sent_messages.append(message)
+        tickets.append(ticket)
+
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / TICKETS
+
+
+_SHARED_MESSAGES = [_FakeMessage(-i) for i in range(MAX_CACHED_MESSAGES_PER_THREAD)]
+_PARENT = _FakeChannel(1)
+_USERS = [_FakeUser(i) for i in range(TICKETS)]
+_THREADS = [_FakeThread(i, _PARENT) for i in range(TICKETS)]
+_LOG_MESSAGES = [_FakeMessage(i) for i in range(TICKETS)]
+
+
+def main() -> None:
+    """Run the benchmark and print the results."""
+    client = collections.namedtuple("client", "get_user get_channel")(None, None)
+    models = {
+        "previous model": lambda i: _DictTicket(_USERS[i], _THREADS[i], log_message=_LOG_MESSAGES[i]),
+        "slotted model": lambda i: Ticket(_USERS[i], _THREADS[i], log_message=_LOG_MESSAGES[i]),
+        "slotted, from ids": lambda i: Ticket.from_ids(client, i, TICKETS + i),
+    }
+
+    for recent_messages in (0, MAX_CACHED_MESSAGES_PER_THREAD):
+        print(f"Memory per open ticket with {recent_messages} recent messages ({TICKETS:,} tickets)")
+        for name, make_ticket in models.items():
+            size = measure(make_ticket, recent_messages)
+            print(f"  {name + ':':19} {size:6.0f} bytes  ({size * TICKETS / 2**20:5.2f} MiB total)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+"""A local fake of discord's REST api and gateway, for load and soak tests of the whole bot."""
+
+from tests.fake_discord.ratelimits import RateLimiter
+from tests.fake_discord.server import FakeDiscord
+from tests.fake_discord.state import FakeState
+
+
+__all__ = ("FakeDiscord", "FakeState", "RateLimiter")
@@ -0,0 +1,172 @@
+"""
+Run the fake discord server, optionally with the bot connected to it and synthetic traffic.
+
+With `--bot`, a ModmailBot is started in this process and pointed at the fake server.
+Users then dm the bot at `--dms-per-second`, and staff reply in open tickets at `--replies-per-second`,
+closing the ticket instead with a chance of `--close-chance`. The request rate, 429s, and gateway events
+are reported every `--report-every` seconds, which makes this suitable for throughput and soak tests.
+
+Without `--bot`, only the server is run, for a bot in another process which sets `discord.http.Route.BASE`
+to the printed api url.
+Traffic can then be driven with the control api: `POST /_fake/dm` and `POST /_fake/messages`.
+
+Run with `python -m tests.fake_discord --help` to see the options.
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import random
+from typing import Awaitable, Callable, Optional
+
+from tests.fake_discord import FakeDiscord, FakeState, RateLimiter
+
+
+logger = logging.getLogger(__name__)
+
+
+async def _every(
+    per_second: float, duration: Optional[float], action: Callable[[int], Awaitable[None]]
+) -> None:
+    """Run action per_second times a second, for the duration, or forever if duration is None."""
+    if per_second <= 0:
+        return
+    loop = asyncio.get_running_loop()
+    end = None if duration is None else loop.time() + duration
+    for i in itertools.count():
+        when = loop.time()
+        if end is not None and when >= end:
+            return
+        try:
+            await action(i)
+        except Exception:
+            logger.exception("Synthetic traffic failed.")
+        await asyncio.sleep(max(0.0, when + 1 / per_second - loop.time()))
+
+
+async def _report(server: FakeDiscord, every: float) -> None:
+    previous_requests = previous_created = 0
+    while True:
+        await asyncio.sleep(every)
+        stats = server.stats()
+        requests = sum(stats["requests"].values())
+        created = stats["events"].get("MESSAGE_CREATE", 0)
+        print(
+            f"[{stats['uptime']:7.0f}s] {(requests - previous_requests) / every:7.1f} requests/s, "
+            f"{(created - previous_created) / every:7.1f} messages/s, 429s: {stats['rate_limited'] or 0}, "
+            f"stored messages: {stats['messages']}, gateway sessions: {stats['gateway_sessions']}"
+        )
+        previous_requests, previous_created = requests, created
+
+
+async def _start_bot(server: FakeDiscord) -> asyncio.Task:
+    """Start a ModmailBot connected to the fake server, and wait until it is ready."""
+    os.environ["MODMAIL_BOT_TOKEN"] = server.token
+    os.environ["MODMAIL_THREADS_RELAY_CHANNEL_ID"] = server.state.relay_channel["id"]
+
+    from modmail.bot import ModmailBot
+    from modmail.utils.embeds import patch_embed
+
+    patch_embed()
+    bot = ModmailBot()
+    task = asyncio.create_task(bot.start(server.token))
+    await server.identified.wait()
+    # give discord.py time to finish waiting for guilds before sending any traffic
+    await asyncio.wait_for(bot.wait_until_ready(), timeout=30)
+    return task
+
+
+async def run(args: argparse.Namespace) -> None:
+    """Start the server, and the bot and traffic if they were requested."""
+    rng = random.Random(args.seed)
+    state = FakeState(staff=args.staff, users=args.users)
+    rate_limiter = RateLimiter(
+        bucket_limit=args.bucket_limit,
+        bucket_per=args.bucket_per,
+        global_limit=args.global_limit,
+        rate_limit_chance=args.rate_limit_chance,
+        injected_retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    server = FakeDiscord(
+        state=state, latency=args.latency, jitter=args.jitter, rate_limiter=rate_limiter, seed=args.seed
+    )
+    await server.start(args.host, args.port)
+    print(f"Fake discord api: {server.api_url}, token: {server.token}")
+    print(f"Guild {state.guild_id}, relay channel {state.relay_channel['id']}")
+
+    tasks = [asyncio.create_task(_report(server, args.report_every))]
+    try:
+        with server.patch_routes():
+            if not args.bot:
+                await asyncio.Event().wait()
+
+            bot_task = await _start_bot(server)
+            tasks.append(bot_task)
+
+            async def send_dm(i: int) -> None:
+                user = rng.choice(state.dm_users)
+                await server.send_dm(int(user["id"]), f"synthetic dm {i}")
+
+            async def reply(i: int) -> None:
+                threads = [
+                    t for t in state.threads(archived=False) if t["parent_id"] == state.relay_channel["id"]
+                ]
+                if not threads:
+                    return
+                thread = rng.choice(threads)
+                staff = rng.choice(state.staff)
+                if rng.random() < args.close_chance:
+                    content = f"{args.prefix}close"
+                else:
+                    content = f"{args.prefix}reply synthetic reply {i}"
+                await server.send_message(int(thread["id"]), int(staff["id"]), content)
+
+            traffic = [
+                asyncio.create_task(_every(args.dms_per_second, args.duration, send_dm)),
+                asyncio.create_task(_every(args.replies_per_second, args.duration, reply)),
+            ]
+            await asyncio.wait([bot_task, asyncio.gather(*traffic)], return_when=asyncio.FIRST_COMPLETED)
+            if bot_task.done():
+                bot_task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await server.close()
+        print(server.stats())
+
+
+def main() -> None:
+    """Parse the command line and run the server."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--staff", type=int, default=3, help="staff members in the guild")
+    parser.add_argument("--users", type=int, default=100, help="users who dm the bot")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean REST round trip in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="standard deviation of the round trip")
+    parser.add_argument("--bucket-limit", type=int, default=5, help="requests per route bucket window")
+    parser.add_argument("--bucket-per", type=float, default=5.0, help="seconds per route bucket window")
+    parser.add_argument("--global-limit", type=int, default=50, help="requests per second, across routes")
+    parser.add_argument("--rate-limit-chance", type=float, default=0.0, help="chance of an injected 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="retry_after of injected 429s")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--bot", action="store_true", help="run the bot against the server")
+    parser.add_argument("--prefix", default="?", help="the bot's command prefix")
+    parser.add_argument("--dms-per-second", type=float, default=2.0)
+    parser.add_argument("--replies-per-second", type=float, default=1.0)
+    parser.add_argument("--close-chance", type=float, default=0.05, help="chance a staff message closes")
+    parser.add_argument("--duration", type=float, default=None, help="seconds of traffic, or forever")
+    parser.add_argument("--report-every", type=float, default=10.0, help="seconds between reports")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Discord's rate limits, as seen by a client.
+
+Each route and major parameter gets its own fixed window bucket, and every request also counts towards
+a global limit. The headers returned match the ones that discord.py reads.
+"""
+
+import hashlib
+import random
+import time
+from typing import Dict, Hashable, Optional, Tuple
+
+
+class Bucket:
+    """A fixed window rate limit, allowing `limit` requests every `per` seconds."""
+
+    __slots__ = ("limit", "per", "remaining", "reset_at", "name")
+
+    def __init__(self, limit: int, per: float, name: str):
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset_at = 0.0
+        self.name = name
+
+    def acquire(self, now: float) -> Optional[float]:
+        """Use up a request, or return how long to wait if the bucket is exhausted."""
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.per
+        if self.remaining == 0:
+            return self.reset_at - now
+        self.remaining -= 1
+        return None
+
+    def headers(self, now: float) -> Dict[str, str]:
+        """Return the X-RateLimit headers describing this bucket."""
+        reset_after = max(0.0, self.reset_at - now)
+        return {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": f"{time.time() + reset_after:.3f}",
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+            "X-RateLimit-Bucket": self.name,
+        }
+
+
+class RateLimited(Exception):
+    """Raised when a request should get a 429 response."""
+
+    def __init__(self, retry_after: float, scope: str, headers: Dict[str, str]):
+        self.retry_after = retry_after
+        self.scope = scope
+        self.headers = headers
+        super().__init__(f"Rate limited for {retry_after:.3f}s ({scope}).")
+
+
+class RateLimiter:
+    """
+    Track every bucket, and decide whether a request is rate limited.
+
+    `rate_limit_chance` injects a 429 with a `retry_after` of `injected_retry_after` into that fraction
+    of requests which would otherwise succeed, to simulate limits shared with other bots.
+    """
+
+    def __init__(
+        self,
+        *,
+        bucket_limit: int = 5,
+        bucket_per: float = 5.0,
+        global_limit: int = 50,
+        rate_limit_chance: float = 0.0,
+        injected_retry_after: float = 1.0,
+        seed: Optional[int] = None,
+    ):
+        self.bucket_limit = bucket_limit
+        self.bucket_per = bucket_per
+        self.rate_limit_chance = rate_limit_chance
+        self.injected_retry_after = injected_retry_after
+        self.random = random.Random(seed)
+
+        self.global_bucket = Bucket(global_limit, 1.0, "global")
+        self.buckets: Dict[Tuple[Hashable, ...], Bucket] = {}
+
+    def _get_bucket(self, key: Tuple[Hashable, ...]) -> Bucket:
+        try:
+            return self.buckets[key]
+        except KeyError:
+            name = hashlib.sha1(repr(key[:2]).encode()).hexdigest()[:16]
+            bucket = self.buckets[key] = Bucket(self.bucket_limit, self.bucket_per, name)
+            return bucket
+
+    def check(self, method: str, route: str, major: Optional[str]) -> Dict[str, str]:
+        """Count a request, and return its rate limit headers, or raise RateLimited."""
+        now = time.monotonic()
+        bucket = self._get_bucket((method, route, major))
+
+        retry_after = self.global_bucket.acquire(now)
+        if retry_after is not None:
+            raise RateLimited(retry_after, "global", {"X-RateLimit-Global": "true"})
+
+        retry_after = bucket.acquire(now)
+        if retry_after is not None:
+            raise RateLimited(retry_after, "user", bucket.headers(now))
+
+        if self.rate_limit_chance and self.random.random() < self.rate_limit_chance:
+            raise RateLimited(self.injected_retry_after, "shared", bucket.headers(now))
+
+        return bucket.headers(now)
@@ -0,0 +1,629 @@
+"""
+An aiohttp server which stands in for discord's REST api and gateway.
+
+It implements the routes and gateway events that modmail uses: dms, threads, messages, reactions,
+audit logs, stickers and typing, along with rate limit headers and 429 responses.
+Messages sent through the api are dispatched back over the gateway, like discord does.
+
+Point discord.py at it with `FakeDiscord.patch_routes`, which changes the REST base url,
+and the default gateway url for versions of discord.py that do not fetch it from the api.
+"""
+
+import asyncio
+import collections
+import contextlib
+import json
+import logging
+import math
+import random
+import time
+import unittest.mock
+import urllib.parse
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set
+
+import discord.gateway
+import discord.http
+from aiohttp import WSMsgType, web
+
+from tests.fake_discord.ratelimits import RateLimited, RateLimiter
+from tests.fake_discord.state import PUBLIC_THREAD, FakeState, Payload, isoformat
+
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+# gateway opcodes
+DISPATCH = 0
+HEARTBEAT = 1
+IDENTIFY = 2
+RESUME = 6
+RECONNECT = 7
+REQUEST_MEMBERS = 8
+HELLO = 10
+HEARTBEAT_ACK = 11
+
+AUTHENTICATION_FAILED = 4004
+
+MAJOR_PARAMETERS = ("channel_id", "guild_id", "webhook_id", "interaction_id")
+
+
+class NotFound(Exception):
+    """Raised by route handlers when the requested object does not exist."""
+
+    def __init__(self, kind: str, code: int):
+        self.kind = kind
+        self.code = code
+        super().__init__(f"Unknown {kind}")
+
+
+def _json_response(data: Any, *, status: int = 200, headers: Dict[str, str] = None) -> web.Response:
+    # discord.py only parses bodies whose content type is exactly application/json, without a charset
+    return web.Response(
+        body=json.dumps(data).encode(), status=status, headers=headers, content_type="application/json"
+    )
+
+
+def _error(status: int, code: int, message: str, headers: Dict[str, str] = None) -> web.Response:
+    return _json_response({"message": message, "code": code}, status=status, headers=headers)
+
+
+class GatewaySession:
+    """A single websocket connected to the gateway."""
+
+    def __init__(self, ws: web.WebSocketResponse):
+        self.ws = ws
+        self.id = uuid.uuid4().hex
+        self.sequence = 0
+        self.identified = False
+
+    async def send(self, op: int, data: Any = None, event: Optional[str] = None) -> None:
+        """Send a payload, numbering it if it is a dispatch."""
+        payload = {"op": op, "d": data, "s": None, "t": event}
+        if op == DISPATCH:
+            self.sequence += 1
+            payload["s"] = self.sequence
+        await self.ws.send_str(json.dumps(payload))
+
+
+class FakeDiscord:
+    """
+    A local fake of discord, for load and soak tests of the whole bot.
+
+    `latency` and `jitter` delay every REST response, in seconds, and `rate_limiter` decides
+    which requests are rate limited. Everything under `/_fake/` is a control api for test drivers,
+    which is neither delayed nor rate limited.
+    """
+
+    def __init__(
+        self,
+        *,
+        token: str = "fake-token",
+        state: Optional[FakeState] = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_limiter: Optional[RateLimiter] = None,
+        heartbeat_interval: float = 41.25,
+        seed: Optional[int] = None,
+    ):
+        self.token = token
+        self.state = state or FakeState()
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limiter = rate_limiter or RateLimiter(seed=seed)
+        self.heartbeat_interval = heartbeat_interval
+        self.random = random.Random(seed)
+
+        self.sessions: Set[GatewaySession] = set()
+        self.identified = asyncio.Event()
+        self.requests: Dict[str, int] = collections.Counter()
+        self.rate_limited: Dict[str, int] = collections.Counter()
+        self.events: Dict[str, int] = collections.Counter()
+        self.started_at = time.monotonic()
+
+        self.app = web.Application(middlewares=[self._api_middleware])
+        self._add_routes()
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    @property
+    def api_url(self) -> str:
+        """The base url of the REST api."""
+        return f"{self.url}/api/v9"
+
+    @property
+    def gateway_url(self) -> str:
+        """The url of the gateway websocket."""
+        return self.url.replace("http", "ws", 1) + "/gateway"
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        """Start serving. If port is 0, a free port is used."""
+        self._runner = web.AppRunner(self.app, handle_signals=False)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+        self.started_at = time.monotonic()
+        logger.info("Fake discord is listening on %s", self.url)
+
+    async def close(self) -> None:
+        """Disconnect every gateway session and stop serving."""
+        for session in list(self.sessions):
+            await session.ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @contextlib.contextmanager
+    def patch_routes(self) -> Iterator[None]:
+        """Send discord.py's requests and gateway connections here, for the duration of the context."""
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(unittest.mock.patch.object(discord.http.Route, "BASE", self.api_url))
+            # newer versions of discord.py connect to a default gateway, rather than asking the api for it
+            if hasattr(discord.gateway.DiscordWebSocket, "DEFAULT_GATEWAY"):
+                gateway = unittest.mock.patch.object(
+                    discord.gateway.DiscordWebSocket, "DEFAULT_GATEWAY", self.gateway_url
+                )
+                stack.enter_context(gateway)
+            yield
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of requests, rate limits and events since the server started."""
+        return {
+            "uptime": time.monotonic() - self.started_at,
+            "requests": dict(self.requests),
+            "rate_limited": dict(self.rate_limited),
+            "events": dict(self.events),
+            "messages": len(self.state.messages),
+            "gateway_sessions": len(self.sessions),
+        }
+
+    # gateway
+
+    async def dispatch(self, event: str, data: Payload) -> None:
+        """Send an event to every identified gateway session."""
+        self.events[event] += 1
+        for session in list(self.sessions):
+            if session.identified and not session.ws.closed:
+                await session.send(DISPATCH, data, event)
+
+    async def send_dm(self, user_id: int, content: str, **kwargs) -> Payload:
+        """Send a dm to the bot from a user, and return the message."""
+        channel = self.state.get_dm_channel(user_id)
+        message = self.state.create_message(int(channel["id"]), user_id, content, **kwargs)
+        await self.dispatch("MESSAGE_CREATE", message)
+        return message
+
+    async def send_message(self, channel_id: int, author_id: int, content: str, **kwargs) -> Payload:
+        """Send a message to a guild channel or thread from a member, and return the message."""
+        message = self.state.create_message(channel_id, author_id, content, **kwargs)
+        await self.dispatch("MESSAGE_CREATE", message)
+        return message
+
+    async def start_typing(self, channel_id: int, user_id: int) -> None:
+        """Dispatch a typing event from a user."""
+        data = {"channel_id": str(channel_id), "user_id": str(user_id), "timestamp": int(time.time())}
+        channel = self.state.channels[channel_id]
+        if "guild_id" in channel:
+            data["guild_id"] = channel["guild_id"]
+            data["member"] = self.state.members[user_id]
+        await self.dispatch("TYPING_START", data)
+
+    async def _gateway(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        session = GatewaySession(ws)
+        self.sessions.add(session)
+        try:
+            await session.send(HELLO, {"heartbeat_interval": int(self.heartbeat_interval * 1000)})
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    break
+                payload = json.loads(msg.data)
+                await self._handle_gateway_payload(session, payload["op"], payload.get("d"))
+        finally:
+            self.sessions.discard(session)
+        return ws
+
+    async def _handle_gateway_payload(self, session: GatewaySession, op: int, data: Any) -> None:
+        if op == HEARTBEAT:
+            await session.send(HEARTBEAT_ACK)
+        elif op in (IDENTIFY, RESUME):
+            if data.get("token") != self.token:
+                await session.ws.close(code=AUTHENTICATION_FAILED, message=b"Authentication failed.")
+                return
+            session.identified = True
+            if op == RESUME:
+                # events are not buffered, so there is nothing to replay
+                session.sequence = data.get("seq") or 0
+                await session.send(DISPATCH, {}, "RESUMED")
+            else:
+                await session.send(DISPATCH, self.state.ready_payload(session.id, self.gateway_url), "READY")
+                await session.send(DISPATCH, self.state.guild_payload(), "GUILD_CREATE")
+            self.identified.set()
+        elif op == REQUEST_MEMBERS:
+            chunk = {
+                "guild_id": str(self.state.guild_id),
+                "members": list(self.state.members.values()),
+                "chunk_index": 0,
+                "chunk_count": 1,
+                "nonce": data.get("nonce"),
+            }
+            await session.send(DISPATCH, chunk, "GUILD_MEMBERS_CHUNK")
+        # presence and voice updates are accepted and ignored
+
+    # REST
+
+    @web.middleware
+    async def _api_middleware(self, request: web.Request, handler: Handler) -> web.StreamResponse:
+        resource = request.match_info.route.resource
+        if resource is None or not resource.canonical.startswith("/api/"):
+            return await handler(request)
+
+        route = resource.canonical.split("}", 1)[1]
+        self.requests[f"{request.method} {route}"] += 1
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, self.random.gauss(self.latency, self.jitter)))
+
+        if request.headers.get("Authorization") != f"Bot {self.token}":
+            return _error(401, 0, "401: Unauthorized")
+
+        major = next((request.match_info[p] for p in MAJOR_PARAMETERS if p in request.match_info), None)
+        try:
+            headers = self.rate_limiter.check(request.method, route, major)
+        except RateLimited as e:
+            self.rate_limited[e.scope] += 1
+            headers = dict(e.headers)
+            headers.update(
+                {
+                    "Retry-After": str(math.ceil(e.retry_after)),
+                    "X-RateLimit-Scope": e.scope,
+                    # discord.py treats a 429 without this header as a cloudflare ban
+                    "Via": "1.1 google",
+                }
+            )
+            body = {
+                "message": "You are being rate limited.",
+                "retry_after": round(e.retry_after, 3),
+                "global": e.scope == "global",
+            }
+            return _json_response(body, status=429, headers=headers)
+
+        try:
+            response = await handler(request)
+        except NotFound as e:
+            return _error(404, e.code, f"Unknown {e.kind}", headers)
+        response.headers.update(headers)
+        return response
+
+    def _add_routes(self) -> None:
+        api = "/api/v{version:\\d+}"
+        self.app.router.add_routes(
+            [
+                web.get("/gateway", self._gateway),
+                web.get(api + "/gateway", self._get_gateway),
+                web.get(api + "/gateway/bot", self._get_gateway),
+                web.get(api + "/users/@me", self._get_me),
+                web.post(api + "/users/@me/channels", self._create_dm),
+                web.get(api + "/users/{user_id}", self._get_user),
+                web.get(api + "/oauth2/applications/@me", self._get_application),
+                web.get(api + "/guilds/{guild_id}", self._get_guild),
+                web.get(api + "/guilds/{guild_id}/members/{user_id}", self._get_member),
+                web.get(api + "/guilds/{guild_id}/audit-logs", self._get_audit_logs),
+                web.get(api + "/guilds/{guild_id}/threads/active", self._get_active_threads),
+                web.get(api + "/channels/{channel_id}", self._get_channel),
+                web.patch(api + "/channels/{channel_id}", self._edit_channel),
+                web.post(api + "/channels/{channel_id}/typing", self._trigger_typing),
+                web.get(api + "/channels/{channel_id}/threads/archived/public", self._get_archived_threads),
+                web.get(api + "/channels/{channel_id}/messages", self._get_messages),
+                web.post(api + "/channels/{channel_id}/messages", self._create_message),
+                web.post(api + "/channels/{channel_id}/messages/bulk-delete", self._bulk_delete_messages),
+                web.get(api + "/channels/{channel_id}/messages/{message_id}", self._get_message),
+                web.patch(api + "/channels/{channel_id}/messages/{message_id}", self._edit_message),
+                web.delete(api + "/channels/{channel_id}/messages/{message_id}", self._delete_message),
+                web.post(api + "/channels/{channel_id}/messages/{message_id}/threads", self._create_thread),
+                web.put(
+                    api + "/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me",
+                    self._add_reaction,
+                ),
+                web.delete(
+                    api + "/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me",
+                    self._remove_reaction,
+                ),
+                web.get(api + "/stickers/{sticker_id}", self._get_sticker),
+                web.post(api + "/interactions/{interaction_id}/{token}/callback", self._interaction_callback),
+                web.get("/_fake/stats", self._control_stats),
+                web.post("/_fake/dm", self._control_dm),
+                web.post("/_fake/messages", self._control_message),
+            ]
+        )
+
+    def _get_channel_payload(self, request: web.Request) -> Payload:
+        try:
+            return self.state.channels[int(request.match_info["channel_id"])]
+        except (KeyError, ValueError):
+            raise NotFound("Channel", 10003) from None
+
+    def _get_message_payload(self, request: web.Request) -> Payload:
+        channel = self._get_channel_payload(request)
+        try:
+            message = self.state.messages[int(request.match_info["message_id"])]
+        except (KeyError, ValueError):
+            raise NotFound("Message", 10008) from None
+        if message["channel_id"] != channel["id"]:
+            raise NotFound("Message", 10008)
+        return message
+
+    def _check_guild(self, request: web.Request) -> None:
+        if request.match_info["guild_id"] != str(self.state.guild_id):
+            raise NotFound("Guild", 10004)
+
+    async def _read_message_body(self, request: web.Request) -> Dict[str, Any]:
+        """Read a json or multipart message body, turning any uploaded files into attachments."""
+        if request.content_type != "multipart/form-data":
+            return await request.json() if request.can_read_body else {}
+
+        form = await request.post()
+        body = json.loads(form.get("payload_json", "{}"))
+        attachments = []
+        for field in form.values():
+            if not isinstance(field, web.FileField):
+                continue
+            size = len(field.file.read())
+            attachment_id = self.state.snowflake()
+            channel_id = request.match_info["channel_id"]
+            url = f"{self.url}/attachments/{channel_id}/{attachment_id}/{field.filename}"
+            attachments.append(
+                {
+                    "id": str(attachment_id),
+                    "filename": field.filename,
+                    "size": size,
+                    "url": url,
+                    "proxy_url": url,
+                    "content_type": field.content_type,
+                }
+            )
+        body["attachments"] = attachments
+        return body
+
+    @staticmethod
+    def _embeds(body: Dict[str, Any]) -> List[Payload]:
+        if body.get("embeds") is not None:
+            return body["embeds"]
+        if body.get("embed") is not None:
+            return [body["embed"]]
+        return []
+
+    async def _get_gateway(self, request: web.Request) -> web.Response:
+        data = {"url": self.gateway_url}
+        if request.path.endswith("/bot"):
+            data["shards"] = 1
+            data["session_start_limit"] = {
+                "total": 1000,
+                "remaining": 1000,
+                "reset_after": 0,
+                "max_concurrency": 1,
+            }
+        return _json_response(data)
+
+    async def _get_me(self, request: web.Request) -> web.Response:
+        return _json_response(self.state.bot_user)
+
+    async def _get_user(self, request: web.Request) -> web.Response:
+        try:
+            return _json_response(self.state.users[int(request.match_info["user_id"])])
+        except (KeyError, ValueError):
+            raise NotFound("User", 10013) from None
+
+    async def _create_dm(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if int(body["recipient_id"]) not in self.state.users:
+            raise NotFound("User", 10013)
+        return _json_response(self.state.get_dm_channel(int(body["recipient_id"])))
+
+    async def _get_application(self, request: web.Request) -> web.Response:
+        bot = self.state.bot_user
+        return _json_response(
+            {
+                "id": bot["id"],
+                "name": bot["username"],
+                "icon": None,
+                "description": "",
+                "rpc_origins": [],
+                "bot_public": False,
+                "bot_require_code_grant": False,
+                "owner": self.state.staff[0],
+                "team": None,
+                "summary": "",
+                "verify_key": "",
+                "flags": 0,
+            }
+        )
+
+    async def _get_guild(self, request: web.Request) -> web.Response:
+        self._check_guild(request)
+        return _json_response(self.state.guild_payload(full=False))
+
+    async def _get_member(self, request: web.Request) -> web.Response:
+        self._check_guild(request)
+        try:
+            return _json_response(self.state.member_payload(int(request.match_info["user_id"])))
+        except (KeyError, ValueError):
+            raise NotFound("Member", 10007) from None
+
+    async def _get_audit_logs(self, request: web.Request) -> web.Response:
+        self._check_guild(request)
+        entries = self.state.audit_log_entries
+        if "action_type" in request.query:
+            entries = [e for e in entries if str(e["action_type"]) == request.query["action_type"]]
+        entries = entries[: int(request.query.get("limit", 50))]
+        users = {e["user_id"] for e in entries}
+        return _json_response(
+            {
+                "audit_log_entries": entries,
+                "users": [user for id, user in self.state.users.items() if str(id) in users],
+                "threads": self.state.threads(archived=False),
+                "webhooks": [],
+                "integrations": [],
+            }
+        )
+
+    async def _get_active_threads(self, request: web.Request) -> web.Response:
+        self._check_guild(request)
+        return _json_response({"threads": self.state.threads(archived=False), "members": []})
+
+    async def _get_channel(self, request: web.Request) -> web.Response:
+        return _json_response(self._get_channel_payload(request))
+
+    async def _edit_channel(self, request: web.Request) -> web.Response:
+        channel = self._get_channel_payload(request)
+        body = await request.json()
+        if channel["type"] == PUBLIC_THREAD:
+            self.state.update_thread(channel, int(self.state.bot_user["id"]), body)
+            await self.dispatch("THREAD_UPDATE", channel)
+        else:
+            channel.update((key, body[key]) for key in ("name", "topic", "position") if key in body)
+            await self.dispatch("CHANNEL_UPDATE", channel)
+        return _json_response(channel)
+
+    async def _trigger_typing(self, request: web.Request) -> web.Response:
+        self._get_channel_payload(request)
+        return web.Response(status=204)
+
+    async def _get_archived_threads(self, request: web.Request) -> web.Response:
+        channel = self._get_channel_payload(request)
+        threads = [t for t in self.state.threads(archived=True) if t["parent_id"] == channel["id"]]
+        threads.sort(key=lambda t: t["thread_metadata"]["archive_timestamp"], reverse=True)
+        if "before" in request.query:
+            before = request.query["before"]
+            threads = [t for t in threads if t["thread_metadata"]["archive_timestamp"] < before]
+        limit = int(request.query.get("limit", 50))
+        has_more = len(threads) > limit
+        return _json_response({"threads": threads[:limit], "members": [], "has_more": has_more})
+
+    async def _get_messages(self, request: web.Request) -> web.Response:
+        channel = self._get_channel_payload(request)
+        messages = [m for m in reversed(self.state.messages.values()) if m["channel_id"] == channel["id"]]
+        if "before" in request.query:
+            messages = [m for m in messages if int(m["id"]) < int(request.query["before"])]
+        if "after" in request.query:
+            messages = [m for m in messages if int(m["id"]) > int(request.query["after"])]
+        return _json_response(messages[: int(request.query.get("limit", 50))])
+
+    async def _create_message(self, request: web.Request) -> web.Response:
+        channel = self._get_channel_payload(request)
+        body = await self._read_message_body(request)
+        message = self.state.create_message(
+            int(channel["id"]),
+            int(self.state.bot_user["id"]),
+            body.get("content"),
+            embeds=self._embeds(body),
+            attachments=body.get("attachments"),
+            sticker_ids=body.get("sticker_ids"),
+            reference=body.get("message_reference"),
+        )
+        await self.dispatch("MESSAGE_CREATE", message)
+        return _json_response(message)
+
+    async def _get_message(self, request: web.Request) -> web.Response:
+        return _json_response(self._get_message_payload(request))
+
+    async def _edit_message(self, request: web.Request) -> web.Response:
+        message = self._get_message_payload(request)
+        if message["author"]["id"] != self.state.bot_user["id"]:
+            return _error(403, 50005, "Cannot edit a message authored by another user")
+        body = await self._read_message_body(request)
+        if "content" in body:
+            message["content"] = body["content"] or ""
+        if "embed" in body or "embeds" in body:
+            message["embeds"] = self._embeds(body)
+        message["edited_timestamp"] = isoformat()
+        await self.dispatch("MESSAGE_UPDATE", message)
+        return _json_response(message)
+
+    async def _delete_message(self, request: web.Request) -> web.Response:
+        message = self._get_message_payload(request)
+        del self.state.messages[int(message["id"])]
+        data = {"id": message["id"], "channel_id": message["channel_id"]}
+        if "guild_id" in message:
+            data["guild_id"] = message["guild_id"]
+        await self.dispatch("MESSAGE_DELETE", data)
+        return web.Response(status=204)
+
+    async def _bulk_delete_messages(self, request: web.Request) -> web.Response:
+        channel = self._get_channel_payload(request)
+        body = await request.json()
+        ids = [id for id in body["messages"] if int(id) in self.state.messages]
+        for id in ids:
+            del self.state.messages[int(id)]
+        data = {"ids": ids, "channel_id": channel["id"]}
+        if "guild_id" in channel:
+            data["guild_id"] = channel["guild_id"]
+        await self.dispatch("MESSAGE_DELETE_BULK", data)
+        return web.Response(status=204)
+
+    async def _create_thread(self, request: web.Request) -> web.Response:
+        message = self._get_message_payload(request)
+        if int(message["id"]) in self.state.channels:
+            return _error(400, 160004, "A thread has already been created for this message")
+        body = await request.json()
+        thread = self.state.create_thread(
+            int(message["channel_id"]),
+            int(message["id"]),
+            body["name"],
+            body.get("auto_archive_duration", 1440),
+        )
+        await self.dispatch("THREAD_CREATE", dict(thread, newly_created=True))
+        return _json_response(thread, status=201)
+
+    async def _reaction_event(self, request: web.Request, event: str) -> web.Response:
+        message = self._get_message_payload(request)
+        name, _, id = urllib.parse.unquote(request.match_info["emoji"]).partition(":")
+        data = {
+            "user_id": self.state.bot_user["id"],
+            "channel_id": message["channel_id"],
+            "message_id": message["id"],
+            "emoji": {"id": id or None, "name": name},
+        }
+        if "guild_id" in message:
+            data["guild_id"] = message["guild_id"]
+        await self.dispatch(event, data)
+        return web.Response(status=204)
+
+    async def _add_reaction(self, request: web.Request) -> web.Response:
+        return await self._reaction_event(request, "MESSAGE_REACTION_ADD")
+
+    async def _remove_reaction(self, request: web.Request) -> web.Response:
+        return await self._reaction_event(request, "MESSAGE_REACTION_REMOVE")
+
+    async def _get_sticker(self, request: web.Request) -> web.Response:
+        try:
+            return _json_response(self.state.stickers[int(request.match_info["sticker_id"])])
+        except (KeyError, ValueError):
+            raise NotFound("Sticker", 10060) from None
+
+    async def _interaction_callback(self, request: web.Request) -> web.Response:
+        return web.Response(status=204)
+
+    # control api for test drivers
+
+    async def _control_stats(self, request: web.Request) -> web.Response:
+        return _json_response(self.stats())
+
+    async def _control_dm(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        user_id = int(body.get("user_id") or self.random.choice(self.state.dm_users)["id"])
+        if user_id not in self.state.users:
+            return _error(404, 10013, "Unknown User")
+        return _json_response(await self.send_dm(user_id, body.get("content", "")))
+
+    async def _control_message(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        author_id = int(body.get("author_id") or self.state.staff[0]["id"])
+        if int(body["channel_id"]) not in self.state.channels or author_id not in self.state.members:
+            return _error(404, 10003, "Unknown Channel")
+        message = await self.send_message(int(body["channel_id"]), author_id, body.get("content", ""))
+        return _json_response(message)
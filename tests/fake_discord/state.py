@@ -0,0 +1,283 @@
+"""
+The objects stored by the fake discord server, and the api payloads built from them.
+
+Only the fields which discord.py reads are filled in, so payloads are far smaller than the real ones.
+"""
+
+import datetime
+import itertools
+import time
+from typing import Any, Dict, List, Optional
+
+
+# discord's epoch, in milliseconds
+DISCORD_EPOCH = 1420070400000
+
+TEXT_CHANNEL = 0
+DM_CHANNEL = 1
+PUBLIC_THREAD = 11
+
+THREAD_UPDATE_ACTION = 111
+
+ALL_PERMISSIONS = str((1 << 41) - 1)
+
+Payload = Dict[str, Any]
+
+
+def isoformat(timestamp: Optional[float] = None) -> str:
+    """Return a timestamp, or the current time, in the format discord uses."""
+    if timestamp is None:
+        timestamp = time.time()
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat()
+
+
+class FakeState:
+    """
+    A single guild, with a relay channel, a bot user, staff members, and users to dm the bot.
+
+    Everything is kept in dictionaries of payloads keyed by id, which are updated in place.
+    """
+
+    def __init__(self, *, staff: int = 1, users: int = 100, max_messages: int = 10_000):
+        self._ids = itertools.count()
+        self.max_messages = max_messages
+
+        self.users: Dict[int, Payload] = {}
+        self.members: Dict[int, Payload] = {}
+        self.channels: Dict[int, Payload] = {}
+        self.dm_channels: Dict[int, int] = {}
+        self.messages: Dict[int, Payload] = {}
+        self.audit_log_entries: List[Payload] = []
+        self.stickers: Dict[int, Payload] = {}
+
+        self.bot_user = self.create_user("modmail", bot=True)
+        self.guild_id = self.snowflake()
+        self.guild = {
+            "id": str(self.guild_id),
+            "name": "fake modmail guild",
+            "owner_id": self.bot_user["id"],
+            "roles": [
+                {"id": str(self.guild_id), "name": "@everyone", "permissions": ALL_PERMISSIONS, "position": 0}
+            ],
+            "emojis": [],
+            "stickers": [],
+            "features": [],
+            "large": False,
+        }
+        self.add_member(self.bot_user)
+        self.staff = [self.add_member(self.create_user(f"staff{i}")) for i in range(staff)]
+        self.dm_users = [self.create_user(f"user{i}") for i in range(users)]
+
+        self.relay_channel = self.create_channel("modmail-relay")
+        sticker = self.create_sticker("wave")
+        self.guild["stickers"].append(sticker)
+
+    def snowflake(self) -> int:
+        """Return a new unique id, with the current time as its timestamp."""
+        return ((int(time.time() * 1000) - DISCORD_EPOCH) << 22) | (next(self._ids) & 0x3FFFFF)
+
+    def create_user(self, name: str, *, bot: bool = False) -> Payload:
+        """Create and return a user."""
+        user = {
+            "id": str(self.snowflake()),
+            "username": name,
+            "discriminator": "0001",
+            "avatar": None,
+            "bot": bot,
+        }
+        self.users[int(user["id"])] = user
+        return user
+
+    def add_member(self, user: Payload) -> Payload:
+        """Add the user to the guild, and return their user payload."""
+        self.members[int(user["id"])] = {
+            "user": user,
+            "roles": [],
+            "joined_at": isoformat(),
+            "deaf": False,
+            "mute": False,
+        }
+        return user
+
+    def create_channel(self, name: str) -> Payload:
+        """Create and return a text channel in the guild."""
+        channel = {
+            "id": str(self.snowflake()),
+            "type": TEXT_CHANNEL,
+            "guild_id": str(self.guild_id),
+            "name": name,
+            "position": len(self.channels),
+            "permission_overwrites": [],
+            "nsfw": False,
+            "parent_id": None,
+            "topic": None,
+            "last_message_id": None,
+            "rate_limit_per_user": 0,
+            "default_auto_archive_duration": 1440,
+        }
+        self.channels[int(channel["id"])] = channel
+        return channel
+
+    def create_sticker(self, name: str) -> Payload:
+        """Create and return a guild sticker."""
+        sticker = {
+            "id": str(self.snowflake()),
+            "name": name,
+            "description": f"a {name} sticker",
+            "tags": name,
+            "type": 2,
+            "format_type": 1,
+            "available": True,
+            "guild_id": str(self.guild_id),
+        }
+        self.stickers[int(sticker["id"])] = sticker
+        return sticker
+
+    def get_dm_channel(self, user_id: int) -> Payload:
+        """Return the dm channel with a user, creating it if it does not exist yet."""
+        if user_id not in self.dm_channels:
+            channel = {
+                "id": str(self.snowflake()),
+                "type": DM_CHANNEL,
+                "recipients": [self.users[user_id]],
+                "last_message_id": None,
+            }
+            self.channels[int(channel["id"])] = channel
+            self.dm_channels[user_id] = int(channel["id"])
+        return self.channels[self.dm_channels[user_id]]
+
+    def create_thread(
+        self, parent_id: int, message_id: int, name: str, auto_archive_duration: int
+    ) -> Payload:
+        """Create and return a public thread started from a message, which shares the message's id."""
+        thread = {
+            "id": str(message_id),
+            "type": PUBLIC_THREAD,
+            "guild_id": str(self.guild_id),
+            "parent_id": str(parent_id),
+            "owner_id": self.bot_user["id"],
+            "name": name,
+            "last_message_id": None,
+            "message_count": 0,
+            "member_count": 1,
+            "rate_limit_per_user": 0,
+            "thread_metadata": {
+                "archived": False,
+                "auto_archive_duration": auto_archive_duration,
+                "archive_timestamp": isoformat(),
+                "locked": False,
+            },
+        }
+        self.channels[message_id] = thread
+        return thread
+
+    def update_thread(self, thread: Payload, user_id: int, changes: Payload) -> None:
+        """Apply changes to a thread, and record them in the audit log."""
+        metadata = thread["thread_metadata"]
+        audit_changes = []
+        for key in ("archived", "locked", "auto_archive_duration"):
+            if key in changes and changes[key] != metadata[key]:
+                audit_changes.append({"key": key, "old_value": metadata[key], "new_value": changes[key]})
+                metadata[key] = changes[key]
+        if "archived" in changes:
+            metadata["archive_timestamp"] = isoformat()
+        if "name" in changes:
+            thread["name"] = changes["name"]
+
+        self.audit_log_entries.insert(
+            0,
+            {
+                "id": str(self.snowflake()),
+                "action_type": THREAD_UPDATE_ACTION,
+                "target_id": thread["id"],
+                "user_id": str(user_id),
+                "changes": audit_changes,
+                "reason": None,
+                "options": None,
+            },
+        )
+        del self.audit_log_entries[100:]
+
+    def threads(self, *, archived: bool) -> List[Payload]:
+        """Return every thread in the guild which is, or is not, archived."""
+        return [
+            channel
+            for channel in self.channels.values()
+            if channel["type"] == PUBLIC_THREAD and channel["thread_metadata"]["archived"] == archived
+        ]
+
+    def create_message(
+        self,
+        channel_id: int,
+        author_id: int,
+        content: str = "",
+        *,
+        embeds: List[Payload] = None,
+        attachments: List[Payload] = None,
+        sticker_ids: List[str] = None,
+        reference: Payload = None,
+    ) -> Payload:
+        """Create a message, and return its payload."""
+        channel = self.channels[channel_id]
+        message = {
+            "id": str(self.snowflake()),
+            "channel_id": str(channel_id),
+            "author": self.users[author_id],
+            "content": content or "",
+            "timestamp": isoformat(),
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": attachments or [],
+            "embeds": embeds or [],
+            "sticker_items": [self.stickers[int(id)] for id in sticker_ids or () if int(id) in self.stickers],
+            "pinned": False,
+            "type": 0,
+            "flags": 0,
+            "components": [],
+        }
+        if "guild_id" in channel:
+            message["guild_id"] = channel["guild_id"]
+            member = self.members[author_id]
+            message["member"] = {key: value for key, value in member.items() if key != "user"}
+        if reference is not None:
+            message["message_reference"] = reference
+
+        channel["last_message_id"] = message["id"]
+        if channel["type"] == PUBLIC_THREAD:
+            channel["message_count"] += 1
+
+        self.messages[int(message["id"])] = message
+        if len(self.messages) > self.max_messages:
+            # forget the oldest message, so long soak tests do not grow without bound
+            del self.messages[next(iter(self.messages))]
+        return message
+
+    def ready_payload(self, session_id: str, gateway_url: str) -> Payload:
+        """Return the payload of the READY gateway event."""
+        return {
+            "v": 9,
+            "user": self.bot_user,
+            "guilds": [{"id": str(self.guild_id), "unavailable": True}],
+            "session_id": session_id,
+            "resume_gateway_url": gateway_url,
+            "application": {"id": self.bot_user["id"], "flags": 0},
+            "private_channels": [],
+            "relationships": [],
+        }
+
+    def guild_payload(self, *, full: bool = True) -> Payload:
+        """Return the guild, including its channels, threads and members if full is True."""
+        guild = dict(self.guild, member_count=len(self.members))
+        if full:
+            guild["unavailable"] = False
+            guild["members"] = list(self.members.values())
+            guild["channels"] = [c for c in self.channels.values() if c["type"] == TEXT_CHANNEL]
+            guild["threads"] = self.threads(archived=False)
+        return guild
+
+    def member_payload(self, user_id: int) -> Payload:
+        """Return a guild member, including their user."""
+        return dict(self.members[user_id], guild_id=str(self.guild_id))
@@ -0,0 +1,35 @@
+import pytest
+
+from modmail.cluster import HashRing
+
+
+KEYS = [(i << 22) | 1 for i in range(2000)]
+
+
+def test_empty_ring():
+    """An empty ring has no owner for any key."""
+    with pytest.raises(LookupError):
+        HashRing().owner(1)
+
+
+def test_distribution():
+    """Every worker owns a share of the keys, and a key always has the same owner."""
+    ring = HashRing(range(4))
+    owners = [ring.owner(key) for key in KEYS]
+    assert owners == [ring.owner(key) for key in KEYS]
+    assert all(300 < owners.count(worker) < 700 for worker in range(4))
+
+
+def test_minimal_movement():
+    """Only the keys of a removed worker move, and they move back once it is added again."""
+    ring = HashRing(range(4))
+    before = {key: ring.owner(key) for key in KEYS}
+
+    ring.remove(2)
+    assert 2 not in ring and len(ring) == 3
+    after = {key: ring.owner(key) for key in KEYS}
+    assert all(after[key] == owner for key, owner in before.items() if owner != 2)
+    assert 2 not in after.values()
+
+    ring.add(2)
+    assert before == {key: ring.owner(key) for key in KEYS}
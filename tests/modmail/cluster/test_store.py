@@ -0,0 +1,40 @@
+import pytest
+
+from modmail.cluster import StoredTicket, TicketStore
+
+
+@pytest.mark.asyncio
+async def test_store_round_trip(tmp_path):
+    """Tickets can be found by their recipient, thread, or dm channel id, until they are removed."""
+    store = TicketStore(tmp_path / "tickets.sqlite3")
+    ticket = StoredTicket(recipient_id=1, dm_channel_id=2, thread_id=3, relay_channel_id=4, log_message_id=3)
+    try:
+        await store.add(ticket)
+        assert ticket == await store.get(1) == await store.get(2) == await store.get(3)
+        assert [ticket] == await store.all()
+
+        # a new ticket for the same recipient replaces the old one
+        newer = StoredTicket(
+            recipient_id=1, dm_channel_id=2, thread_id=5, relay_channel_id=4, log_message_id=5
+        )
+        await store.add(newer)
+        assert [newer] == await store.all()
+
+        await store.remove(5)
+        assert await store.get(1) is None
+    finally:
+        store.close()
+
+
+@pytest.mark.asyncio
+async def test_store_is_shared(tmp_path):
+    """Tickets saved by one store are seen by another store of the same file, as in another worker."""
+    first = TicketStore(tmp_path / "tickets.sqlite3")
+    second = TicketStore(tmp_path / "tickets.sqlite3")
+    ticket = StoredTicket(recipient_id=1, dm_channel_id=2, thread_id=3, relay_channel_id=4, log_message_id=3)
+    try:
+        await first.add(ticket)
+        assert ticket == await second.get(3)
+    finally:
+        first.close()
+        second.close()
@@ -0,0 +1,140 @@
+import asyncio
+import types
+
+import pytest
+
+from modmail.cluster import WorkerCluster, worker, worker_settings
+
+
+def _fake_bot() -> types.SimpleNamespace:
+    """A bot with just enough state for a worker, which records the events it handles."""
+    handled = []
+    parsers = {
+        event: (lambda data, event=event: handled.append((event, data)))
+        for event in ("READY", "GUILD_CREATE", "MESSAGE_CREATE", "PRESENCE_UPDATE")
+    }
+    connected = asyncio.Event()
+
+    async def connect(reconnect: bool = True) -> None:
+        connected.set()
+        await asyncio.Event().wait()
+
+    return types.SimpleNamespace(
+        _connection=types.SimpleNamespace(parsers=parsers, _chunk_guilds=True),
+        handled=handled,
+        connected=connected,
+        connect=connect,
+        is_closed=lambda: False,
+    )
+
+
+async def _wait_for(predicate) -> None:
+    for _ in range(200):
+        if predicate():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Timed out.")
+
+
+def test_routing_key(tmp_path):
+    """Dm events are keyed by their channel, and ticket threads use the key of their dms."""
+    cluster = WorkerCluster(_fake_bot(), 0, 2, tmp_path)
+    cluster._ticket_keys[30] = 20
+
+    assert 20 == cluster.routing_key("MESSAGE_CREATE", {"channel_id": "20"})
+    assert 20 == cluster.routing_key("MESSAGE_CREATE", {"channel_id": "30", "guild_id": "1"})
+    assert 20 == cluster.routing_key("THREAD_UPDATE", {"id": "30", "guild_id": "1"})
+    # messages and interactions outside of tickets are handled by the worker which owns their channel
+    assert 40 == cluster.routing_key("MESSAGE_CREATE", {"channel_id": "40", "guild_id": "1"})
+    assert 40 == cluster.routing_key("INTERACTION_CREATE", {"id": "50", "channel_id": "40", "guild_id": "1"})
+    assert 20 == cluster.routing_key("INTERACTION_CREATE", {"id": "50", "channel_id": "30", "guild_id": "1"})
+    # and everything else is handled by every worker
+    assert cluster.routing_key("THREAD_UPDATE", {"id": "40", "guild_id": "1"}) is None
+    assert cluster.routing_key("GUILD_CREATE", {"id": "1"}) is None
+
+
+def test_worker_settings(monkeypatch):
+    """Several workers are only run on platforms which support them."""
+    monkeypatch.setenv("MODMAIL_WORKERS", "3")
+    monkeypatch.setenv("MODMAIL_WORKER_ID", "2")
+    assert (2, 3) == worker_settings()
+
+    monkeypatch.setattr(worker, "CLUSTER_SUPPORTED", False)
+    assert (None, 1) == worker_settings()
+
+
+def test_owns(tmp_path):
+    """Every key is owned by exactly one of the workers."""
+    clusters = [WorkerCluster(_fake_bot(), worker_id, 3, tmp_path) for worker_id in range(3)]
+    for key in range(100, 200):
+        assert 1 == sum(cluster.owns(key) for cluster in clusters)
+
+
+@pytest.mark.asyncio
+async def test_leader_forwards_events(tmp_path):
+    """One worker becomes the leader, and forwards each ticket's events to the worker which owns it."""
+    leader_bot, follower_bot = _fake_bot(), _fake_bot()
+    leader = WorkerCluster(leader_bot, 0, 2, tmp_path)
+    follower = WorkerCluster(follower_bot, 1, 2, tmp_path)
+
+    tasks = [asyncio.create_task(leader.run())]
+    await leader_bot.connected.wait()
+    parsers = leader_bot._connection.parsers
+    parsers["READY"]({"user": {"id": "1"}})
+
+    tasks.append(asyncio.create_task(follower.run()))
+    try:
+        await _wait_for(lambda: len(leader.ring) == 2)
+        assert leader.is_leader and not follower.is_leader
+        assert not follower_bot._connection._chunk_guilds
+
+        channel_ids = range(100, 120)
+        for channel_id in channel_ids:
+            parsers["MESSAGE_CREATE"]({"channel_id": channel_id})
+        parsers["PRESENCE_UPDATE"]({"user": {"id": "2"}})
+
+        # the follower starts with the leader's snapshot, and then gets the events it owns, and broadcasts
+        owned = [channel_id for channel_id in channel_ids if leader.ring.owner(channel_id) == 1]
+        expected = [
+            ("READY", {"user": {"id": "1"}}),
+            *(("MESSAGE_CREATE", {"channel_id": channel_id}) for channel_id in owned),
+            ("PRESENCE_UPDATE", {"user": {"id": "2"}}),
+        ]
+        await _wait_for(lambda: len(follower_bot.handled) == len(expected))
+        assert expected == follower_bot.handled
+        assert len(leader_bot.handled) == 2 + len(channel_ids) - len(owned)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await follower.close()
+        await leader.close()
+
+
+@pytest.mark.asyncio
+async def test_leader_drops_stalled_follower(tmp_path):
+    """A follower which falls too far behind is dropped, and the leader handles its events instead."""
+    leader_bot, follower_bot = _fake_bot(), _fake_bot()
+    leader = WorkerCluster(leader_bot, 0, 2, tmp_path)
+    follower = WorkerCluster(follower_bot, 1, 2, tmp_path)
+
+    tasks = [asyncio.create_task(leader.run())]
+    await leader_bot.connected.wait()
+    tasks.append(asyncio.create_task(follower.run()))
+    try:
+        await _wait_for(lambda: len(leader.ring) == 2)
+        outbox = leader._followers[1]
+        outbox.max_queued_bytes = 0
+
+        channel_id = next(key for key in range(100, 200) if leader.ring.owner(key) == 1)
+        leader_bot._connection.parsers["MESSAGE_CREATE"]({"channel_id": channel_id})
+
+        assert [("MESSAGE_CREATE", {"channel_id": channel_id})] == leader_bot.handled
+        assert 1 not in leader._followers and len(leader.ring) == 1
+        assert outbox.closed
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await follower.close()
+        await leader.close()
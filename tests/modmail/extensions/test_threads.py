@@ -1,3 +1,4 @@
+import asyncio
 import typing
 import unittest.mock
 from typing import TYPE_CHECKING
@@ -56,15 +57,23 @@ def bot():
     """
     bot: ModmailBot = mocks.MockBot()
     bot._tickets = dict()
+    bot.cluster = None
     return bot
 
 
 @pytest.fixture()
 def cog(bot):
-    """Fixture of a TicketsCog to make testing easier."""
-    cog = threads.TicketsCog(bot)
-    yield cog
-    cog.cog_unload()
+    """
+    Fixture of a TicketsCog to make testing easier.
+
+    Transcripts and the search index are disabled, so tests do not write to the bot directory.
+    """
+    with unittest.mock.patch.object(threads, "SAVE_TRANSCRIPTS", False), unittest.mock.patch.object(
+        threads, "INDEX_MESSAGES", False
+    ):
+        cog = threads.TicketsCog(bot)
+        yield cog
+        cog.cog_unload()
 
 
 class TestUtilityMethods:
@@ -159,6 +168,75 @@ class TestUtilityMethods:
 
         assert str(user) == relayed_msg.create_thread.call_args[1]["name"]
 
+    @pytest.mark.asyncio
+    async def test_pick_relay_channel(self, bot, cog: threads.TicketsCog, ticket: threads.Ticket):
+        """With more than one relay channel, new tickets are placed with the placement policy."""
+        cog.relay_channel = mocks.MockTextChannel()
+        other_channel = mocks.MockTextChannel()
+        cog.relay_channels = thread_utils.RelayChannelPool(
+            [cog.relay_channel.id, other_channel.id], thread_utils.PlacementPolicy.LEAST_LOADED
+        )
+        ticket.relay_channel_id = cog.relay_channel.id
+        await cog.add_ticket(ticket)
+        # tickets rebuilt from ids, which don't know their relay channel, aren't counted
+        await cog.add_ticket(threads.Ticket.from_ids(bot, mocks.generate_realistic_id(), 1234))
+        bot.get_channel = unittest.mock.Mock(return_value=other_channel)
+
+        assert other_channel is await cog.pick_relay_channel(mocks.MockUser())
+        bot.get_channel.assert_called_once_with(other_channel.id)
+
+
+class TestRehydrateTickets:
+    """Test tickets are rebuilt from the relay channel's threads on startup."""
+
+    @pytest.mark.parametrize(
+        ["colour", "should_restore"],
+        [
+            [threads.NO_REPONSE_COLOUR, True],
+            [threads.HAS_RESPONSE_COLOUR, True],
+            [threads.CLOSED_COLOUR, False],
+        ],
+    )
+    @pytest.mark.asyncio
+    async def test_rehydrate_ticket(self, bot, cog: threads.TicketsCog, colour, should_restore: bool):
+        """Open tickets should be restored from their log message, and closed tickets ignored."""
+        recipient = mocks.MockUser()
+        thread = mocks.MockThread()
+        log_message = mocks.MockMessage(
+            embeds=[discord.Embed(title=f"spammer#0001 (`{recipient.id}`)", colour=colour)]
+        )
+        cog.relay_channel = mocks.MockTextChannel()
+        cog.relay_channel.fetch_message = unittest.mock.AsyncMock(return_value=log_message)
+        bot.get_user = unittest.mock.Mock(return_value=recipient)
+
+        with unittest.mock.patch.object(threads, "SAVE_TRANSCRIPTS", False):
+            ticket = await cog._rehydrate_ticket(thread)
+
+        if not should_restore:
+            assert ticket is None
+            assert thread.id not in bot._tickets
+            return
+
+        assert thread is ticket.thread
+        assert recipient is ticket.recipient
+        assert log_message is ticket.log_message
+        assert ticket is bot._tickets[thread.id]
+        assert ticket is bot._tickets[recipient.id]
+        assert recipient.id == cog.dms_to_users[recipient.dm_channel.id]
+
+    @pytest.mark.asyncio
+    async def test_rehydrate_skips_existing_recipient(self, bot, cog: threads.TicketsCog, ticket):
+        """A ticket should not be rebuilt if its recipient already has a ticket."""
+        await cog.add_ticket(ticket)
+        log_message = mocks.MockMessage(
+            embeds=[discord.Embed(title=f"spammer#0001 (`{ticket.recipient.id}`)")]
+        )
+        cog.relay_channel = mocks.MockTextChannel()
+        cog.relay_channel.fetch_message = unittest.mock.AsyncMock(return_value=log_message)
+        bot.get_user = unittest.mock.Mock(return_value=ticket.recipient)
+
+        assert await cog._rehydrate_ticket(mocks.MockThread()) is None
+
 
 @pytest.fixture
 def ctx():
@@ -261,6 +339,31 @@ class TestContactCommand:
             assert str(word) in sent_text
 
 
+class TestSearchCommands:
+    """Test that searches are only limited to a user's tickets when asked to."""
+
+    @pytest.mark.asyncio
+    async def test_search_keeps_whole_query(self, ctx, cog):
+        """The first word of a search is part of the query, even if it names a user."""
+        cog.search_index = unittest.mock.Mock(search=unittest.mock.AsyncMock(return_value=[]))
+        await cog.search(cog, ctx, query="spammer said hello")
+
+        cog.search_index.search.assert_awaited_once_with(
+            "spammer said hello", recipient_id=None, limit=threads.MAX_SEARCH_RESULTS
+        )
+
+    @pytest.mark.asyncio
+    async def test_search_user(self, ctx, cog):
+        """Searching with a user only searches that user's tickets."""
+        user = mocks.MockUser(name="spammer")
+        cog.search_index = unittest.mock.Mock(search=unittest.mock.AsyncMock(return_value=[]))
+        await cog.search_user(cog, ctx, user, query="hello")
+
+        cog.search_index.search.assert_awaited_once_with(
+            "hello", recipient_id=user.id, limit=threads.MAX_SEARCH_RESULTS
+        )
+
+
 class TestRelayMessageToUser:
     """
     Relay a message from guild to user and save it to the ticket.
@@ -306,6 +409,136 @@ class TestRelayMessageToUser:
         ticket.recipient.send.assert_called_once()
         ticket.recipient.send.assert_awaited_once()
 
+    @pytest.mark.asyncio
+    async def test_reply_to_user_sends_concurrently(
+        self,
+        cog: threads.TicketsCog,
+        ticket: threads.Ticket,
+        message: typing.Union[discord.Message, mocks.MockMessage],
+    ):
+        """The thread mirror should be sent while the dm is still being sent."""
+        message.attachments, message.stickers, message.reference = [], [], None
+        dm_sent = asyncio.Event()
+
+        async def send_dm(**kwargs):
+            await asyncio.sleep(0.01)
+            dm_sent.set()
+            return mocks.MockMessage()
+
+        async def send_mirror(**kwargs):
+            assert not dm_sent.is_set()
+            return mocks.MockMessage()
+
+        ticket.recipient.send = unittest.mock.AsyncMock(side_effect=send_dm)
+        ticket.thread.send = unittest.mock.AsyncMock(side_effect=send_mirror)
+
+        sent_message = await cog.relay_message_to_user(ticket, message, "hello")
+
+        message.delete.assert_awaited_once()
+        assert sent_message is ticket.messages[ticket.last_sent_messages.last]
+
+    @pytest.mark.asyncio
+    async def test_reply_to_user_dm_failure(
+        self,
+        cog: threads.TicketsCog,
+        ticket: threads.Ticket,
+        message: typing.Union[discord.Message, mocks.MockMessage],
+    ):
+        """If the user cannot be dmed, the mirror should be removed and the original message kept."""
+        message.attachments, message.stickers, message.reference = [], [], None
+        mirror = mocks.MockMessage()
+        ticket.recipient.send = unittest.mock.AsyncMock(
+            side_effect=discord.Forbidden(unittest.mock.MagicMock(status=403), "Cannot send messages to this user")
+        )
+        ticket.thread.send = unittest.mock.AsyncMock(return_value=mirror)
+
+        with pytest.raises(discord.Forbidden):
+            await cog.relay_message_to_user(ticket, message, "hello")
+
+        mirror.delete.assert_awaited_once()
+        assert mirror.id in cog.thread_deleted_messages
+        message.delete.assert_not_called()
+        assert 0 == len(ticket.last_sent_messages)
+
+    @pytest.mark.asyncio
+    async def test_reply_to_user_mirror_failure(
+        self,
+        cog: threads.TicketsCog,
+        ticket: threads.Ticket,
+        message: typing.Union[discord.Message, mocks.MockMessage],
+    ):
+        """If the reply cannot be mirrored to the thread, the original message should be kept."""
+        message.attachments, message.stickers, message.reference = [], [], None
+        ticket.thread.send = unittest.mock.AsyncMock(
+            side_effect=discord.HTTPException(unittest.mock.MagicMock(status=500), "Internal error")
+        )
+
+        with pytest.raises(discord.HTTPException):
+            await cog.relay_message_to_user(ticket, message, "hello")
+
+        ticket.recipient.send.assert_awaited_once()
+        message.delete.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_reply_to_user_cleanup_failure(
+        self,
+        cog: threads.TicketsCog,
+        ticket: threads.Ticket,
+        message: typing.Union[discord.Message, mocks.MockMessage],
+    ):
+        """A failure to remove the mirror should not hide why the user could not be sent the reply."""
+        message.attachments, message.stickers, message.reference = [], [], None
+        mirror = mocks.MockMessage()
+        mirror.delete = unittest.mock.AsyncMock(
+            side_effect=discord.NotFound(unittest.mock.MagicMock(status=404), "Unknown Message")
+        )
+        forbidden = discord.Forbidden(unittest.mock.MagicMock(status=403), "Cannot send messages")
+        ticket.recipient.send = unittest.mock.AsyncMock(side_effect=forbidden)
+        ticket.thread.send = unittest.mock.AsyncMock(return_value=mirror)
+
+        with pytest.raises(discord.Forbidden):
+            await cog.relay_message_to_user(ticket, message, "hello")
+        mirror.delete.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("too_large", [False, True])
+    async def test_reply_to_user_reuploads_attachments(
+        self,
+        cog: threads.TicketsCog,
+        ticket: threads.Ticket,
+        message: typing.Union[discord.Message, mocks.MockMessage],
+        tmp_path,
+        too_large: bool,
+    ):
+        """Cached attachments are uploaded to both the dm and the thread, so the reply can be deleted."""
+        attachment = mocks.MockAttachment(filename="notes.txt", url="https://cdn.invalid/notes.txt")
+        attachment.is_spoiler.return_value = False
+        message.attachments, message.stickers, message.reference = [attachment], [], None
+        cached = tmp_path / "notes"
+        cached.write_bytes(b"notes")
+        cog.attachment_cache = unittest.mock.Mock(
+            fetch=unittest.mock.AsyncMock(
+                side_effect=thread_utils.AttachmentTooLargeError() if too_large else None,
+                return_value=cached,
+            )
+        )
+
+        await cog.relay_message_to_user(ticket, message, "hello")
+
+        cog.attachment_cache.fetch.assert_awaited_once_with(attachment, max_size=threads.MAX_REUPLOAD_SIZE)
+        dm_files = ticket.recipient.send.call_args.kwargs["files"]
+        thread_files = ticket.thread.send.call_args.kwargs["files"]
+        if too_large:
+            assert dm_files is None and thread_files is None
+            message.delete.assert_not_called()
+            cog.attachment_cache.release.assert_not_called()
+        else:
+            assert ["notes.txt"] == [f.filename for f in dm_files] == [f.filename for f in thread_files]
+            assert dm_files[0] is not thread_files[0]
+            message.delete.assert_awaited_once()
+            # the cached copy can be evicted once it has been uploaded
+            cog.attachment_cache.release.assert_called_once_with(cached)
+
 
 class TestRelayMessageToGuild:
     """
@@ -335,6 +568,63 @@ class TestReplyCommand:
     ...
 
 
+class TestOnBulkMessageDelete:
+    """Purging messages in a thread should delete the bot's dms, a few at a time."""
+
+    @staticmethod
+    def _purge(bot, cog: threads.TicketsCog, ticket: threads.Ticket, count: int):
+        thread_messages = [mocks.MockMessage(guild=ticket.thread.guild) for _ in range(count)]
+        dm_messages = [mocks.MockMessage(author=bot.user, guild=None) for _ in range(count)]
+        for thread_message, dm_message in zip(thread_messages, dm_messages):
+            ticket.messages[thread_message] = dm_message
+        cog.bot._tickets[ticket.thread.id] = ticket
+        payload = discord.RawBulkMessageDeleteEvent(
+            {"ids": [m.id for m in thread_messages], "channel_id": ticket.thread.id, "guild_id": GUILD_ID}
+        )
+        return payload, thread_messages, dm_messages
+
+    @pytest.mark.asyncio
+    async def test_purge_is_mirrored(self, bot, cog: threads.TicketsCog, ticket: threads.Ticket):
+        """Only the bot's relayed messages are deleted, and never more at once than the limit."""
+        payload, thread_messages, dm_messages = self._purge(bot, cog, ticket, 10)
+        # deleted with a command, so the dm is already gone
+        cog.thread_deleted_messages.add(thread_messages[0].id)
+        # a relayed dm from the user, which the bot can't delete
+        dm_messages[1].author = ticket.recipient
+
+        running, most_running = 0, 0
+
+        async def delete():
+            nonlocal running, most_running
+            running += 1
+            most_running = max(most_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        for dm_message in dm_messages:
+            dm_message.delete = unittest.mock.AsyncMock(side_effect=delete)
+
+        await cog.on_thread_bulk_message_delete(payload)
+
+        assert [m.delete.await_count for m in dm_messages] == [0, 0] + [1] * 8
+        assert most_running == threads.MAX_CONCURRENT_MIRRORED_DELETES
+        assert {m.id for m in dm_messages[2:]} == cog.dm_deleted_messages
+        assert not cog.thread_deleted_messages
+
+    @pytest.mark.asyncio
+    async def test_purge_stops_when_blocked(self, bot, cog: threads.TicketsCog, ticket: threads.Ticket):
+        """Once a delete is forbidden, the rest of the ticket's deletes are not attempted."""
+        payload, _, dm_messages = self._purge(bot, cog, ticket, 10)
+        for dm_message in dm_messages:
+            dm_message.delete = unittest.mock.AsyncMock(
+                side_effect=discord.Forbidden(unittest.mock.MagicMock(status=403), "Cannot delete")
+            )
+
+        assert 0 == await cog.delete_mirrored_messages(dm_messages)
+        assert sum(m.delete.await_count for m in dm_messages) <= threads.MAX_CONCURRENT_MIRRORED_DELETES
+        assert not cog.dm_deleted_messages
+
+
 # class TestEditCommand:
 #     ...
 # class TestDeleteCommand:
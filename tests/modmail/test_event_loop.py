@@ -0,0 +1,39 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+from modmail import set_event_loop_policy
+
+
+@pytest.fixture(autouse=True)
+def reset_policy():
+    """Restore the event loop policy after each test."""
+    policy = asyncio.get_event_loop_policy()
+    yield
+    asyncio.set_event_loop_policy(policy)
+
+
+def test_asyncio_policy():
+    """The asyncio event loop is used by default, keeping an existing policy except on windows."""
+    existing = asyncio.DefaultEventLoopPolicy()
+    asyncio.set_event_loop_policy(existing)
+    assert set_event_loop_policy("asyncio") == "asyncio"
+    if os.name == "nt":
+        assert type(asyncio.get_event_loop_policy()) is asyncio.WindowsSelectorEventLoopPolicy
+    else:
+        assert asyncio.get_event_loop_policy() is existing
+
+
+def test_uvloop_fallback(monkeypatch):
+    """If uvloop is not installed, asyncio's event loop is used instead."""
+    monkeypatch.setitem(sys.modules, "uvloop", None)
+    assert set_event_loop_policy("uvloop") == "asyncio"
+
+
+def test_uvloop_policy():
+    """uvloop's policy is used when it is requested and installed."""
+    uvloop = pytest.importorskip("uvloop")
+    assert set_event_loop_policy("uvloop") == "uvloop"
+    assert isinstance(asyncio.get_event_loop_policy(), uvloop.EventLoopPolicy)
@@ -1,10 +1,21 @@
 import contextlib
+import gzip
 import io
+import json
 import logging
+import unittest.mock
 
 import pytest
 
-from modmail.log import ModmailLogger
+from modmail.log import (
+    CompressingRotatingFileHandler,
+    ContextFilter,
+    JSONFormatter,
+    ModmailLogger,
+    RateLimitFilter,
+    get_log_context,
+    log_context,
+)
 
 
 """
@@ -59,3 +70,179 @@ def test_trace_level(log: ModmailLogger) -> None:
 
     assert "TRACE" in resp
     assert trace_test_phrase in resp
+
+
+def test_log_context_nesting() -> None:
+    """Nested log contexts should merge their fields, and be reset when exited."""
+    assert {} == get_log_context()
+    with log_context(ticket_id=1, relay_id=2):
+        with log_context(relay_id=3) as context:
+            assert {"ticket_id": 1, "relay_id": 3} == context
+        assert {"ticket_id": 1, "relay_id": 2} == get_log_context()
+    assert {} == get_log_context()
+
+
+def test_json_formatter_includes_context() -> None:
+    """Records should be formatted as a single line of json with the log context as top level keys."""
+    record = logging.LogRecord("modmail.test", logging.INFO, __file__, 10, "relayed %s", ("message",), None)
+    with log_context(thread_id=4, relay_id=5):
+        ContextFilter().filter(record)
+
+    formatted = JSONFormatter().format(record)
+    assert "\n" not in formatted
+
+    data = json.loads(formatted)
+    assert "relayed message" == data["message"]
+    assert "INFO" == data["level"]
+    assert "modmail.test" == data["logger"]
+    assert 4 == data["thread_id"]
+    assert 5 == data["relay_id"]
+
+
+def _make_record(message: str) -> logging.LogRecord:
+    return logging.LogRecord("modmail.test", logging.INFO, __file__, 10, message, None, None)
+
+
+def test_rotating_handler_compresses_on_size(tmp_path) -> None:
+    """Rolled over log files should be compressed by the background worker."""
+    log_file = tmp_path / "bot.log"
+    handler = CompressingRotatingFileHandler(log_file, max_bytes=64, compression="gzip")
+    try:
+        for i in range(4):
+            handler.emit(_make_record(f"line {i} " + "x" * 64))
+    finally:
+        handler.close()
+
+    archives = sorted(tmp_path.glob("bot.log.*"))
+    assert archives
+    assert all(path.suffix == ".gz" for path in archives)
+
+    contents = "".join(gzip.decompress(path.read_bytes()).decode() for path in archives)
+    assert "line 0" in contents
+    assert "line 3" in log_file.read_text()
+
+
+def test_rotating_handler_disk_budget(tmp_path) -> None:
+    """The oldest archives should be deleted once the budget has been exceeded."""
+    log_file = tmp_path / "bot.log"
+    handler = CompressingRotatingFileHandler(log_file, max_bytes=64, disk_budget=200, compression="none")
+    try:
+        for i in range(20):
+            handler.emit(_make_record(f"line {i} " + "x" * 64))
+    finally:
+        handler.close()
+
+    total = sum(path.stat().st_size for path in tmp_path.iterdir())
+    assert total <= 200
+    assert "line 19" in log_file.read_text()
+
+
+def test_rate_limit_filter_summarises_suppressed_records() -> None:
+    """Records over the rate should be dropped, and counted in a summary once the window resets."""
+    logger = logging.getLogger("modmail.test.ratelimit")
+    logger.propagate = False
+    handler = unittest.mock.Mock(spec=logging.Handler, level=logging.NOTSET)
+    logger.addHandler(handler)
+    rate_filter = RateLimitFilter(rate=2, per=60)
+    logger.addFilter(rate_filter)
+
+    try:
+        with unittest.mock.patch("modmail.log.time.monotonic", return_value=0):
+            for i in range(5):
+                logger.info("edited message %s", i)
+            # different call sites are limited separately
+            logger.info("deleted message %s", 1)
+        assert 3 == handler.handle.call_count
+
+        handler.reset_mock()
+        with unittest.mock.patch("modmail.log.time.monotonic", return_value=61):
+            logger.info("edited message %s", 6)
+
+        summary, record = (call.args[0] for call in handler.handle.call_args_list)
+        assert "Suppressed 3 similar records" in summary.getMessage()
+        assert "edited message 6" == record.getMessage()
+    finally:
+        rate_filter.close()
+        logger.removeFilter(rate_filter)
+        logger.removeHandler(handler)
+        logger.propagate = True
+
+
+def test_rate_limit_filter_summarises_quiet_call_sites() -> None:
+    """Call sites which stop logging still have their suppressed records summarised, and when closed."""
+    logger = logging.getLogger("modmail.test.ratelimit.quiet")
+    logger.propagate = False
+    handler = unittest.mock.Mock(spec=logging.Handler, level=logging.NOTSET)
+    logger.addHandler(handler)
+    rate_filter = RateLimitFilter(rate=1, per=60)
+    logger.addFilter(rate_filter)
+
+    try:
+        with unittest.mock.patch("modmail.log.time.monotonic", return_value=0):
+            for i in range(3):
+                logger.info("edited message %s", i)
+                logger.info("deleted message %s", i)
+            rate_filter.flush()
+        assert 2 == handler.handle.call_count
+
+        handler.reset_mock()
+        with unittest.mock.patch("modmail.log.time.monotonic", return_value=61):
+            rate_filter.flush()
+        summaries = [call.args[0].getMessage() for call in handler.handle.call_args_list]
+        assert 2 == len(summaries)
+        assert all("Suppressed 2 similar records" in summary for summary in summaries)
+
+        handler.reset_mock()
+        with unittest.mock.patch("modmail.log.time.monotonic", return_value=62):
+            logger.info("edited message %s", 4)
+            logger.info("edited message %s", 5)
+            rate_filter.close()
+        record, summary = (call.args[0] for call in handler.handle.call_args_list)
+        assert "edited message 4" == record.getMessage()
+        assert "Suppressed 1 similar records" in summary.getMessage()
+    finally:
+        rate_filter.close()
+        logger.removeFilter(rate_filter)
+        logger.removeHandler(handler)
+        logger.propagate = True
+
+
+def test_rate_limit_filter_summarises_evicted_groups() -> None:
+    """A group evicted to make room for another has its suppressed records summarised first."""
+    logger = logging.getLogger("modmail.test.ratelimit.evicted")
+    logger.propagate = False
+    handler = unittest.mock.Mock(spec=logging.Handler, level=logging.NOTSET)
+    logger.addHandler(handler)
+    rate_filter = RateLimitFilter(rate=1, per=60)
+    rate_filter.MAX_GROUPS = 1
+    logger.addFilter(rate_filter)
+
+    try:
+        with unittest.mock.patch("modmail.log.time.monotonic", return_value=0):
+            for i in range(3):
+                logger.info("edited message %s", i)
+            logger.info("deleted message %s", 0)
+        summary, record = (call.args[0] for call in handler.handle.call_args_list[1:])
+        assert "Suppressed 2 similar records" in summary.getMessage()
+        assert "edited message" in summary.getMessage()
+        assert "deleted message 0" == record.getMessage()
+    finally:
+        rate_filter.close()
+        logger.removeFilter(rate_filter)
+        logger.removeHandler(handler)
+        logger.propagate = True
+
+
+def test_sample_filter() -> None:
+    """A sample rate of zero should drop every record, and one should keep every record."""
+    record = _make_record("typing")
+    assert RateLimitFilter(sample_rate=1).filter(record)
+
+    drop = RateLimitFilter(sample_rate=0)
+    with unittest.mock.patch.object(RateLimitFilter, "_emit") as emit:
+        try:
+            assert not drop.filter(record)
+        finally:
+            drop.close()
+    # the dropped record is summarised when the filter is closed
+    emit.assert_called_once()
@@ -0,0 +1,110 @@
+import aiohttp
+import pytest
+
+from modmail import metrics
+
+
+@pytest.fixture
+def registry() -> metrics.Registry:
+    """An empty registry, so tests don't affect the bot's metrics."""
+    return metrics.Registry()
+
+
+def test_counter(registry):
+    """Counters render with their help, type, and labels."""
+    counter = metrics.Counter("relays_total", "Relayed messages.", ("direction",), registry=registry)
+    counter.labels("to_user").inc()
+    counter.labels("to_user").inc(2)
+    counter.labels('a "quoted"\nvalue').inc()
+
+    assert registry.render().splitlines() == [
+        "# HELP relays_total Relayed messages.",
+        "# TYPE relays_total counter",
+        'relays_total{direction="to_user"} 3.0',
+        'relays_total{direction="a \\"quoted\\"\\nvalue"} 1.0',
+    ]
+
+
+def test_counter_cannot_decrease(registry):
+    """Counters only go up."""
+    counter = metrics.Counter("errors_total", "Errors.", registry=registry)
+    with pytest.raises(ValueError):
+        counter.inc(-1)
+
+
+def test_wrong_label_count(registry):
+    """Every label must be provided."""
+    counter = metrics.Counter(
+        "relays_total", "Relayed messages.", ("direction", "outcome"), registry=registry
+    )
+    with pytest.raises(ValueError):
+        counter.labels("to_user")
+
+
+def test_duplicate_names(registry):
+    """Metric names are unique within a registry."""
+    metrics.Gauge("open", "Open tickets.", registry=registry)
+    with pytest.raises(ValueError):
+        metrics.Gauge("open", "Open tickets.", registry=registry)
+
+
+def test_gauge_function(registry):
+    """Gauges can be read from a function when they are rendered."""
+    tickets = {1: object()}
+    gauge = metrics.Gauge("open_tickets", "Open tickets.", registry=registry)
+    gauge.set_function(lambda: len(tickets))
+    tickets[2] = object()
+
+    assert "open_tickets 2.0" in registry.render().splitlines()
+
+
+def test_histogram(registry):
+    """Histogram buckets are cumulative, and include +Inf."""
+    histogram = metrics.Histogram("latency_seconds", "Latency.", buckets=(0.1, 1), registry=registry)
+    for value in (0.05, 0.1, 0.5, 5):
+        histogram.observe(value)
+
+    assert registry.render().splitlines()[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1.0"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 5.65",
+        "latency_seconds_count 4",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_metrics_server(registry):
+    """The metrics server serves the registry in the Prometheus text format."""
+    metrics.Counter("relays_total", "Relayed messages.", registry=registry).inc()
+    server = metrics.MetricsServer("127.0.0.1", 0, registry=registry)
+    await server.start()
+    try:
+        host, port = server.addresses[0][:2]
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://{host}:{port}/metrics") as resp:
+                assert resp.headers["Content-Type"] == metrics.CONTENT_TYPE
+                assert "relays_total 1.0" in (await resp.text()).splitlines()
+    finally:
+        await server.close()
+
+
+@pytest.mark.asyncio
+async def test_connection_trace_config(registry):
+    """New and reused connections are counted separately for each pool."""
+    server = metrics.MetricsServer("127.0.0.1", 0, registry=registry)
+    await server.start()
+    pool = "test_connection_trace_config"
+    try:
+        host, port = server.addresses[0][:2]
+        connector = aiohttp.TCPConnector(limit=1)
+        trace_configs = [metrics.connection_trace_config(pool)]
+        async with aiohttp.ClientSession(connector=connector, trace_configs=trace_configs) as session:
+            for _ in range(3):
+                async with session.get(f"http://{host}:{port}/metrics") as resp:
+                    await resp.read()
+    finally:
+        await server.close()
+
+    assert metrics.HTTP_CONNECTIONS.labels(pool, "new").value == 1
+    assert metrics.HTTP_CONNECTIONS.labels(pool, "reused").value == 2
@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+import pytest
+
+from modmail.monitor import LoopMonitor
+
+
+def _block(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_slow_callback_stack():
+    """Blocking the loop for longer than the threshold captures what was blocking it."""
+    monitor = LoopMonitor(interval=0.01, threshold=0.1)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        _block(0.3)
+        # let the monitor notice that the loop is running again
+        await asyncio.sleep(0.05)
+    finally:
+        monitor.stop()
+
+    assert len(monitor.slow_callbacks) == 1
+    record = monitor.slow_callbacks[0]
+    assert record.finished
+    assert record.duration >= 0.25
+    assert any("_block" in line for line in record.stack)
+    assert monitor.max_lag >= 0.25
+
+
+@pytest.mark.asyncio
+async def test_no_slow_callbacks():
+    """An idle loop is not reported as blocked."""
+    monitor = LoopMonitor(interval=0.01, threshold=0.1)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.3)
+    finally:
+        monitor.stop()
+
+    assert not monitor.slow_callbacks
+    assert monitor.max_lag < 0.1
@@ -0,0 +1,51 @@
+import types
+
+import pytest
+
+from modmail.router import MessageRouter, Route
+
+
+BOT_ID = 1234
+
+
+@pytest.fixture
+def router() -> MessageRouter:
+    """A router of a bot with the `?` prefix, which also responds to mentions."""
+    bot_config = types.SimpleNamespace(prefix="?", prefix_when_mentioned=True)
+    bot = types.SimpleNamespace(
+        config=types.SimpleNamespace(user=types.SimpleNamespace(bot=bot_config)),
+        user=types.SimpleNamespace(id=BOT_ID),
+    )
+    return MessageRouter(bot)
+
+
+def _message(content: str, *, guild: bool = False, author_id: int = 1, bot: bool = False):
+    author = types.SimpleNamespace(id=author_id, bot=bot)
+    return types.SimpleNamespace(content=content, guild=object() if guild else None, author=author)
+
+
+@pytest.mark.parametrize(
+    ["message", "route"],
+    [
+        (_message("hello"), Route.DM_RELAY),
+        (_message("?help"), Route.DM_RELAY | Route.COMMAND),
+        (_message("?reply hi", guild=True), Route.COMMAND),
+        (_message(f"<@!{BOT_ID}> reply hi", guild=True), Route.COMMAND),
+        (_message(f"<@{BOT_ID}>", guild=True), Route.IGNORE),
+        (_message("hello", guild=True), Route.IGNORE),
+        (_message("?help", guild=True, bot=True), Route.IGNORE),
+        (_message("sent by the bot", author_id=BOT_ID, bot=True), Route.IGNORE),
+    ],
+)
+def test_classify(router: MessageRouter, message, route: Route):
+    """Dms are relayed, and only messages starting with a prefix are commands."""
+    assert route == router.classify(message)
+
+
+def test_prefix_change(router: MessageRouter):
+    """The matcher is rebuilt when the configured prefix changes."""
+    assert router.is_command("?help")
+    router.bot.config.user.bot.prefix = "!"
+    assert not router.is_command("?help")
+    assert router.is_command("!help")
+    assert "!" == router.prefixes[-1]
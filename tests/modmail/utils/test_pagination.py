@@ -1,6 +1,13 @@
 import pytest
 
-from modmail.utils.pagination import ButtonPaginator
+from modmail.errors import InvalidArgumentError
+from modmail.utils.pagination import (
+    ButtonPaginator,
+    LinePageSource,
+    ListPageSource,
+    PaginatorState,
+    StatelessPaginator,
+)
 
 
 @pytest.mark.asyncio
@@ -9,3 +16,87 @@ async def test_paginator_init() -> None:
     content = ["content"]
     paginator = ButtonPaginator(content, prefix="", suffix="", linesep="")
     assert paginator.pages == content
+
+
+@pytest.mark.asyncio
+async def test_line_page_source_is_lazy() -> None:
+    """Lines are only read up to the requested page, and the total is known once they run out."""
+    read = []
+
+    def lines():
+        for i in range(10):
+            read.append(i)
+            yield f"line {i}"
+
+    source = LinePageSource(lines, prefix="", suffix="", max_size=16, linesep="\n")
+    assert "\nline 0\nline 1\n" == await source.get_page(0)
+    assert read == [0, 1, 2]
+    assert source.total is None
+
+    assert not await source.has_page(5)
+    assert 5 == source.total
+    assert "\nline 8\nline 9\n" == await source.get_page(4)
+
+
+@pytest.mark.asyncio
+async def test_line_page_source_window() -> None:
+    """Pages outside of the cached window are rendered again, unless the lines can't be read again."""
+    source = LinePageSource(
+        lambda: (str(i) for i in range(10)), prefix="", suffix="", max_size=4, max_cached_pages=2
+    )
+    assert "\n9\n" == await source.get_page(9)
+    assert "\n0\n" == await source.get_page(0)
+    assert 0 == source.first_index
+
+    async def lines():
+        for i in range(10):
+            yield str(i)
+
+    source = LinePageSource(lines(), prefix="", suffix="", max_size=4, max_cached_pages=2)
+    assert "\n9\n" == await source.get_page(9)
+    assert 8 == source.first_index
+    with pytest.raises(IndexError):
+        await source.get_page(0)
+
+
+@pytest.mark.asyncio
+async def test_unknown_total() -> None:
+    """Until the number of pages is known, it is shown as a question mark, and jump to last is disabled."""
+    paginator = ButtonPaginator(iter(["a" * 10] * 10), prefix="", suffix="", max_size=20)
+    await paginator.load_page()
+    paginator.update_states()
+
+    assert paginator.embed.footer.text == "Page 1/?"
+    states = {child.custom_id: child.disabled for child in paginator.children}
+    assert states["pag_next"] is False
+    assert states["pag_jump_last"] is True
+
+
+def test_paginator_state_custom_id() -> None:
+    """Paginator state survives a round trip through a custom id, and other custom ids are ignored."""
+    state = PaginatorState("next", 3, 1234, "search", "some:key")
+    assert state == PaginatorState.from_custom_id(state.to_custom_id())
+    assert PaginatorState.from_custom_id("pag_next") is None
+    assert PaginatorState.from_custom_id("spag:next:three:0:search:") is None
+
+    with pytest.raises(InvalidArgumentError):
+        state._replace(key="k" * 100).to_custom_id()
+
+
+@pytest.mark.asyncio
+async def test_stateless_render() -> None:
+    """The buttons of a stateless paginator store the page they move to."""
+    source = ListPageSource(["one", "two", "three"])
+    embed, view = await StatelessPaginator.render(source, PaginatorState("next", 1, 0, "test", ""))
+
+    assert "two" == embed.description
+    assert "Page 2/3" == embed.footer.text
+    buttons = {PaginatorState.from_custom_id(child.custom_id).action: child for child in view.children}
+    assert {"first": 0, "prev": 0, "next": 2, "last": 2, "stop": 1} == {
+        action: PaginatorState.from_custom_id(button.custom_id).index for action, button in buttons.items()
+    }
+    assert not any(button.disabled for button in buttons.values())
+
+    # a single page doesn't need any buttons
+    state = PaginatorState("first", 0, 0, "test", "")
+    assert (await StatelessPaginator.render(ListPageSource(["one"]), state))[1] is None
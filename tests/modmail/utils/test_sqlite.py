@@ -0,0 +1,27 @@
+import sqlite3
+
+import pytest
+
+from modmail.utils.sqlite import BackgroundDatabase
+
+
+@pytest.mark.asyncio
+async def test_background_database(tmp_path):
+    """Calls run on the database thread in the order they were queued, with the connection."""
+    database = BackgroundDatabase(
+        tmp_path / "nested" / "test.sqlite3", "CREATE TABLE IF NOT EXISTS numbers (n)", thread_name="test"
+    )
+
+    def insert(connection: sqlite3.Connection, n: int) -> None:
+        with connection:
+            connection.execute("INSERT INTO numbers VALUES (?)", (n,))
+
+    def select(connection: sqlite3.Connection) -> list:
+        return [n for n, in connection.execute("SELECT n FROM numbers")]
+
+    try:
+        for n in range(5):
+            database.submit(insert, n)
+        assert [0, 1, 2, 3, 4] == await database.run(select)
+    finally:
+        database.close()
@@ -0,0 +1,154 @@
+import asyncio
+import pathlib
+import types
+
+import aiohttp.web
+import pytest
+
+from modmail.utils.threads import AttachmentCache, AttachmentTooLargeError, attachments
+
+
+@pytest.fixture
+async def files_server():
+    """A web server which serves the bytes in its `files` dict, and counts the requests for each."""
+    files = {}
+    requests = {}
+
+    async def serve(request: aiohttp.web.Request) -> aiohttp.web.Response:
+        name = request.match_info["name"]
+        requests[name] = requests.get(name, 0) + 1
+        # yield so concurrent fetches of the same file overlap
+        await asyncio.sleep(0.01)
+        return aiohttp.web.Response(body=files[name])
+
+    app = aiohttp.web.Application()
+    app.router.add_get("/{name}", serve)
+    runner = aiohttp.web.AppRunner(app)
+    await runner.setup()
+    site = aiohttp.web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    yield types.SimpleNamespace(url=f"http://{host}:{port}", files=files, requests=requests)
+    await runner.cleanup()
+
+
+@pytest.fixture
+async def session():
+    """A client session for downloading attachments."""
+    async with aiohttp.ClientSession() as session:
+        yield session
+
+
+async def _drain_disk_thread() -> None:
+    """Wait for the disk work the cache has queued, such as deleting evicted files."""
+    await asyncio.get_running_loop().run_in_executor(attachments._executor, lambda: None)
+
+
+def _attachment(server: types.SimpleNamespace, id: int, name: str) -> types.SimpleNamespace:
+    return types.SimpleNamespace(
+        id=id, url=f"{server.url}/{name}", size=len(server.files[name]), filename=name
+    )
+
+
+@pytest.mark.asyncio
+async def test_downloads_once(files_server, session, tmp_path):
+    """Fetching the same attachment concurrently, or again later, only downloads it once."""
+    files_server.files["a.txt"] = b"a" * 200_000
+    cache = AttachmentCache(session, tmp_path)
+    attachment = _attachment(files_server, 1, "a.txt")
+
+    first, second = await asyncio.gather(
+        cache.fetch(attachment, max_size=1_000_000), cache.fetch(attachment, max_size=1_000_000)
+    )
+    third = await cache.fetch(attachment, max_size=1_000_000)
+
+    assert first == second == third
+    assert first.read_bytes() == files_server.files["a.txt"]
+    assert files_server.requests == {"a.txt": 1}
+
+
+@pytest.mark.asyncio
+async def test_content_addressed(files_server, session, tmp_path):
+    """Different attachments with identical contents are stored once."""
+    files_server.files["a.txt"] = files_server.files["b.txt"] = b"same"
+    cache = AttachmentCache(session, tmp_path)
+
+    first = await cache.fetch(_attachment(files_server, 1, "a.txt"), max_size=100)
+    second = await cache.fetch(_attachment(files_server, 2, "b.txt"), max_size=100)
+
+    assert first == second
+    assert [first] == [path for path in tmp_path.rglob("*") if path.is_file()]
+
+
+@pytest.mark.asyncio
+async def test_too_large(files_server, session, tmp_path):
+    """Attachments over the size limit are not downloaded, and nothing is left behind."""
+    files_server.files["a.txt"] = b"a" * 100
+    cache = AttachmentCache(session, tmp_path)
+    attachment = _attachment(files_server, 1, "a.txt")
+
+    with pytest.raises(AttachmentTooLargeError):
+        await cache.fetch(attachment, max_size=50)
+    assert not files_server.requests
+
+    # the reported size can be wrong, so the limit is enforced while streaming too
+    attachment.size = 10
+    with pytest.raises(AttachmentTooLargeError):
+        await cache.fetch(attachment, max_size=50)
+    assert not [path for path in tmp_path.rglob("*") if path.is_file()]
+
+
+@pytest.mark.asyncio
+async def test_evicts_least_recently_used(files_server, session, tmp_path):
+    """Once the cache is full, the least recently used files are deleted."""
+    for name in ("a", "b", "c"):
+        files_server.files[name] = name.encode() * 100
+    cache = AttachmentCache(session, tmp_path, max_size=250)
+
+    async def fetch(id: int, name: str) -> pathlib.Path:
+        path = await cache.fetch(_attachment(files_server, id, name), max_size=100)
+        cache.release(path)
+        return path
+
+    a = await fetch(1, "a")
+    b = await fetch(2, "b")
+    await fetch(1, "a")
+    c = await fetch(3, "c")
+    await _drain_disk_thread()
+
+    assert a.exists() and c.exists()
+    assert not b.exists()
+
+
+@pytest.mark.asyncio
+async def test_reuses_files_from_previous_run(files_server, session, tmp_path):
+    """Files cached by a previous run are reused, and its unfinished downloads are deleted."""
+    files_server.files["a.txt"] = b"a" * 100
+    attachment = _attachment(files_server, 1, "a.txt")
+    first = await AttachmentCache(session, tmp_path).fetch(attachment, max_size=100)
+    unfinished = tmp_path / ".unfinished"
+    unfinished.write_bytes(b"a")
+
+    cache = AttachmentCache(session, tmp_path)
+    second = await cache.fetch(_attachment(files_server, 2, "a.txt"), max_size=100)
+
+    assert first == second
+    assert not unfinished.exists()
+    assert 100 == cache._size
+
+
+@pytest.mark.asyncio
+async def test_pinned_files_are_not_evicted(files_server, session, tmp_path):
+    """Files which have been fetched but not released yet are kept, even if the cache is full."""
+    for name in ("a", "b"):
+        files_server.files[name] = name.encode() * 100
+    cache = AttachmentCache(session, tmp_path, max_size=150)
+
+    a = await cache.fetch(_attachment(files_server, 1, "a"), max_size=100)
+    b = await cache.fetch(_attachment(files_server, 2, "b"), max_size=100)
+    await _drain_disk_thread()
+    assert a.exists() and b.exists()
+
+    cache.release(a)
+    await _drain_disk_thread()
+    assert not a.exists() and b.exists()
@@ -0,0 +1,90 @@
+import asyncio
+import unittest.mock
+
+import discord
+import pytest
+
+from modmail.utils.threads import EditCoalescer, TypingDebouncer
+
+
+@pytest.mark.asyncio
+async def test_typing_debounced():
+    """Typing is only triggered once per window, until a message is sent in the channel."""
+    channel = unittest.mock.AsyncMock()
+    debouncer = TypingDebouncer(window=60)
+
+    assert await debouncer.trigger(channel, 1)
+    assert not await debouncer.trigger(channel, 1)
+    assert not await debouncer.trigger(channel, 1)
+    # other channels have their own indicator
+    assert await debouncer.trigger(channel, 2)
+    assert 2 == debouncer.suppressed
+
+    debouncer.cancel(1)
+    assert await debouncer.trigger(channel, 1)
+    assert 3 == channel.trigger_typing.await_count
+
+
+@pytest.mark.asyncio
+async def test_typing_window_expires():
+    """Typing is triggered again once the previous indicator has expired."""
+    channel = unittest.mock.AsyncMock()
+    debouncer = TypingDebouncer(window=0)
+
+    assert await debouncer.trigger(channel, 1)
+    assert await debouncer.trigger(channel, 1)
+
+
+@pytest.mark.asyncio
+async def test_typing_failure_not_debounced():
+    """If typing couldn't be triggered, the next typing event tries again."""
+    channel = unittest.mock.AsyncMock()
+    channel.trigger_typing.side_effect = discord.HTTPException(unittest.mock.MagicMock(), "error")
+    debouncer = TypingDebouncer(window=60)
+
+    assert not await debouncer.trigger(channel, 1)
+    channel.trigger_typing.side_effect = None
+    assert await debouncer.trigger(channel, 1)
+
+
+@pytest.mark.asyncio
+async def test_edits_coalesced():
+    """Only the last edit of a message within the window is applied."""
+    applied = []
+
+    async def apply(edit: str) -> None:
+        applied.append(edit)
+
+    coalescer = EditCoalescer(window=0.05)
+    for edit in ("first", "second", "third"):
+        coalescer.submit(1, edit, apply)
+    coalescer.submit(2, "other", apply)
+    await asyncio.sleep(0.1)
+
+    assert ["third", "other"] == applied
+    assert 2 == coalescer.coalesced
+
+    # later edits start a new window
+    coalescer.submit(1, "fourth", apply)
+    await asyncio.sleep(0.1)
+    assert "fourth" == applied[-1]
+
+
+@pytest.mark.asyncio
+async def test_edit_cancelled():
+    """A cancelled edit is never applied, and the next edit of the message starts a new window."""
+    applied = []
+
+    async def apply(edit):
+        applied.append(edit)
+
+    coalescer = EditCoalescer(window=0.05)
+    coalescer.submit(1, "first", apply)
+    assert coalescer.cancel(1)
+    assert not coalescer.cancel(2)
+    await asyncio.sleep(0.1)
+    assert [] == applied
+
+    coalescer.submit(1, "second", apply)
+    await asyncio.sleep(0.1)
+    assert ["second"] == applied
@@ -24,17 +24,19 @@ def threaded_ctx(channel_id=None, /):
 
 
 @pytest.mark.parametrize(
-    ["ctx", "expected", "config_id"],
+    ["ctx", "expected", "config_id", "extra_ids"],
     [
-        [threaded_ctx(42), True, 42],
-        [threaded_ctx(42), False, 21],
-        [mocks.MockContext(channel=mocks.MockTextChannel(id=1)), False, 123],
-        [mocks.MockContext(channel=mocks.MockTextChannel(id=123)), False, 123],
+        [threaded_ctx(42), True, 42, []],
+        [threaded_ctx(42), False, 21, []],
+        [threaded_ctx(42), True, 21, [7, 42]],
+        [mocks.MockContext(channel=mocks.MockTextChannel(id=1)), False, 123, []],
+        [mocks.MockContext(channel=mocks.MockTextChannel(id=123)), False, 123, []],
     ],
 )
-def test_is_modmail_thread(ctx, is_modmail_thread, expected: bool, config_id: int):
+def test_is_modmail_thread(ctx, is_modmail_thread, expected: bool, config_id: int, extra_ids: list):
     """Check that is_modmail_thread requires the channel to be a thread and with a parent of log channel."""
     ctx.bot.config.user.threads.relay_channel_id = config_id
+    ctx.bot.config.user.threads.extra_relay_channel_ids = extra_ids
     result = is_modmail_thread(ctx)
 
     assert expected == result
@@ -1,5 +1,6 @@
 import enum
 import typing
+import unittest.mock
 from functools import cached_property
 from tokenize import maybe
 
@@ -90,6 +91,50 @@ class TestMessageDict:
             msg_dict[n1] = n2
 
 
+class TestRecentMessages:
+    """Tests for models.RecentMessages."""
+
+    def test_append_is_bounded(self):
+        """Appending past the maximum length should drop the oldest messages."""
+        recent = models.RecentMessages(maxlen=3)
+        messages = [mocks.MockMessage() for _ in range(5)]
+        for message in messages:
+            recent.append(message)
+
+        assert messages[2:] == list(recent)
+        assert messages[-1] is recent.last
+        assert messages[0] not in recent
+        assert messages[3].id in recent
+
+    def test_reappend_moves_to_end(self):
+        """Appending a message which is already present should make it the most recent."""
+        recent = models.RecentMessages()
+        first, second = mocks.MockMessage(), mocks.MockMessage()
+        recent.append(first)
+        recent.append(second)
+        recent.append(first)
+
+        assert 2 == len(recent)
+        assert first is recent.last
+
+    def test_remove_and_discard(self):
+        """Messages should be removable by message or id, and only remove should raise if missing."""
+        recent = models.RecentMessages()
+        first, second = mocks.MockMessage(), mocks.MockMessage()
+        recent.append(first)
+        recent.append(second)
+
+        recent.remove(second.id)
+        assert first is recent.last
+        recent.discard(first)
+        assert recent.last is None
+        assert 0 == len(recent)
+
+        recent.discard(first)
+        with pytest.raises(ValueError):
+            recent.remove(first)
+
+
 class TestTicket:
     """Tests for models.Ticket."""
 
@@ -104,3 +149,43 @@ class TestTicket:
         assert thread == ticket.thread
         assert message == ticket.log_message
         assert isinstance(ticket.messages, models.MessageDict)
+
+    def test_last_sent_messages_not_shared(self):
+        """Each ticket should have its own recent messages, bounded to the maximum cached messages."""
+        first = models.Ticket(mocks.MockUser(), mocks.MockThread())
+        second = models.Ticket(mocks.MockUser(), mocks.MockThread())
+
+        for _ in range(models.MAX_CACHED_MESSAGES_PER_THREAD + 5):
+            first.last_sent_messages.append(mocks.MockMessage())
+
+        assert models.MAX_CACHED_MESSAGES_PER_THREAD == len(first.last_sent_messages)
+        assert 0 == len(second.last_sent_messages)
+
+    def test_ticket_has_no_dict(self):
+        """Tickets use slots to keep their memory usage down, as there can be many open at once."""
+        ticket = models.Ticket(mocks.MockUser(), mocks.MockThread())
+        assert not hasattr(ticket, "__dict__")
+        with pytest.raises(AttributeError):
+            ticket.not_an_attribute = True
+
+    def test_ticket_from_ids(self):
+        """Tickets made from ids should resolve their objects from the client when accessed."""
+        user = mocks.MockUser()
+        thread = mocks.MockThread()
+        client = mocks.MockBot()
+        client.get_user = unittest.mock.Mock(return_value=user)
+        client.get_channel = unittest.mock.Mock(return_value=thread)
+
+        ticket = models.Ticket.from_ids(client, user.id, thread.id)
+        assert 0 == client.get_user.call_count
+        assert thread.id == ticket.log_message_id
+        assert ticket.relay_channel_id is None
+
+        assert user is ticket.recipient
+        assert user is ticket.recipient
+        client.get_user.assert_called_once_with(user.id)
+
+        assert thread is ticket.thread
+        client.get_channel.assert_called_once_with(thread.id)
+        thread.parent.get_partial_message.assert_called_once_with(thread.id)
+        assert thread.parent.get_partial_message.return_value is ticket.log_message
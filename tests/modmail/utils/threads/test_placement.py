@@ -0,0 +1,43 @@
+import types
+
+import pytest
+
+from modmail.utils.threads import PlacementPolicy, RelayChannelPool, configured_relay_channel_ids
+
+
+def test_configured_relay_channel_ids():
+    """The main relay channel comes first, and unset or repeated ids are dropped."""
+    threads_config = types.SimpleNamespace(relay_channel_id=1, extra_relay_channel_ids=[2, 1, 0, 3, 2])
+    assert (1, 2, 3) == configured_relay_channel_ids(threads_config)
+
+
+def test_empty_pool():
+    """A pool needs at least one channel."""
+    with pytest.raises(ValueError):
+        RelayChannelPool([])
+
+
+def test_round_robin():
+    """Round robin placement cycles through the channels in order."""
+    pool = RelayChannelPool([1, 2, 3], PlacementPolicy.ROUND_ROBIN)
+    assert [1, 2, 3, 1] == [pool.choose(user_id, {}) for user_id in range(4)]
+    assert 2 in pool and 4 not in pool
+
+
+def test_least_loaded():
+    """Least loaded placement picks the channel with the fewest open tickets."""
+    pool = RelayChannelPool([1, 2, 3], PlacementPolicy.LEAST_LOADED)
+    assert 2 == pool.choose(10, {1: 4, 2: 1, 3: 2})
+    # channels without any tickets are the least loaded, ties go to the first
+    assert 3 == pool.choose(10, {1: 4, 2: 1})
+    assert 1 == pool.choose(10, {})
+
+
+def test_hashed():
+    """Hashed placement always puts a user's tickets in the same channel, and spreads users out."""
+    pool = RelayChannelPool([1, 2, 3], PlacementPolicy.HASHED)
+    user_ids = [(i << 22) | 1 for i in range(300)]
+
+    picks = [pool.choose(user_id, {}) for user_id in user_ids]
+    assert picks == [pool.choose(user_id, {}) for user_id in user_ids]
+    assert all(60 < picks.count(channel_id) < 140 for channel_id in pool)
@@ -0,0 +1,60 @@
+import arrow
+import pytest
+
+from modmail.utils.threads import SearchIndex
+from modmail.utils.threads.search import to_match_query
+from tests import mocks
+
+
+@pytest.fixture
+def search_index(tmp_path):
+    """Search index stored in a temporary directory."""
+    index = SearchIndex(tmp_path / "search.sqlite3")
+    yield index
+    index.close()
+
+
+def _index(index: SearchIndex, content: str, recipient_id: int) -> mocks.MockMessage:
+    message = mocks.MockMessage(content=content)
+    message.created_at = arrow.utcnow().datetime
+    thread_message = mocks.MockMessage()
+    index.add(message, thread_message, recipient_id).result()
+    return thread_message
+
+
+@pytest.mark.parametrize(
+    ["query", "expected"],
+    [
+        ["refund", '"refund"'],
+        ["  order   refund ", '"order" "refund"'],
+        ['say "hi" OR', '"say" """hi""" "OR"'],
+    ],
+)
+def test_to_match_query(query: str, expected: str) -> None:
+    """Every word should be quoted so fts5 operators are searched literally."""
+    assert expected == to_match_query(query)
+
+
+@pytest.mark.asyncio
+async def test_search_returns_matches(search_index: SearchIndex) -> None:
+    """Only messages containing every word should be returned, linking to the thread message."""
+    thread_message = _index(search_index, "I never received my refund", 1)
+    _index(search_index, "My order arrived, thanks", 1)
+
+    results = await search_index.search("refund received")
+    assert 1 == len(results)
+    assert thread_message.id == results[0].message_id
+    assert str(thread_message.id) in results[0].jump_url
+    assert "**refund**" in results[0].snippet
+
+    assert [] == await search_index.search("   ")
+
+
+@pytest.mark.asyncio
+async def test_search_by_recipient(search_index: SearchIndex) -> None:
+    """Searches can be limited to the tickets of a single recipient."""
+    _index(search_index, "password reset", 1)
+    _index(search_index, "password reset please", 2)
+
+    results = await search_index.search("password", recipient_id=2)
+    assert [2] == [result.recipient_id for result in results]
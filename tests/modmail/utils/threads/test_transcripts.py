@@ -0,0 +1,83 @@
+import gzip
+import json
+import zlib
+
+import arrow
+import pytest
+
+from modmail.utils.threads import Target, TranscriptWriter
+from tests import mocks
+
+
+def _make_message(content: str) -> mocks.MockMessage:
+    message = mocks.MockMessage(content=content, attachments=[], stickers=[])
+    message.created_at = arrow.utcnow().datetime
+    return message
+
+
+def _read_records(path) -> list:
+    with gzip.open(path, "rt") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_transcript_pairs_and_finalize(tmp_path):
+    """Every relayed pair should be written as one json line, followed by a closing record."""
+    transcript = TranscriptWriter(tmp_path / "1234.jsonl.gz")
+    source, mirror = _make_message("hello"), _make_message("")
+    transcript.write_pair(Target.MODMAIL, source, mirror)
+    transcript.write_pair(Target.USER, _make_message("?reply hi"), _make_message(""), "hi")
+
+    with pytest.raises(ValueError):
+        transcript.to_file()
+
+    path = transcript.finalize(closed_by=5).result()
+    assert transcript.closed
+
+    records = _read_records(path)
+    assert 3 == len(records)
+    assert "modmail" == records[0]["target"]
+    assert "hello" == records[0]["content"]
+    assert source.id == records[0]["message_id"]
+    assert mirror.id == records[0]["mirror_id"]
+    assert "hi" == records[1]["content"]
+    assert {"event": "closed", "closed_by": 5} == {k: records[2][k] for k in ("event", "closed_by")}
+
+    with pytest.raises(ValueError):
+        transcript.write({})
+
+
+def test_transcript_appends_after_reopen(tmp_path):
+    """A transcript reopened after a restart should continue the existing file."""
+    path = tmp_path / "1234.jsonl.gz"
+    first = TranscriptWriter(path)
+    first.write({"content": "before"})
+    first.finalize().result()
+
+    second = TranscriptWriter(path)
+    second.write({"content": "after"})
+    second.finalize().result()
+
+    contents = [record.get("content") for record in _read_records(path)]
+    assert ["before", None, "after", None] == contents
+
+
+def test_transcript_recovers_unclosed_file(tmp_path):
+    """A transcript which wasn't closed is repaired when reopened, keeping the lines which were flushed."""
+    path = tmp_path / "1234.jsonl.gz"
+    first = TranscriptWriter(path)
+    first.write({"content": "before"})
+    first.close().result()
+    assert first.closed
+
+    # a writer which stopped without closing its member, after flushing one and a half lines
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    with open(path, "ab") as f:
+        f.write(compressor.compress(b'{"content":"flushed"}\n{"content":"lo'))
+        f.write(compressor.flush(zlib.Z_SYNC_FLUSH))
+
+    second = TranscriptWriter(path)
+    second.write({"content": "after"})
+    second.finalize().result()
+
+    contents = [record.get("content") for record in _read_records(path)]
+    assert ["before", "flushed", "after", None] == contents
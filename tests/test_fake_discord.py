@@ -0,0 +1,143 @@
+"""Meta tests for the fake discord server in tests/fake_discord."""
+
+import json
+
+import aiohttp
+import pytest
+
+from tests.fake_discord import FakeDiscord, RateLimiter
+
+
+@pytest.fixture
+async def server():
+    """A running fake discord server."""
+    server = FakeDiscord()
+    await server.start()
+    yield server
+    await server.close()
+
+
+@pytest.fixture
+async def session(server):
+    """A client session which is authorized with the fake server."""
+    async with aiohttp.ClientSession(headers={"Authorization": f"Bot {server.token}"}) as session:
+        yield session
+
+
+async def _receive(ws: aiohttp.ClientWebSocketResponse) -> dict:
+    return json.loads(await ws.receive_str(timeout=5))
+
+
+@pytest.mark.asyncio
+async def test_json_content_type(server, session):
+    """discord.py only parses responses with exactly this content type."""
+    async with session.get(server.api_url + "/users/@me") as resp:
+        assert resp.status == 200
+        assert resp.headers["Content-Type"] == "application/json"
+        assert (await resp.json())["id"] == server.state.bot_user["id"]
+
+
+@pytest.mark.asyncio
+async def test_unauthorized(server):
+    """Requests without the bot token are rejected."""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(server.api_url + "/users/@me") as resp:
+            assert resp.status == 401
+
+
+@pytest.mark.asyncio
+async def test_unknown_channel(server, session):
+    """Missing objects return discord's error codes."""
+    async with session.get(server.api_url + "/channels/1") as resp:
+        assert resp.status == 404
+        assert (await resp.json())["code"] == 10003
+
+
+@pytest.mark.asyncio
+async def test_bucket_rate_limit(server, session):
+    """Each route and channel has its own bucket, and a 429 is returned once it is used up."""
+    server.rate_limiter = RateLimiter(bucket_limit=2, bucket_per=60)
+    url = f"{server.api_url}/channels/{server.state.relay_channel['id']}/messages"
+
+    for remaining in ("1", "0"):
+        async with session.post(url, json={"content": "hi"}) as resp:
+            assert resp.status == 200
+            assert resp.headers["X-RateLimit-Remaining"] == remaining
+            assert "X-RateLimit-Bucket" in resp.headers
+
+    async with session.post(url, json={"content": "hi"}) as resp:
+        assert resp.status == 429
+        assert resp.headers["Via"]
+        body = await resp.json()
+        assert body["retry_after"] > 0
+        assert body["global"] is False
+
+    assert server.rate_limited == {"user": 1}
+
+
+@pytest.mark.asyncio
+async def test_injected_rate_limit(server, session):
+    """Requests can be rate limited at random, with a fixed retry_after."""
+    server.rate_limiter = RateLimiter(rate_limit_chance=1, injected_retry_after=0.25)
+
+    async with session.get(server.api_url + "/users/@me") as resp:
+        assert resp.status == 429
+        assert resp.headers["X-RateLimit-Scope"] == "shared"
+        assert (await resp.json())["retry_after"] == 0.25
+
+
+@pytest.mark.asyncio
+async def test_gateway(server, session):
+    """The gateway identifies, and dispatches messages sent through the api and the control api."""
+    async with session.ws_connect(server.gateway_url + "?v=9&encoding=json") as ws:
+        hello = await _receive(ws)
+        assert hello["op"] == 10
+
+        await ws.send_json({"op": 2, "d": {"token": server.token}})
+        ready = await _receive(ws)
+        assert (ready["t"], ready["s"]) == ("READY", 1)
+        guild = await _receive(ws)
+        assert guild["t"] == "GUILD_CREATE"
+        assert guild["d"]["member_count"] == len(guild["d"]["members"])
+
+        await ws.send_json({"op": 1, "d": 2})
+        assert (await _receive(ws))["op"] == 11
+
+        url = f"{server.api_url}/channels/{server.state.relay_channel['id']}/messages"
+        async with session.post(url, json={"content": "relayed"}) as resp:
+            message = await resp.json()
+        event = await _receive(ws)
+        assert (event["t"], event["d"]["id"]) == ("MESSAGE_CREATE", message["id"])
+
+        user = server.state.dm_users[0]
+        async with session.post(server.url + "/_fake/dm", json={"user_id": user["id"], "content": "help"}):
+            pass
+        event = await _receive(ws)
+        assert event["t"] == "MESSAGE_CREATE"
+        assert event["d"]["author"]["id"] == user["id"]
+        assert "guild_id" not in event["d"]
+
+
+@pytest.mark.asyncio
+async def test_thread_lifecycle(server, session):
+    """Threads can be created from a message, archived, and found in the archive and the audit log."""
+    channel_id = server.state.relay_channel["id"]
+    async with session.post(f"{server.api_url}/channels/{channel_id}/messages", json={}) as resp:
+        message = await resp.json()
+
+    url = f"{server.api_url}/channels/{channel_id}/messages/{message['id']}/threads"
+    async with session.post(url, json={"name": "ticket"}) as resp:
+        thread = await resp.json()
+        assert thread["id"] == message["id"]
+
+    async with session.patch(f"{server.api_url}/channels/{thread['id']}", json={"archived": True}) as resp:
+        assert (await resp.json())["thread_metadata"]["archived"] is True
+
+    async with session.get(f"{server.api_url}/channels/{channel_id}/threads/archived/public") as resp:
+        assert [t["id"] for t in (await resp.json())["threads"]] == [thread["id"]]
+
+    url = f"{server.api_url}/guilds/{server.state.guild_id}/audit-logs?action_type=111"
+    async with session.get(url) as resp:
+        entry = (await resp.json())["audit_log_entries"][0]
+        assert entry["target_id"] == thread["id"]
+        assert entry["changes"][0]["new_value"] is True